@@ -0,0 +1,20 @@
+from django.contrib import admin
+from .models import InvoiceDraw, SavedInvoice
+
+# Register your models here.
+class InvoiceDrawAdmin(admin.ModelAdmin):
+    list_display = ('period', 'title', 'special', 'grand', 'synced_at')
+    search_fields = ('period', 'title')
+    ordering = ('-period',)
+
+admin.site.register(InvoiceDraw, InvoiceDrawAdmin)
+
+
+class SavedInvoiceAdmin(admin.ModelAdmin):
+    list_display = ('number', 'period', 'user_id', 'prize', 'amount', 'checked_at', 'notified_at')
+    list_filter = ('period', 'prize')
+    search_fields = ('number', 'user_id')
+    ordering = ('-id',)
+    list_per_page = 50
+
+admin.site.register(SavedInvoice, SavedInvoiceAdmin)
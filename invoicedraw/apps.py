@@ -0,0 +1,52 @@
+import os
+import sys
+
+from django.apps import AppConfig
+
+
+# Programs that serve the project's requests; anything else (tests, celery,
+# ``python -c``, other management commands) never starts background work
+SERVER_PROGRAMS = {'gunicorn', 'uwsgi', 'mod_wsgi', 'daphne', 'uvicorn', 'hypercorn', 'waitress-serve'}
+
+
+def serves_requests():
+    """
+    Whether this process answers webhooks: a known WSGI/ASGI server, or the
+    serving child of ``runserver`` (RUN_MAIN) rather than its autoreloader
+    parent or any other management command.
+
+    Returns:
+        bool: True if background work for requests belongs in this process
+    """
+    if 'uwsgi' in sys.modules:
+        # Only importable inside a uWSGI worker
+        return True
+    if not sys.argv:
+        return False
+    program = os.path.basename(sys.argv[0])
+    if program == '__main__.py':
+        # python -m gunicorn and the like
+        program = os.path.basename(os.path.dirname(sys.argv[0]))
+    if program in SERVER_PROGRAMS:
+        return True
+    if program != 'manage.py' or len(sys.argv) < 2 or sys.argv[1] != 'runserver':
+        return False
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+
+
+class InvoicedrawConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'invoicedraw'
+    verbose_name = '統一發票開獎資料'
+
+    def ready(self):
+        from .service import get_config, get_service
+
+        config = get_config()
+        # Load the draw snapshot while the worker boots rather than on its first invoice query
+        if config['SNAPSHOT_PATH']:
+            get_service()
+        # Opt-in background refresh, so invoice queries never wait for the upstream
+        if config['SCHEDULER'] and serves_requests():
+            from .scheduler import start_scheduler
+            start_scheduler()
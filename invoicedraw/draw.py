@@ -0,0 +1,209 @@
+"""
+Structured winning numbers of one draw period.
+
+``Draw`` is built once per period when the feed is parsed.  Besides the
+prize numbers it holds:
+
+* a 1000-entry suffix table: ``suffixes[n]`` lists the prize tiers whose
+  numbers end in the 3 digits ``n``, so checking the last three digits of an
+  invoice is a single list lookup;
+* per-length suffix sets of the 頭獎 numbers (8 down to 3 digits) plus the
+  特別獎/特獎 and 增開六獎 numbers, so a full 8-digit number is checked with
+  at most eight hash lookups, whatever its prize;
+* the set of every winning 3-digit suffix, so a batch of numbers is first
+  screened with one set lookup each and only the few candidates (about 1 in
+  100) go through the full check.
+"""
+
+import re
+from collections import namedtuple
+from datetime import timedelta, timezone
+
+# Draw dates and period titles are in Taiwan time (UTC+8, no daylight saving)
+TAIPEI = timezone(timedelta(hours=8))
+
+# Prize tiers of the draw feed, in announcement order
+SPECIAL = '特別獎'
+GRAND = '特獎'
+FIRST = '頭獎'
+EXTRA_SIXTH = '增開六獎'
+
+TIERS = (SPECIAL, GRAND, FIRST, EXTRA_SIXTH)
+
+# A prize won by a full invoice number
+Prize = namedtuple('Prize', ['name', 'amount'])
+
+SPECIAL_PRIZE = Prize(SPECIAL, 10000000)
+GRAND_PRIZE = Prize(GRAND, 2000000)
+EXTRA_SIXTH_PRIZE = Prize(EXTRA_SIXTH, 200)
+
+# Prizes of the 頭獎 numbers by the number of matching trailing digits
+FIRST_PRIZES = {
+    8: Prize(FIRST, 200000),
+    7: Prize('二獎', 40000),
+    6: Prize('三獎', 10000),
+    5: Prize('四獎', 4000),
+    4: Prize('五獎', 1000),
+    3: Prize('六獎', 200),
+}
+
+# "特別獎：93221989", "頭獎：39830731、15658241、02213627", ... (full- or half-width separators)
+PRIZE_LINE = re.compile(r'(特別獎|特獎|頭獎|增開六獎)\s*[：:]\s*([0-9、,，\s]+)')
+NUMBER = re.compile(r'[0-9]{3,8}')
+# "113年07月、08月" -> year 113, first month 07
+TITLE_PERIOD = re.compile(r'([0-9]{2,3})\s*年\s*([0-9]{1,2})\s*月')
+# "11307" or "113年07月", either month of the two-month period
+PERIOD = re.compile(r'([0-9]{2,3})(?:\s*年\s*)?([0-9]{2})(?:\s*月)?')
+
+_NO_MATCH = ()
+
+
+class Draw:
+    """
+    Winning numbers of a draw period with precomputed suffix lookups.
+    """
+
+    __slots__ = ('title', 'text', 'period', 'numbers', 'suffixes', 'exact', 'first_suffixes', 'extra_sixth',
+                 'winning_suffixes')
+
+    def __init__(self, title, text):
+        """
+        Args:
+            title (str): Period title, e.g. '113年07月、08月'
+            text (str): Prize text of the feed, one tier per line
+        """
+        self.title = title
+        self.text = text
+        # Period key such as '11307' (ROC year + first month), None if the title has none
+        match = TITLE_PERIOD.search(title)
+        self.period = f'{int(match.group(1)):03d}{int(match.group(2)):02d}' if match else None
+        # Tier -> tuple of winning numbers (empty when the period has none)
+        self.numbers = {tier: () for tier in TIERS}
+        for tier, numbers in PRIZE_LINE.findall(text):
+            self.numbers[tier] += tuple(NUMBER.findall(numbers))
+
+        table = [_NO_MATCH] * 1000
+        for tier in TIERS:
+            for number in self.numbers[tier]:
+                index = int(number[-3:])
+                if tier not in table[index]:
+                    table[index] += (tier,)
+        self.suffixes = table
+
+        # Full 8-digit matches of 特別獎 / 特獎
+        self.exact = {}
+        for number in self.numbers[GRAND]:
+            self.exact[number] = GRAND_PRIZE
+        for number in self.numbers[SPECIAL]:
+            self.exact[number] = SPECIAL_PRIZE
+        # Trailing digits of the 頭獎 numbers, longest (highest prize) first
+        self.first_suffixes = tuple(
+            (length, frozenset(number[-length:] for number in self.numbers[FIRST]))
+            for length in sorted(FIRST_PRIZES, reverse=True)
+        )
+        self.extra_sixth = frozenset(number[-3:] for number in self.numbers[EXTRA_SIXTH])
+        # Any prize needs the last 3 digits to match some winning number
+        self.winning_suffixes = frozenset(
+            number[-3:] for tier in TIERS for number in self.numbers[tier]
+        )
+
+    def check_suffix(self, digits):
+        """
+        Prize tiers whose numbers end with the last 3 digits of an invoice.
+
+        Args:
+            digits (str): At least the last 3 digits of the invoice number
+
+        Returns:
+            tuple[str]: Candidate tiers in announcement order, empty when nothing matches
+        """
+        return self.suffixes[int(digits[-3:])]
+
+    def check(self, number):
+        """
+        The prize won by a full invoice number.
+
+        Args:
+            number (str): 8-digit invoice number
+
+        Returns:
+            Prize or None: The highest prize won, None when the number wins nothing
+        """
+        prize = self.exact.get(number)
+        if prize is not None:
+            return prize
+        for length, suffixes in self.first_suffixes:
+            if number[-length:] in suffixes:
+                return FIRST_PRIZES[length]
+        if number[-3:] in self.extra_sixth:
+            return EXTRA_SIXTH_PRIZE
+        return None
+
+    def check_many(self, numbers):
+        """
+        The prizes won by a batch of full invoice numbers.
+
+        Args:
+            numbers (iterable[str]): 8-digit invoice numbers
+
+        Returns:
+            list[Prize or None]: The prize of each number, in input order
+        """
+        # Screen on the 3-digit suffix first; most numbers stop at this one lookup
+        winning = self.winning_suffixes
+        check = self.check
+        return [check(number) if number[-3:] in winning else None for number in numbers]
+
+    def __repr__(self):
+        return f'<Draw {self.title}>'
+
+
+def normalize_period(text):
+    """
+    Period key of a user-supplied period.
+
+    Draws cover two months starting on an odd month, so '11310' and
+    '113年10月' both name the period '11309'.
+
+    Args:
+        text (str): Period such as '11309', '11310' or '113年09月'
+
+    Returns:
+        str or None: Period key like '11309', None if the text is not a period
+    """
+    match = PERIOD.fullmatch(text.strip())
+    if not match:
+        return None
+    month = int(match.group(2))
+    if not 1 <= month <= 12:
+        return None
+    if month % 2 == 0:
+        month -= 1
+    return f'{int(match.group(1)):03d}{month:02d}'
+
+
+def period_of(day):
+    """
+    Period key of the two-month period a date falls in.
+
+    Args:
+        day (date or datetime): Purchase date, in Taiwan time
+
+    Returns:
+        str: Period key, e.g. '11309' for 2024-10-05
+    """
+    month = day.month if day.month % 2 else day.month - 1
+    return f'{day.year - 1911:03d}{month:02d}'
+
+
+def format_text(numbers):
+    """
+    Prize text in the feed's layout, one tier per line.
+
+    Args:
+        numbers (dict): Tier -> winning numbers, missing or empty tiers are left out
+
+    Returns:
+        str: Lines such as '頭獎：39830731、15658241、02213627'
+    """
+    return '\n'.join(f'{tier}：{"、".join(numbers[tier])}' for tier in TIERS if numbers.get(tier))
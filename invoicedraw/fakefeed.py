@@ -0,0 +1,299 @@
+"""
+Local stand-in for the Ministry of Finance invoice.xml draw feed.
+
+``FakeFeedServer`` serves synthetic feeds (see invoicedraw.sample) in a set of
+scenarios, so the cache, retry and parsing paths of ``DrawService`` can be
+exercised and measured without the upstream:
+
+* ``normal``    -- the newest periods, with ETag / Last-Modified (304 on revalidation)
+* ``slow``      -- the normal feed after ``slow_delay`` seconds
+* ``truncated`` -- the connection is closed halfway through the body
+* ``error``     -- 500 Internal Server Error
+* ``empty``     -- 200 with an empty body
+* ``large``     -- ``large_periods`` periods in one document
+* ``drift``     -- the normal numbers, every tier on one line ("特別獎：… 特獎：…")
+
+``/invoice.xml`` is answered in the server's current scenario and
+``/<scenario>/invoice.xml`` in the one named.  Point the bots at it with
+``INVOICE_FEED_URL`` in the environment (read into ``INVOICE_DRAW['FEED_URL']``)
+and run it with ``python manage.py fake_invoice_feed``, or start it in-process
+from a benchmark.
+
+Control endpoints (no auth):
+
+* ``GET /fake/stats``                  -- counters per scenario and status
+* ``POST /fake/scenario?name=error``   -- switch the scenario of ``/invoice.xml``
+* ``POST /fake/reset``                 -- clear counters
+"""
+
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from linebotcore import metrics
+
+from .sample import INLINE, sample_feed
+
+NORMAL = 'normal'
+SLOW = 'slow'
+TRUNCATED = 'truncated'
+ERROR = 'error'
+EMPTY = 'empty'
+LARGE = 'large'
+DRIFT = 'drift'
+
+SCENARIOS = (NORMAL, SLOW, TRUNCATED, ERROR, EMPTY, LARGE, DRIFT)
+
+FEED_PATH = 'invoice.xml'
+
+
+class _FakeFeedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.fake.connection_opened()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.fake.handle(self, 'GET')
+
+    def do_POST(self):
+        self.server.fake.handle(self, 'POST')
+
+    def send_body(self, status, body, content_type='application/json', headers=None, length=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body) if length is None else length))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Streaming clients drop the connection once they have read the periods they need
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Fixture:
+    # Body and validators of one scenario's feed, built once
+    __slots__ = ('body', 'etag', 'last_modified')
+
+    def __init__(self, body, last_modified):
+        self.body = body
+        self.etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"' if body else None
+        self.last_modified = last_modified
+
+
+class FakeFeedServer:
+    """
+    Threaded HTTP server serving the draw feed in configurable failure scenarios.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, scenario=NORMAL, periods=3, large_periods=600,
+                 slow_delay=2.0, seed=0):
+        """
+        Args:
+            host (str): Interface to listen on
+            port (int): Port to listen on, 0 picks a free port
+            scenario (str): Scenario of ``/invoice.xml``, one of SCENARIOS
+            periods (int): Periods of the normal, slow, truncated and drift feeds
+            large_periods (int): Periods of the large feed (at most about 670)
+            slow_delay (float): Seconds the slow scenario waits before answering
+            seed (int): Seed of the winning numbers, the same in every scenario
+        """
+        if scenario not in SCENARIOS:
+            raise ValueError(f'Unknown scenario {scenario!r}, expected one of {", ".join(SCENARIOS)}')
+        self.scenario = scenario
+        self.slow_delay = slow_delay
+        last_modified = format_datetime(datetime.now(timezone.utc).replace(microsecond=0), usegmt=True)
+        normal = _Fixture(sample_feed(periods, seed), last_modified)
+        self.fixtures = {
+            NORMAL: normal,
+            SLOW: normal,
+            TRUNCATED: normal,
+            EMPTY: _Fixture(b'', last_modified),
+            LARGE: _Fixture(sample_feed(large_periods, seed), last_modified),
+            DRIFT: _Fixture(sample_feed(periods, seed, layout=INLINE), last_modified),
+        }
+        self._lock = threading.Lock()
+        self._thread = None
+        self.reset()
+
+        self.httpd = _FakeHTTPServer((host, port), _FakeFeedHandler)
+        self.httpd.fake = self
+
+    @property
+    def url(self):
+        """Feed URL to use as INVOICE_DRAW['FEED_URL'], answered in the current scenario."""
+        return self.feed_url()
+
+    def feed_url(self, scenario=None):
+        """
+        Feed URL of a given scenario.
+
+        Args:
+            scenario (str): One of SCENARIOS, None for whichever is current
+
+        Returns:
+            str: URL of the feed
+        """
+        host, port = self.httpd.server_address[:2]
+        prefix = f'/{scenario}' if scenario else ''
+        return f'http://{host}:{port}{prefix}/{FEED_PATH}'
+
+    def start(self):
+        """Serve on a background daemon thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-invoice-feed', daemon=True)
+        self._thread.start()
+        metrics.register('fake_invoice_feed', self.stats)
+        return self
+
+    def serve_forever(self):
+        """Serve on the calling thread until interrupted."""
+        metrics.register('fake_invoice_feed', self.stats)
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        metrics.unregister('fake_invoice_feed')
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.httpd.server_close()
+
+    # --- counters -------------------------------------------------------
+
+    def reset(self):
+        """Clear counters."""
+        with self._lock:
+            self.connections = 0
+            self.status_counts = Counter()    # (scenario, status) -> requests
+            self.bytes_sent = 0
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+
+    def stats(self):
+        """
+        Request counters per scenario and status.
+
+        Returns:
+            dict: Fake feed stats
+        """
+        with self._lock:
+            scenarios = {}
+            for (scenario, status), count in self.status_counts.items():
+                counts = scenarios.setdefault(scenario, {'requests': 0, 'status': {}})
+                counts['requests'] += count
+                counts['status'][str(status)] = count
+            return {
+                'scenario': self.scenario,
+                'connections': self.connections,
+                'requests': sum(self.status_counts.values()),
+                'bytes_sent': self.bytes_sent,
+                'scenarios': scenarios,
+            }
+
+    def _record(self, scenario, status, sent):
+        with self._lock:
+            self.status_counts[(scenario, status)] += 1
+            self.bytes_sent += sent
+
+    # --- request handling -----------------------------------------------
+
+    def handle(self, request, method):
+        url = urlsplit(request.path)
+        path = url.path
+
+        # Consume any body so the kept-alive connection stays in sync
+        length = int(request.headers.get('Content-Length', 0) or 0)
+        if length:
+            request.rfile.read(length)
+
+        if path.startswith('/fake/'):
+            self._handle_control(request, method, path, dict(parse_qsl(url.query)))
+            return
+
+        parts = path.strip('/').split('/')
+        if method != 'GET' or parts[-1] != FEED_PATH or len(parts) > 2:
+            request.send_body(404, {'message': 'Not found'})
+            return
+        scenario = parts[0] if len(parts) == 2 else self.scenario
+        if scenario not in SCENARIOS:
+            request.send_body(404, {'message': f'Unknown scenario {scenario}'})
+            return
+
+        if scenario == SLOW:
+            time.sleep(self.slow_delay)
+        if scenario == ERROR:
+            body = b'<html><body><h1>500 Internal Server Error</h1></body></html>'
+            request.send_body(500, body, content_type='text/html')
+            self._record(scenario, 500, len(body))
+            return
+
+        fixture = self.fixtures[scenario]
+        headers = {}
+        if fixture.etag:
+            headers = {'ETag': fixture.etag, 'Last-Modified': fixture.last_modified}
+            # A truncated response always fails, even for a client holding a good copy
+            if scenario != TRUNCATED and self._not_modified(request, fixture):
+                request.send_response(304)
+                for name, value in headers.items():
+                    request.send_header(name, value)
+                request.end_headers()
+                self._record(scenario, 304, 0)
+                return
+
+        if scenario == TRUNCATED:
+            # Announce the whole body, send half of it and hang up
+            body = fixture.body[:len(fixture.body) // 2]
+            request.close_connection = True
+            request.send_body(200, body, content_type='text/xml; charset=utf-8', headers=headers,
+                              length=len(fixture.body))
+        else:
+            body = fixture.body
+            request.send_body(200, body, content_type='text/xml; charset=utf-8', headers=headers)
+        self._record(scenario, 200, len(body))
+
+    @staticmethod
+    def _not_modified(request, fixture):
+        etag = request.headers.get('If-None-Match')
+        if etag is not None:
+            return etag == fixture.etag
+        return request.headers.get('If-Modified-Since') == fixture.last_modified
+
+    def _handle_control(self, request, method, path, query):
+        if path == '/fake/stats' and method == 'GET':
+            request.send_body(200, self.stats())
+        elif path == '/fake/scenario' and method == 'POST':
+            name = query.get('name')
+            if name not in SCENARIOS:
+                request.send_body(400, {'message': f'name must be one of {", ".join(SCENARIOS)}'})
+                return
+            self.scenario = name
+            request.send_body(200, {'scenario': name})
+        elif path == '/fake/reset' and method == 'POST':
+            self.reset()
+            request.send_body(200, {})
+        else:
+            request.send_body(404, {'message': 'Not found'})
@@ -0,0 +1,101 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from invoicedraw.draw import FIRST, GRAND, SPECIAL, Draw
+
+# Prize text of one period as it comes out of the feed (one tier per line)
+SAMPLE_TITLE = '113年07月、08月'
+SAMPLE_TEXT = '特別獎：93221989\n特獎：24097596\n頭獎：39830731、15658241、02213627'
+
+
+def legacy_check(ptext, mtext):
+    # Baseline: the former show3digit, re-parsing the prize text with find() and slicing on every query
+    prize_text = ' '.join(ptext.split('\n'))
+    prizelist = []
+    first_prizes = []
+    if '特別獎：' in prize_text:
+        special_start = prize_text.find('特別獎：') + 3
+        special_end = prize_text.find(' ', special_start)
+        if special_end == -1:
+            special_end = len(prize_text)
+        special_prize = prize_text[special_start:special_end].strip()
+        if len(special_prize) >= 3:
+            prizelist.append(special_prize[-3:])
+    if '特獎：' in prize_text:
+        grand_start = prize_text.find('特獎：') + 3
+        grand_end = prize_text.find(' ', grand_start)
+        if grand_end == -1:
+            grand_end = len(prize_text)
+        grand_prize = prize_text[grand_start:grand_end].strip()
+        if len(grand_prize) >= 3:
+            prizelist.append(grand_prize[-3:])
+    if '頭獎：' in prize_text:
+        first_start = prize_text.find('頭獎：') + 3
+        first_part = prize_text[first_start:].strip()
+        first_numbers = [num.strip() for num in first_part.replace('、', ',').split(',') if num.strip()]
+        for num in first_numbers:
+            if len(num) >= 3:
+                first_prizes.append(num[-3:])
+    if mtext in prizelist:
+        return 'special'
+    if mtext in first_prizes:
+        return 'first'
+    return None
+
+
+class Command(BaseCommand):
+    help = '比較逐次解析獎號文字與預先建立的後三碼對照表的對獎速度'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=200000, help='對獎次數')
+        parser.add_argument('--seed', type=int, default=0, help='隨機種子')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        queries = [f'{rng.randrange(1000):03d}' for _ in range(options['checks'])]
+
+        started = time.perf_counter()
+        draw = Draw(SAMPLE_TITLE, SAMPLE_TEXT)
+        build_us = (time.perf_counter() - started) * 1e6
+
+        # Both implementations must agree before their speed is compared
+        for digits in {f'{n:03d}' for n in range(1000)}:
+            tiers = draw.check_suffix(digits)
+            expected = 'special' if (SPECIAL in tiers or GRAND in tiers) else 'first' if FIRST in tiers else None
+            assert legacy_check(SAMPLE_TEXT, digits) == expected, digits
+
+        started = time.perf_counter()
+        for digits in queries:
+            legacy_check(SAMPLE_TEXT, digits)
+        legacy_seconds = time.perf_counter() - started
+
+        check = draw.check_suffix
+        started = time.perf_counter()
+        for digits in queries:
+            check(digits)
+        indexed_seconds = time.perf_counter() - started
+
+        # Full 8-digit numbers against every tier (at most eight hash lookups each)
+        numbers = [f'{rng.randrange(10 ** 8):08d}' for _ in range(len(queries))]
+        check_number = draw.check
+        started = time.perf_counter()
+        for number in numbers:
+            check_number(number)
+        full_seconds = time.perf_counter() - started
+
+        # The same numbers as one batch, screened on their 3-digit suffix first
+        assert draw.check_many(numbers) == [check_number(number) for number in numbers]
+        started = time.perf_counter()
+        draw.check_many(numbers)
+        batch_seconds = time.perf_counter() - started
+
+        count = len(queries)
+        self.stdout.write(f'建立對照表 (每期一次): {build_us:.0f} µs')
+        self.stdout.write(f'{"方式":<12} {"次/秒":>12} {"每次 (ns)":>10}')
+        self.stdout.write(f'{"逐次解析":<12} {count / legacy_seconds:>12,.0f} {legacy_seconds / count * 1e9:>10.0f}')
+        self.stdout.write(f'{"後三碼對照表":<12} {count / indexed_seconds:>12,.0f} {indexed_seconds / count * 1e9:>10.0f}')
+        self.stdout.write(f'{"完整 8 碼":<12} {count / full_seconds:>12,.0f} {full_seconds / count * 1e9:>10.0f}')
+        self.stdout.write(f'{"完整 8 碼批次":<12} {count / batch_seconds:>12,.0f} {batch_seconds / count * 1e9:>10.0f}')
+        self.stdout.write(self.style.SUCCESS(f'後三碼加速 {legacy_seconds / indexed_seconds:.1f} 倍'))
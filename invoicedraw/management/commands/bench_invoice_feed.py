@@ -0,0 +1,114 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicedraw.fakefeed import DRIFT, NORMAL, SCENARIOS, FakeFeedServer
+from invoicedraw.service import DrawService, DrawUnavailable, get_config
+
+
+def timed(call):
+    # (result or the DrawUnavailable raised, milliseconds)
+    started = time.perf_counter()
+    try:
+        result = call()
+    except DrawUnavailable as e:
+        result = e
+    return result, (time.perf_counter() - started) * 1000
+
+
+def outcome(service, result):
+    if isinstance(result, DrawUnavailable):
+        return '失敗'
+    source = 'stale' if service.stale_served else service.stats()['source']
+    return f'{len(result)} 期 ({source})'
+
+
+def expire(service):
+    # Let the next get() revalidate, as after TTL seconds
+    service._entry.expires_at = 0
+
+
+class Command(BaseCommand):
+    help = '以本機模擬開獎 XML 的各種情境，量測開獎資料快取的冷啟動、重新驗證、併發合併與故障備援'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, default=None,
+                            help='要量測的情境 (可重複指定)，預設全部')
+        parser.add_argument('--requests', type=int, default=200, help='每個情境併發查詢的次數')
+        parser.add_argument('--concurrency', type=int, default=16, help='同時查詢的執行緒數')
+        parser.add_argument('--slow-ms', type=float, default=500.0, help='slow 情境回應前的延遲 (毫秒)')
+        parser.add_argument('--large-periods', type=int, default=600, help='large 情境的期數 (最多約 670 期)')
+        parser.add_argument('--read-timeout', type=float, default=None,
+                            help="讀取逾時秒數，預設為 INVOICE_DRAW['READ_TIMEOUT']")
+        parser.add_argument('--seed', type=int, default=0, help='隨機種子，決定各期中獎號碼')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests 與 --concurrency 必須大於 0')
+        scenarios = options['scenario'] or list(SCENARIOS)
+        config = get_config()
+        config['SNAPSHOT_PATH'] = None    # Every service starts cold and leaves no file behind
+        if options['read_timeout'] is not None:
+            config['READ_TIMEOUT'] = options['read_timeout']
+
+        fake = FakeFeedServer(slow_delay=options['slow_ms'] / 1000, large_periods=options['large_periods'],
+                              seed=options['seed']).start()
+        try:
+            self.stdout.write(f'模擬開獎 XML：{fake.url}')
+            self.stdout.write(
+                f'{"情境":<10} {"冷啟動":<14} {"(ms)":>8} {"重新驗證 (ms)":>13} '
+                f'{"併發抓取":>8} {"故障備援":<14} {"(ms)":>8}'
+            )
+            for scenario in scenarios:
+                self._bench(fake, config, scenario, options)
+            self._check_drift(fake, config)
+            self.stdout.write(f'模擬伺服器: {json.dumps(fake.stats(), ensure_ascii=False)}')
+        finally:
+            fake.stop()
+
+    def _service(self, config, url):
+        return DrawService(dict(config, FEED_URL=url))
+
+    def _bench(self, fake, config, scenario, options):
+        url = fake.feed_url(scenario)
+
+        # Cold start: nothing cached, the request waits for the upstream
+        service = self._service(config, url)
+        cold, cold_ms = timed(service.get)
+
+        # Revalidation of an expired entry (a 304 when the feed is unchanged)
+        revalidate_ms = None
+        if not isinstance(cold, DrawUnavailable):
+            expire(service)
+            _, revalidate_ms = timed(service.get)
+            expire(service)
+
+        # A burst of lookups on an expired (or empty) cache: single-flight keeps upstream fetches low
+        fetches = service.fetches
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(lambda _: timed(service.get), range(options['requests'])))
+        burst_fetches = service.fetches - fetches
+
+        # The upstream fails after a good fetch: the last good feed keeps being served
+        primed = self._service(config, fake.feed_url(NORMAL))
+        primed.get()
+        primed.url = url
+        expire(primed)
+        fallback, fallback_ms = timed(primed.get)
+
+        revalidate = f'{revalidate_ms:>13.2f}' if revalidate_ms is not None else f'{"-":>13}'
+        self.stdout.write(
+            f'{scenario:<10} {outcome(service, cold):<14} {cold_ms:>8.2f} {revalidate} '
+            f'{burst_fetches:>8} {outcome(primed, fallback):<14} {fallback_ms:>8.2f}'
+        )
+
+    def _check_drift(self, fake, config):
+        # The one-line layout must yield the same numbers as the current one
+        normal = self._service(config, fake.feed_url(NORMAL)).get()
+        drift = self._service(config, fake.feed_url(DRIFT)).get()
+        if [draw.numbers for draw in normal] == [draw.numbers for draw in drift]:
+            self.stdout.write(self.style.SUCCESS('格式變動 (drift) 解析結果與一般格式相同'))
+        else:
+            self.stdout.write(self.style.ERROR('格式變動 (drift) 解析結果與一般格式不同'))
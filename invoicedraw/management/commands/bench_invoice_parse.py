@@ -0,0 +1,97 @@
+import io
+import statistics
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicedraw.draw import Draw
+from invoicedraw.sample import sample_feed
+from invoicedraw.service import parse_feed
+
+
+class CountingReader(io.BytesIO):
+    # BytesIO that remembers how many bytes the parser asked for
+    def __init__(self, content):
+        super().__init__(content)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def legacy_parse(content, periods):
+    # Baseline: the former fetch path, decoding the whole body and building the full tree
+    tree = ET.fromstring(content.decode('utf-8'))
+    items = list(tree.iter(tag='item'))
+    draws = []
+    for item in items[:periods]:
+        text = item.findtext('description').replace('<p>', '').replace('</p>', '\n').strip()
+        draws.append(Draw(item.findtext('title'), text))
+    return tuple(draws)
+
+
+def streaming_parse(content, periods):
+    reader = CountingReader(content)
+    draws = parse_feed(reader, periods)
+    return draws, reader.bytes_read
+
+
+class Command(BaseCommand):
+    help = '比較整份解析與串流解析 (讀到所需期數即停止) 開獎 XML 的延遲與記憶體用量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None, help='開獎 XML 檔，未指定則產生模擬資料')
+        parser.add_argument('--periods', type=int, default=600, help='模擬資料的期數 (最多約 670 期，民國元年起)')
+        parser.add_argument('--read', type=int, default=3, help='需要讀取的最新期數')
+        parser.add_argument('--repeat', type=int, default=20, help='重複次數 (取中位數)')
+        parser.add_argument('--write', default=None, help='將模擬資料寫入此檔案後結束')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            try:
+                content = Path(options['file']).read_bytes()
+            except OSError as e:
+                raise CommandError(f'無法讀取檔案 {options["file"]}: {e}') from e
+        else:
+            content = sample_feed(options['periods'], seed=0)
+        if options['write']:
+            Path(options['write']).write_bytes(content)
+            self.stdout.write(self.style.SUCCESS(f'已寫入 {options["write"]} ({len(content):,} bytes)'))
+            return
+
+        periods = options['read']
+        # Both parsers must return the same periods before they are compared
+        expected = legacy_parse(content, periods)
+        streamed, bytes_read = streaming_parse(content, periods)
+        assert [(d.title, d.text) for d in expected] == [(d.title, d.text) for d in streamed]
+
+        self.stdout.write(f'XML 大小 {len(content):,} bytes，讀取最新 {periods} 期')
+        self.stdout.write(f'{"方式":<10} {"中位數 (ms)":>12} {"記憶體峰值 (KB)":>16} {"讀取 (bytes)":>14}')
+        legacy_ms, legacy_kb = self._measure(legacy_parse, content, periods, options['repeat'])
+        self.stdout.write(f'{"整份解析":<10} {legacy_ms:>12.3f} {legacy_kb:>16,.1f} {len(content):>14,}')
+        stream_ms, stream_kb = self._measure(streaming_parse, content, periods, options['repeat'])
+        self.stdout.write(f'{"串流解析":<10} {stream_ms:>12.3f} {stream_kb:>16,.1f} {bytes_read:>14,}')
+        self.stdout.write(self.style.SUCCESS(
+            f'整份解析 / 串流解析：延遲 {legacy_ms / stream_ms:.1f} 倍，記憶體峰值 {legacy_kb / stream_kb:.1f} 倍'
+        ))
+
+    @staticmethod
+    def _measure(parse, content, periods, repeat):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            parse(content, periods)
+            samples.append((time.perf_counter() - started) * 1000)
+        # Memory is traced in a separate run so tracing does not skew the timings
+        tracemalloc.start()
+        try:
+            parse(content, periods)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return statistics.median(samples), peak / 1024
@@ -0,0 +1,66 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_databases, teardown_databases
+
+from invoicedraw.draw import Draw
+from invoicedraw.models import SavedInvoice
+from invoicedraw.recheck import recheck_period
+from linebotcore.client import build_line_bot_api
+from linebotcore.fakeline import FakeLineServer
+
+SAMPLE_TITLE = '113年07月、08月'
+SAMPLE_TEXT = '特別獎：93221989\n特獎：24097596\n頭獎：39830731、15658241、02213627\n增開六獎：765'
+
+
+class Command(BaseCommand):
+    help = '在暫時的測試資料庫中產生大量儲存的發票，量測批次對獎與 multicast 通知的耗時'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=200000, help='儲存的發票數')
+        parser.add_argument('--users', type=int, default=50000, help='使用者數')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='每個交易核對的發票數')
+        parser.add_argument('--fake-latency-ms', type=float, default=30.0, help='模擬 LINE API 的回應延遲 (毫秒)')
+        parser.add_argument('--seed', type=int, default=0, help='隨機種子')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        draw = Draw(SAMPLE_TITLE, SAMPLE_TEXT)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        fake = FakeLineServer(latency=options['fake_latency_ms'] / 1000, record_limit=0).start()
+        try:
+            started = time.perf_counter()
+            batch = []
+            for _ in range(options['invoices']):
+                number = f'{rng.randrange(10 ** 8):08d}'
+                batch.append(SavedInvoice(
+                    user_id=f'U{rng.randrange(options["users"]):032d}', number=number,
+                    suffix=number[-3:], period=draw.period,
+                ))
+                if len(batch) == 10000:
+                    SavedInvoice.objects.bulk_create(batch, ignore_conflicts=True)
+                    batch = []
+            SavedInvoice.objects.bulk_create(batch, ignore_conflicts=True)
+            self.stdout.write(f'產生 {SavedInvoice.objects.count():,} 張發票，耗時 {time.perf_counter() - started:.1f} 秒')
+
+            api = build_line_bot_api(settings.LINE_CHANNEL_ACCESS_TOKEN, name='bench_recheck',
+                                     endpoint=fake.url, data_endpoint=fake.url)
+            result = recheck_period(api, draw, options['chunk_size'])
+            self.stdout.write(json.dumps(result, ensure_ascii=False))
+            again = recheck_period(api, draw, options['chunk_size'])
+            self.stdout.write(f'再次執行 (應無新的中獎與通知): {json.dumps(again, ensure_ascii=False)}')
+            self.stdout.write(f'模擬 LINE API: {json.dumps(fake.stats(), ensure_ascii=False)}')
+
+            # One push per saved invoice would be invoices x API latency
+            per_invoice = options['invoices'] * options['fake_latency_ms'] / 1000
+            self.stdout.write(self.style.SUCCESS(
+                f'{options["invoices"]:,} 張發票：批次對獎 {result["seconds"]} 秒，'
+                f'{result["multicasts"]} 次 multicast 通知 {result["notified"]} 位中獎者 '
+                f'(逐張推播約需 {per_invoice:,.0f} 秒)'
+            ))
+        finally:
+            fake.stop()
+            teardown_databases(old_config, verbosity=0)
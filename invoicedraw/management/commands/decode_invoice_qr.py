@@ -0,0 +1,37 @@
+import json
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicedraw.qr import ImageTooLarge, QRUnavailable, get_reader, read_limited
+
+
+class Command(BaseCommand):
+    help = '以本機圖片檔測試電子發票 QR Code 的解碼與對獎 (與 bot 收到圖片時相同的流程)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('images', nargs='+', help='發票照片檔')
+
+    def handle(self, *args, **options):
+        reader = get_reader()
+        for path in options['images']:
+            try:
+                with open(path, 'rb') as f:
+                    content = read_limited(iter(partial(f.read, reader.chunk_size), b''), reader.max_bytes)
+                results = reader.check(reader.decode(content))
+            except OSError as e:
+                raise CommandError(f'無法讀取檔案 {path}: {e}') from e
+            except ImageTooLarge as e:
+                self.stdout.write(self.style.WARNING(f'{path}: {e}'))
+                continue
+            except QRUnavailable as e:
+                raise CommandError(f'無法解碼 QR Code：{e} (請安裝 pyzbar 與 Pillow)') from e
+            if not results:
+                self.stdout.write(self.style.WARNING(f'{path}: 找不到電子發票 QR Code'))
+            for invoice, draw, prize in results:
+                if draw is None:
+                    result = '尚未開獎'
+                else:
+                    result = f'{prize.name} {prize.amount:,} 元' if prize else '未中獎'
+                self.stdout.write(f'{path}: {invoice.track}-{invoice.number} 開立 {invoice.issued} ({invoice.period} 期) {result}')
+        self.stdout.write(json.dumps(reader.stats(), ensure_ascii=False, indent=2))
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from invoicedraw.fakefeed import NORMAL, SCENARIOS, FakeFeedServer
+
+
+class Command(BaseCommand):
+    help = '啟動本機模擬財政部開獎 XML (正常、緩慢、截斷、500、空白、大型、格式變動)，供快取與解析效能測試使用'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='監聽位址')
+        parser.add_argument('--port', type=int, default=8766, help='監聽埠號')
+        parser.add_argument('--scenario', choices=SCENARIOS, default=NORMAL, help='/invoice.xml 的預設情境')
+        parser.add_argument('--periods', type=int, default=3, help='一般情境的期數')
+        parser.add_argument('--large-periods', type=int, default=600, help='large 情境的期數 (最多約 670 期)')
+        parser.add_argument('--slow-ms', type=float, default=2000.0, help='slow 情境回應前的延遲 (毫秒)')
+        parser.add_argument('--seed', type=int, default=0, help='隨機種子，決定各期中獎號碼')
+
+    def handle(self, *args, **options):
+        server = FakeFeedServer(
+            host=options['host'],
+            port=options['port'],
+            scenario=options['scenario'],
+            periods=options['periods'],
+            large_periods=options['large_periods'],
+            slow_delay=options['slow_ms'] / 1000,
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'模擬開獎 XML 已啟動：{server.url} (情境 {server.scenario})'))
+        self.stdout.write(f'讓 bot 連到此伺服器：INVOICE_FEED_URL={server.url} python manage.py runserver')
+        self.stdout.write(f'指定情境：{server.feed_url("<情境>")}，情境：{", ".join(SCENARIOS)}')
+        base = server.url.rsplit('/', 1)[0]
+        self.stdout.write(f'切換預設情境：POST {base}/fake/scenario?name=error，統計：{base}/fake/stats')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('收到中斷訊號，停止模擬伺服器')
+        finally:
+            server.stop()
+        self.stdout.write(json.dumps(server.stats(), ensure_ascii=False, indent=2))
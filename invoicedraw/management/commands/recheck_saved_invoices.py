@@ -0,0 +1,42 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicedraw.draw import normalize_period
+from invoicedraw.recheck import recheck_period
+from invoicedraw.service import DrawUnavailable, get_service
+from linebotcore.client import build_line_bot_api
+
+
+class Command(BaseCommand):
+    help = '以開獎號碼批次核對使用者儲存的發票，並以 multicast (每次最多 500 人) 通知中獎者'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', default=None, help='期別 (例如 11307)，預設為最新一期')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='每個交易核對的發票數')
+        parser.add_argument('--dry-run', action='store_true', help='只核對並記錄獎別，不發送通知')
+
+    def handle(self, *args, **options):
+        service = get_service()
+        try:
+            if options['period']:
+                period = normalize_period(options['period'])
+                if period is None:
+                    raise CommandError(f'無法辨識的期別：{options["period"]}')
+                draw = service.period(period)
+            else:
+                draw = service.current()
+        except DrawUnavailable as e:
+            raise CommandError(str(e)) from e
+        if draw is None or draw.period is None:
+            raise CommandError('找不到該期的開獎資料，請先執行 sync_invoice_draws')
+
+        api = build_line_bot_api(settings.LINE_CHANNEL_ACCESS_TOKEN)
+        result = recheck_period(api, draw, options['chunk_size'], options['dry_run'])
+        self.stdout.write(json.dumps(result, ensure_ascii=False))
+        self.stdout.write(self.style.SUCCESS(
+            f'{draw.title}：核對 {result["candidates"]} 張候選發票，中獎 {result["winners"]} 張，'
+            f'通知 {result["notified"]}/{result["users"]} 位使用者 ({result["multicasts"]} 次 multicast)，'
+            f'耗時 {result["seconds"]} 秒'
+        ))
@@ -0,0 +1,56 @@
+import json
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from invoicedraw.draw import TAIPEI
+from invoicedraw.recheck import recheck_period
+from invoicedraw.scheduler import DrawScheduler
+from invoicedraw.service import get_config, get_service
+from linebotcore.client import build_line_bot_api
+
+
+class Command(BaseCommand):
+    help = '定期更新開獎資料 (開獎日更頻繁)，並寫入快照檔供各 bot 程序讀取'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='只更新一次後結束 (例如由 cron 執行)')
+        parser.add_argument('--recheck', action='store_true',
+                            help='出現新一期時，批次核對使用者儲存的發票並通知中獎者')
+
+    def handle(self, *args, **options):
+        if not get_config()['SNAPSHOT_PATH']:
+            self.stdout.write(self.style.WARNING(
+                "未設定 INVOICE_DRAW['SNAPSHOT_PATH']，更新結果只留在此程序，bot 程序無法取得"
+            ))
+        service = get_service()
+        scheduler = DrawScheduler(service)
+        api = build_line_bot_api(settings.LINE_CHANNEL_ACCESS_TOKEN) if options['recheck'] else None
+        rechecked = None
+        try:
+            while True:
+                failures = scheduler.failures
+                delay = scheduler.run_once()
+                now = datetime.now(TAIPEI).strftime('%Y-%m-%d %H:%M:%S')
+                source = service.stats()['source']
+                if scheduler.failures == failures:
+                    draw = service.current()
+                    self.stdout.write(f'{now} 已更新，最新一期 {draw.title}')
+                    if api is not None and draw.period != rechecked:
+                        # Idempotent, so also run for the period current at startup
+                        result = recheck_period(api, draw)
+                        rechecked = draw.period
+                        self.stdout.write(f'{draw.title} 儲存發票對獎：{json.dumps(result, ensure_ascii=False)}')
+                elif source is None:
+                    self.stdout.write(self.style.ERROR(f'{now} 更新失敗：{scheduler.last_error}'))
+                else:
+                    self.stdout.write(self.style.WARNING(f'{now} 無法連線到開獎資料來源，暫用 {source} 資料'))
+                if options['once']:
+                    break
+                self.stdout.write(f'{delay:.0f} 秒後再次更新')
+                time.sleep(delay)
+        except KeyboardInterrupt:
+            self.stdout.write('收到中斷訊號，停止更新')
+        self.stdout.write(self.style.SUCCESS(f'更新 {scheduler.runs} 次，失敗 {scheduler.failures} 次'))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceDraw',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=5, unique=True, verbose_name='期別')),
+                ('title', models.CharField(max_length=50, verbose_name='標題')),
+                ('special', models.CharField(blank=True, max_length=8, verbose_name='特別獎')),
+                ('grand', models.CharField(blank=True, max_length=8, verbose_name='特獎')),
+                ('first', models.JSONField(default=list, verbose_name='頭獎')),
+                ('extra_sixth', models.JSONField(blank=True, default=list, verbose_name='增開六獎')),
+                ('synced_at', models.DateTimeField(auto_now=True, verbose_name='同步時間')),
+            ],
+            options={
+                'verbose_name': '開獎號碼',
+                'verbose_name_plural': '開獎號碼',
+                'ordering': ['-period'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicedraw', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedInvoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(max_length=64, verbose_name='使用者 ID')),
+                ('number', models.CharField(max_length=8, verbose_name='發票號碼')),
+                ('suffix', models.CharField(editable=False, max_length=3, verbose_name='後三碼')),
+                ('period', models.CharField(max_length=5, verbose_name='期別')),
+                ('saved_at', models.DateTimeField(auto_now_add=True, verbose_name='儲存時間')),
+                ('prize', models.CharField(blank=True, max_length=8, verbose_name='獎別')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='獎金')),
+                ('claim_token', models.CharField(blank=True, max_length=32, verbose_name='領取代碼')),
+                ('checked_at', models.DateTimeField(blank=True, null=True, verbose_name='對獎時間')),
+                ('notified_at', models.DateTimeField(blank=True, null=True, verbose_name='通知時間')),
+            ],
+            options={
+                'verbose_name': '儲存的發票',
+                'verbose_name_plural': '儲存的發票',
+                'indexes': [models.Index(fields=['period', 'suffix'], name='invoicedraw_saved_suffix'), models.Index(fields=['user_id', 'id'], name='invoicedraw_saved_user')],
+                'constraints': [models.UniqueConstraint(fields=('user_id', 'period', 'number'), name='invoicedraw_saved_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,101 @@
+from django.db import models
+
+from .draw import EXTRA_SIXTH, FIRST, GRAND, SPECIAL, Draw, format_text
+
+
+class InvoiceDraw(models.Model):
+    """
+    Winning numbers of one draw period, kept after the period leaves the feed.
+    Rows are upserted by ``sync_invoice_draws``; ``period`` is the lookup key.
+    """
+    period = models.CharField(max_length=5, unique=True, verbose_name='期別')   # e.g. '11307'
+    title = models.CharField(max_length=50, verbose_name='標題')
+    special = models.CharField(max_length=8, blank=True, verbose_name='特別獎')
+    grand = models.CharField(max_length=8, blank=True, verbose_name='特獎')
+    first = models.JSONField(default=list, verbose_name='頭獎')
+    extra_sixth = models.JSONField(default=list, blank=True, verbose_name='增開六獎')
+    synced_at = models.DateTimeField(auto_now=True, verbose_name='同步時間')
+
+    def __str__(self):
+        return self.title
+
+    @classmethod
+    def from_draw(cls, draw):
+        """
+        Unsaved row holding a parsed draw period.
+
+        Args:
+            draw (Draw): Parsed period with a period key
+
+        Returns:
+            InvoiceDraw: Row to save or bulk upsert
+        """
+        numbers = draw.numbers
+        return cls(
+            period=draw.period,
+            title=draw.title,
+            special=numbers[SPECIAL][0] if numbers[SPECIAL] else '',
+            grand=numbers[GRAND][0] if numbers[GRAND] else '',
+            first=list(numbers[FIRST]),
+            extra_sixth=list(numbers[EXTRA_SIXTH]),
+        )
+
+    def to_draw(self):
+        """
+        The indexed Draw of this period.
+
+        Returns:
+            Draw: Same lookups as a period parsed from the feed
+        """
+        text = format_text({
+            SPECIAL: [self.special] if self.special else [],
+            GRAND: [self.grand] if self.grand else [],
+            FIRST: self.first,
+            EXTRA_SIXTH: self.extra_sixth,
+        })
+        return Draw(self.title, text)
+
+    class Meta:
+        verbose_name = '開獎號碼'
+        verbose_name_plural = '開獎號碼'
+        ordering = ['-period']
+
+
+class SavedInvoice(models.Model):
+    """
+    An invoice number a user saved with ``存 12345678``, checked in bulk by
+    ``recheck_saved_invoices`` once its period is drawn.
+
+    ``suffix`` (the last 3 digits) is indexed with the period, so the bulk
+    check only reads the rows whose suffix matches a winning number.
+    """
+    user_id = models.CharField(max_length=64, verbose_name='使用者 ID')
+    number = models.CharField(max_length=8, verbose_name='發票號碼')
+    suffix = models.CharField(max_length=3, editable=False, verbose_name='後三碼')
+    period = models.CharField(max_length=5, verbose_name='期別')
+    saved_at = models.DateTimeField(auto_now_add=True, verbose_name='儲存時間')
+    prize = models.CharField(max_length=8, blank=True, verbose_name='獎別')
+    amount = models.PositiveIntegerField(default=0, verbose_name='獎金')
+    claim_token = models.CharField(max_length=32, blank=True, verbose_name='領取代碼')
+    checked_at = models.DateTimeField(null=True, blank=True, verbose_name='對獎時間')
+    notified_at = models.DateTimeField(null=True, blank=True, verbose_name='通知時間')
+
+    def save(self, *args, **kwargs):
+        self.suffix = self.number[-3:]
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.number} ({self.period})'
+
+    class Meta:
+        verbose_name = '儲存的發票'
+        verbose_name_plural = '儲存的發票'
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'period', 'number'], name='invoicedraw_saved_unique'),
+        ]
+        indexes = [
+            # Bulk check: WHERE period = ? AND suffix IN (winning suffixes)
+            models.Index(fields=['period', 'suffix'], name='invoicedraw_saved_suffix'),
+            # @我的發票: WHERE user_id = ? ORDER BY id DESC
+            models.Index(fields=['user_id', 'id'], name='invoicedraw_saved_user'),
+        ]
@@ -0,0 +1,291 @@
+"""
+Reading e-invoice numbers from photos of the invoice's QR code.
+
+The left QR code of a Taiwan e-invoice starts with the invoice number (2
+track letters + 8 digits) and the issue date (ROC ``yyyMMdd``), which gives
+the draw period.  A photo sent to the bot goes through three stages, each
+timed under ``invoice_qr`` on ``/linebot/stats``:
+
+* ``download``: the image content is streamed from LINE in chunks and
+  abandoned as soon as it exceeds ``MAX_BYTES``;
+* ``decode``: the QR codes are decoded locally with pyzbar, in a process pool
+  so the CPU-heavy work does not hold the worker thread (or the GIL); its
+  processes are spawned, not forked, see invoicedraw.qrdecode;
+* ``check``: the numbers are checked against the cached draw of their period.
+
+pyzbar and Pillow are optional (``pip install pyzbar Pillow`` plus the zbar
+shared library); without them ``QRUnavailable`` is raised and the bot asks for
+the number as text instead.
+"""
+
+import multiprocessing
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+
+from django.conf import settings
+
+from linebotcore import metrics
+
+from .draw import period_of
+from .qrdecode import decode_image, pyzbar
+from .service import get_service
+
+# Default decoding configuration, overridden by settings.INVOICE_QR
+DEFAULTS = {
+    'MAX_BYTES': 5 * 1024 * 1024,   # Larger images are not downloaded completely
+    'CHUNK_SIZE': 64 * 1024,        # Download chunk size
+    'WORKERS': 2,                   # Decoder processes
+    'DECODE_TIMEOUT': 10,           # Seconds to wait for a decoder process
+    'MAX_SIDE': 1600,               # Photos are scaled down to this many pixels before decoding
+}
+
+# Invoice number and ROC issue date at the start of the left QR code
+INVOICE_QR = re.compile(r'([A-Z]{2})([0-9]{8})([0-9]{3})([0-9]{2})([0-9]{2})')
+
+InvoiceQR = namedtuple('InvoiceQR', ['track', 'number', 'issued', 'period'])
+
+STAGES = ('download', 'decode', 'check')
+
+
+class QRUnavailable(Exception):
+    """The QR decoder (pyzbar / Pillow) is not installed or its worker processes failed."""
+
+
+class ImageTooLarge(Exception):
+    """The image exceeds MAX_BYTES."""
+
+
+def get_config():
+    """
+    Merge the project's INVOICE_QR setting over the defaults.
+
+    Returns:
+        dict: Effective decoding configuration
+    """
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'INVOICE_QR', {}))
+    return config
+
+
+def parse_invoice_qr(text):
+    """
+    Invoice number and period of an e-invoice QR code.
+
+    Args:
+        text (str): Decoded QR code text
+
+    Returns:
+        InvoiceQR or None: None if the text is not the left QR code of an e-invoice
+    """
+    match = INVOICE_QR.match(text)
+    if not match:
+        return None
+    track, number, year, month, day = match.groups()
+    try:
+        issued = date(int(year) + 1911, int(month), int(day))
+    except ValueError:
+        return None
+    return InvoiceQR(track, number, issued, period_of(issued))
+
+
+def read_limited(chunks, max_bytes):
+    """
+    Join content chunks, giving up once they exceed ``max_bytes``.
+
+    Args:
+        chunks (iterable[bytes]): Content chunks, e.g. Content.iter_content()
+        max_bytes (int): Size cap
+
+    Returns:
+        bytes: The whole content
+
+    Raises:
+        ImageTooLarge: As soon as the cap is exceeded; the rest is not read
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise ImageTooLarge(f'圖片超過 {max_bytes // 1024} KB')
+    return bytes(buffer)
+
+
+class QRReader:
+    """
+    Downloads, decodes and checks invoice photos, with a shared decoder pool.
+    """
+
+    def __init__(self, config=None):
+        config = config or get_config()
+        self.max_bytes = config['MAX_BYTES']
+        self.chunk_size = config['CHUNK_SIZE']
+        self.workers = config['WORKERS']
+        self.decode_timeout = config['DECODE_TIMEOUT']
+        self.max_side = config['MAX_SIDE']
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.latency = {stage: metrics.LatencyStats() for stage in STAGES}
+        self.images = 0
+        self.too_large = 0
+        self.undecodable = 0      # Not an image, or decoding failed
+        self.without_invoice = 0  # No e-invoice QR code found
+        self.invoices = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def download(self, api, message_id):
+        """
+        Stream the content of an image message, capped at MAX_BYTES.
+
+        Args:
+            api (LineBotApi): LINE API client
+            message_id (str): ID of the image message
+
+        Returns:
+            bytes: Image content
+        """
+        started = time.perf_counter()
+        content = api.get_message_content(message_id)
+        try:
+            return read_limited(content.iter_content(self.chunk_size), self.max_bytes)
+        except ImageTooLarge:
+            self.too_large += 1
+            raise
+        finally:
+            # Closing an unfinished download drops the connection instead of reading the rest
+            # (both the pooled and the SDK's default client return RequestsHttpResponse)
+            content.response.response.close()
+            self.latency['download'].record(time.perf_counter() - started)
+
+    def decode(self, content):
+        """
+        Invoices in the QR codes of an image, decoded in the process pool.
+
+        Args:
+            content (bytes): Encoded image
+
+        Returns:
+            list[InvoiceQR]: Distinct invoices found, empty if none
+
+        Raises:
+            QRUnavailable: If pyzbar / Pillow are not installed or the pool broke
+        """
+        if pyzbar is None:
+            raise QRUnavailable('未安裝 pyzbar / Pillow')
+        started = time.perf_counter()
+        try:
+            texts = self._get_pool().submit(decode_image, content, self.max_side).result(self.decode_timeout)
+        except BrokenProcessPool as e:
+            # A decoder process died (e.g. out of memory); start a new pool next time
+            with self._pool_lock:
+                self._pool = None
+            raise QRUnavailable(f'解碼程序異常結束: {e}') from e
+        except Exception:
+            # Not an image, an unsupported format or a decoding timeout
+            self.undecodable += 1
+            return []
+        finally:
+            self.latency['decode'].record(time.perf_counter() - started)
+        invoices = list(dict.fromkeys(filter(None, map(parse_invoice_qr, texts))))
+        if not invoices:
+            self.without_invoice += 1
+        return invoices
+
+    def check(self, invoices):
+        """
+        The prize of each invoice, against the draw of its own period.
+
+        Args:
+            invoices (list[InvoiceQR]): Decoded invoices
+
+        Returns:
+            list[tuple]: (InvoiceQR, Draw or None if not drawn yet, Prize or None)
+        """
+        started = time.perf_counter()
+        service = get_service()
+        results = []
+        for invoice in invoices:
+            draw = service.period(invoice.period)
+            results.append((invoice, draw, draw.check(invoice.number) if draw else None))
+        self.latency['check'].record(time.perf_counter() - started)
+        return results
+
+    def read(self, api, message_id):
+        """
+        Download, decode and check the invoices of an image message.
+
+        Args:
+            api (LineBotApi): LINE API client
+            message_id (str): ID of the image message
+
+        Returns:
+            list[tuple]: See ``check``
+
+        Raises:
+            ImageTooLarge: If the image exceeds MAX_BYTES
+            QRUnavailable: If the decoder is not available
+        """
+        self.images += 1
+        invoices = self.decode(self.download(api, message_id))
+        self.invoices += len(invoices)
+        return self.check(invoices)
+
+    def stats(self):
+        """
+        Image counters and per-stage latency.
+
+        Returns:
+            dict: QR reader stats
+        """
+        return {
+            'available': pyzbar is not None,
+            'images': self.images,
+            'invoices': self.invoices,
+            'too_large': self.too_large,
+            'undecodable': self.undecodable,
+            'without_invoice': self.without_invoice,
+            'stages': {stage: stats.summary() for stage, stats in self.latency.items()},
+        }
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_reader():
+    """
+    Return the process-wide QR reader, creating it from settings on first use.
+
+    Returns:
+        QRReader: The shared reader
+    """
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                _reader = QRReader()
+    return _reader
+
+
+def stats():
+    """
+    Stats provider registered with linebotcore.metrics.
+
+    Returns:
+        dict: QR reader stats, or an empty dict before first use
+    """
+    return _reader.stats() if _reader is not None else {}
+
+
+metrics.register('invoice_qr', stats)
@@ -0,0 +1,35 @@
+"""
+QR code decoding run in the decoder processes of invoicedraw.qr.
+
+The pool starts its processes with ``spawn`` (forking the threaded web
+worker could copy a lock held by another thread), so each decoder process
+imports this module afresh.  It therefore imports neither Django nor the
+rest of invoicedraw: only Pillow and pyzbar.
+"""
+
+import io
+
+try:
+    from PIL import Image
+    from pyzbar import pyzbar
+except ImportError:  # Optional dependencies, see invoicedraw.qr
+    Image = pyzbar = None
+
+
+def decode_image(content, max_side):
+    """
+    Decode every QR code of an image; runs in a decoder process.
+
+    Args:
+        content (bytes): Encoded image (JPEG, PNG, ...)
+        max_side (int): Longest side the image is scaled down to first
+
+    Returns:
+        list[str]: Texts of the QR codes found
+    """
+    image = Image.open(io.BytesIO(content))
+    # JPEG photos are decoded straight at a reduced scale, then converted to grayscale
+    image.draft('L', (max_side, max_side))
+    image = image.convert('L')
+    image.thumbnail((max_side, max_side))
+    return [symbol.data.decode('utf-8', 'replace') for symbol in pyzbar.decode(image)]
@@ -0,0 +1,140 @@
+"""
+Bulk check of saved invoices against a newly drawn period.
+
+Saved invoices are never checked one by one.  ``check_saved`` asks the
+database only for the rows of the period whose 3-digit suffix is one of the
+draw's winning suffixes (an indexed ``(period, suffix)`` lookup, about 1 row
+in 100) and checks those with ``Draw.check``; every other saved number of the
+period cannot win anything.  ``notify_winners`` then tells the winners with
+multicast calls of up to 500 users each, instead of one push per invoice.
+
+Both steps are idempotent and safe to run from several processes: candidate
+rows are claimed with a token before they are checked (as in
+linebotcore.inbox), and the winning rows of each multicast chunk are claimed
+the same way (marked notified) before the call, so overlapping runs never
+send the same winners twice.  A chunk whose multicast fails is released for
+the next run; a run that dies between the claim and the call leaves those
+users unnotified.
+"""
+
+import logging
+import time
+import uuid
+
+from django.db import transaction
+from django.utils import timezone
+from linebot.exceptions import LineBotApiError
+from linebot.models import TextSendMessage
+
+from .models import SavedInvoice
+
+logger = logging.getLogger(__name__)
+
+# LINE accepts at most 500 user IDs per multicast call
+MULTICAST_LIMIT = 500
+
+
+def check_saved(draw, chunk_size=2000):
+    """
+    Record the prizes of the saved invoices of a drawn period.
+
+    Args:
+        draw (Draw): The drawn period (with a period key)
+        chunk_size (int): Candidate rows claimed and checked per transaction
+
+    Returns:
+        dict: ``candidates`` checked and ``winners`` found
+    """
+    suffixes = sorted(draw.winning_suffixes)
+    pending = SavedInvoice.objects.filter(period=draw.period, suffix__in=suffixes, checked_at__isnull=True)
+    candidates = winners = 0
+    last_id = 0
+    while True:
+        ids = list(pending.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+        token = uuid.uuid4().hex
+        with transaction.atomic():
+            # checked_at IS NULL in the UPDATE keeps two runs from claiming the same row
+            pending.filter(id__in=ids).update(claim_token=token, checked_at=timezone.now())
+            rows = list(SavedInvoice.objects.filter(claim_token=token).only('id', 'number'))
+            prizes = draw.check_many([row.number for row in rows])
+            won = []
+            for row, prize in zip(rows, prizes):
+                if prize is not None:
+                    row.prize, row.amount = prize.name, prize.amount
+                    won.append(row)
+            SavedInvoice.objects.bulk_update(won, ['prize', 'amount'])
+        candidates += len(rows)
+        winners += len(won)
+    return {'candidates': candidates, 'winners': winners}
+
+
+def notify_winners(api, draw, dry_run=False):
+    """
+    Tell every user with a winning saved invoice of the period, 500 users per multicast.
+
+    The message is the same for everyone (details come from ``@我的發票``), so
+    users are grouped regardless of their prizes.
+
+    Args:
+        api (LineBotApi): LINE API client
+        draw (Draw): The drawn period
+        dry_run (bool): Count the users without sending or marking anything
+
+    Returns:
+        dict: ``users`` to notify, ``notified`` users, ``multicasts`` sent and ``failed`` calls
+    """
+    unnotified = SavedInvoice.objects.filter(
+        period=draw.period, checked_at__isnull=False, notified_at__isnull=True,
+    ).exclude(prize='')
+    user_ids = sorted(set(unnotified.values_list('user_id', flat=True)))
+    result = {'users': len(user_ids), 'notified': 0, 'multicasts': 0, 'failed': 0}
+    if dry_run:
+        return result
+
+    message = TextSendMessage(
+        text=f'恭喜！您儲存的發票在 {draw.title} 中獎了！\n請輸入「@我的發票」查看中獎號碼與獎金。'
+    )
+    for start in range(0, len(user_ids), MULTICAST_LIMIT):
+        token = uuid.uuid4().hex
+        # notified_at IS NULL in the UPDATE keeps an overlapping run from claiming the same rows
+        unnotified.filter(user_id__in=user_ids[start:start + MULTICAST_LIMIT]).update(
+            claim_token=token, notified_at=timezone.now(),
+        )
+        claimed = SavedInvoice.objects.filter(claim_token=token)
+        chunk = sorted(set(claimed.values_list('user_id', flat=True)))
+        if not chunk:
+            continue
+        try:
+            api.multicast(chunk, message)
+        except LineBotApiError as e:
+            # Release the claim: these users are retried by the next run
+            logger.error(f"Multicast of invoice winners failed: {e}")
+            claimed.update(notified_at=None)
+            result['failed'] += 1
+            continue
+        result['multicasts'] += 1
+        result['notified'] += len(chunk)
+    return result
+
+
+def recheck_period(api, draw, chunk_size=2000, dry_run=False):
+    """
+    Check the saved invoices of a drawn period and notify the winners.
+
+    Args:
+        api (LineBotApi): LINE API client
+        draw (Draw): The drawn period
+        chunk_size (int): Candidate rows checked per transaction
+        dry_run (bool): Check and record prizes, but do not notify
+
+    Returns:
+        dict: Counts of both steps and the elapsed seconds
+    """
+    started = time.perf_counter()
+    result = check_saved(draw, chunk_size)
+    result.update(notify_winners(api, draw, dry_run))
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
@@ -0,0 +1,76 @@
+"""
+Synthetic draw feeds in the layout of invoice.xml, for benchmarks and local
+stand-ins of the upstream.
+"""
+
+import random
+from datetime import datetime
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+from .draw import TAIPEI
+
+FEED_HEAD = '<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel><title>統一發票中獎號碼</title>\n'
+FEED_TAIL = '</channel></rss>\n'
+
+# Description layouts: one <p> per tier (the current feed), or every tier on
+# one line separated by spaces (the older layout show3digit special-cases)
+PARAGRAPHS = 'paragraphs'
+INLINE = 'inline'
+
+
+def sample_periods(count, newest=(113, 7)):
+    """
+    Titles and announcement dates of ``count`` consecutive draw periods, newest first.
+
+    Args:
+        count (int): Number of periods
+        newest (tuple): (ROC year, odd first month) of the newest period
+
+    Returns:
+        list[tuple]: (title such as '113年07月、08月', RFC 822 date of the 25th of the following month)
+    """
+    year, month = newest
+    periods = []
+    for _ in range(count):
+        announced_year, announced_month = (year + 1911, month + 2) if month < 11 else (year + 1912, 1)
+        announced = datetime(announced_year, announced_month, 25, 13, 30, tzinfo=TAIPEI)
+        periods.append((f'{year}年{month:02d}月、{month + 1:02d}月', format_datetime(announced)))
+        month -= 2
+        if month < 1:
+            year, month = year - 1, 11
+    return periods
+
+
+def sample_feed(periods=3, seed=None, newest=(113, 7), layout=PARAGRAPHS):
+    """
+    A draw feed with random winning numbers.
+
+    Args:
+        periods (int): Number of <item> periods
+        seed (int): Random seed, for reproducible numbers
+        newest (tuple): (ROC year, odd first month) of the newest period
+        layout (str): PARAGRAPHS or INLINE; the same seed gives the same numbers in both
+
+    Returns:
+        bytes: UTF-8 encoded RSS XML
+    """
+    rng = random.Random(seed)
+
+    def number():
+        return f'{rng.randrange(10 ** 8):08d}'
+
+    parts = [FEED_HEAD]
+    for title, announced in sample_periods(periods, newest):
+        tiers = (f'特別獎：{number()}', f'特獎：{number()}', f'頭獎：{number()}、{number()}、{number()}')
+        if layout == INLINE:
+            description = ' '.join(tiers)
+        else:
+            description = ''.join(f'<p>{tier}</p>' for tier in tiers)
+        parts.append(
+            f'<item><title>{escape(title)}</title><link>https://invoice.etax.nat.gov.tw/</link>'
+            f'<pubDate>{announced}</pubDate>'
+            f'<description><![CDATA[{description}]]></description></item>\n'
+        )
+    parts.append(FEED_TAIL)
+    return ''.join(parts).encode('utf-8')
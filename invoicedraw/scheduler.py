@@ -0,0 +1,211 @@
+"""
+Background refresh of the draw feed.
+
+With only a TTL cache, the first invoice query after the TTL runs out waits
+for the upstream.  ``DrawScheduler`` refreshes the shared ``DrawService``
+ahead of time instead, and marks it ``scheduled`` so an expired copy is
+served while the next refresh runs.  The new periods are swapped in with a
+single assignment, so readers see either the old or the new index.
+
+Refreshes run every ``REFRESH_INTERVAL`` seconds, and every
+``DRAW_REFRESH_INTERVAL`` seconds on draw days (the 25th of odd months,
+from ``DRAW_HOUR`` Taiwan time) until the newly drawn period is in the feed.
+
+The scheduler runs either as a thread in the web workers (opt-in with
+``INVOICE_DRAW['SCHEDULER']``, started by InvoicedrawConfig.ready) or as its
+own process with ``manage.py run_draw_scheduler``, in which case workers pick
+up its result from the snapshot file.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from linebotcore import metrics
+
+from .draw import TAIPEI
+from .service import DrawUnavailable, get_config, get_service
+
+logger = logging.getLogger(__name__)
+
+# How long after DRAW_HOUR on the 25th the fast refresh may last
+DRAW_WINDOW = timedelta(hours=36)
+
+
+def expected_period(day):
+    """
+    Period key drawn on the 25th of an odd month: the two months before it.
+
+    Args:
+        day (date or datetime): Draw day, e.g. 2024-09-25
+
+    Returns:
+        str: Period key, e.g. '11307'
+    """
+    year, month = day.year - 1911, day.month - 2
+    if month < 1:
+        year, month = year - 1, month + 12
+    return f'{year:03d}{month:02d}'
+
+
+def draw_window_start(local, draw_hour):
+    """
+    Start of the draw window that is in progress or comes next.
+
+    Args:
+        local (datetime): Current Taiwan time
+        draw_hour (int): Hour of the 25th the results are expected
+
+    Returns:
+        datetime: DRAW_HOUR on the 25th of an odd month
+    """
+    year, month = local.year, local.month
+    if month % 2 == 0:
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    start = datetime(year, month, 25, draw_hour, tzinfo=TAIPEI)
+    if start + DRAW_WINDOW <= local:
+        year, month = (year + 1, 1) if month == 11 else (year, month + 2)
+        start = datetime(year, month, 25, draw_hour, tzinfo=TAIPEI)
+    return start
+
+
+def next_delay(now, current_period, config):
+    """
+    Seconds until the next refresh.
+
+    Args:
+        now (datetime): Current time (timezone-aware)
+        current_period (str): Period key of the newest cached draw, None if nothing is cached
+        config (dict): Effective INVOICE_DRAW configuration
+
+    Returns:
+        float: Delay before the next refresh
+    """
+    local = now.astimezone(TAIPEI)
+    start = draw_window_start(local, config['DRAW_HOUR'])
+    if start <= local:
+        if current_period != expected_period(start):
+            return config['DRAW_REFRESH_INTERVAL']
+        # Drawn already: back to the normal pace until the next draw day
+        start = draw_window_start(start + DRAW_WINDOW, config['DRAW_HOUR'])
+    return max(min(config['REFRESH_INTERVAL'], (start - local).total_seconds()), 1)
+
+
+class DrawScheduler:
+    """
+    Refreshes a DrawService on a schedule, in a daemon thread or in the foreground.
+    """
+
+    def __init__(self, service=None, config=None):
+        self.service = service or get_service()
+        self.config = config or get_config()
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.failures = 0
+        self.last_run = None
+        self.last_error = None
+        self.next_run_at = None
+
+    def run_once(self):
+        """
+        Refresh the service once.
+
+        Returns:
+            float: Seconds until the next refresh should run
+        """
+        errors = self.service.errors
+        started = time.time()
+        try:
+            items = self.service.refresh()
+            current_period = items[0].period
+        except DrawUnavailable as e:
+            current_period = None
+            self.last_error = str(e)
+        self.runs += 1
+        self.last_run = started
+        delay = next_delay(datetime.now(TAIPEI), current_period, self.config)
+        if self.service.errors != errors:
+            # Upstream failed (stale or stored periods are being served): retry sooner
+            self.failures += 1
+            delay = min(delay, self.config['RETRY_AFTER'])
+        self.next_run_at = time.time() + delay
+        return delay
+
+    def run(self):
+        """Refresh until ``stop`` is called."""
+        while not self._stop.is_set():
+            try:
+                delay = self.run_once()
+            except Exception:
+                logger.exception("Error refreshing invoice draws")
+                delay = self.config['RETRY_AFTER']
+            self._stop.wait(delay)
+
+    def start(self):
+        """
+        Run the scheduler in a daemon thread and let the service serve expired copies.
+
+        Returns:
+            DrawScheduler: self
+        """
+        self.service.scheduled = True
+        self._thread = threading.Thread(target=self.run, name='invoice-draw-scheduler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the thread; requests wait for the upstream again once the cache expires."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.service.scheduled = False
+
+    def stats(self):
+        """
+        Refresh counters and timing.
+
+        Returns:
+            dict: Scheduler stats
+        """
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'runs': self.runs,
+            'failures': self.failures,
+            'last_run_s_ago': round(time.time() - self.last_run, 1) if self.last_run else None,
+            'next_run_in_s': round(self.next_run_at - time.time(), 1) if self.next_run_at else None,
+            'last_error': self.last_error,
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler():
+    """
+    Start the process-wide scheduler thread for the shared draw service, once.
+
+    Returns:
+        DrawScheduler: The running scheduler
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = DrawScheduler().start()
+    return _scheduler
+
+
+def stats():
+    """
+    Stats provider registered with linebotcore.metrics.
+
+    Returns:
+        dict: Scheduler stats, or an empty dict when no scheduler thread runs
+    """
+    return _scheduler.stats() if _scheduler is not None else {}
+
+
+metrics.register('invoice_draw_scheduler', stats)
@@ -0,0 +1,531 @@
+"""
+Shared access to the Ministry of Finance invoice draw feed.
+
+Every invoice command used to ``requests.get`` the draw XML and re-parse it
+for each user message.  ``DrawService`` keeps the parsed feed in a
+process-wide cache:
+
+* entries live for ``TTL`` seconds, then the feed is revalidated with
+  ``If-None-Match`` / ``If-Modified-Since`` (a 304 only extends the entry);
+* concurrent misses are coalesced (single-flight): one thread fetches, the
+  others wait for its result;
+* when the upstream fails, the last good feed keeps being served for up to
+  ``STALE_IF_ERROR`` seconds, retrying every ``RETRY_AFTER`` seconds;
+* the last good feed is saved to ``SNAPSHOT_PATH`` and loaded when the
+  service is created, so a restarted worker answers without waiting for
+  the upstream (see invoicedraw.snapshot);
+* a DrawScheduler (invoicedraw.scheduler) can refresh the feed in the
+  background, so user requests never wait for the upstream; other processes
+  pick up its result from the snapshot instead of fetching again;
+* without a usable feed (offline, or a cold start while the upstream is
+  down) the latest periods stored by ``sync_invoice_draws`` are served;
+  when there are none either, the failure itself is cached for
+  ``RETRY_AFTER`` seconds, so every message does not wait for the upstream
+  timeout before getting the "unavailable" reply.
+
+The feed is parsed while it streams in and the download stops once the
+``PERIODS`` newest periods are read; older periods come from ``InvoiceDraw``.
+
+Periods that have left the feed are looked up by key in the ``InvoiceDraw``
+table and kept in memory, since a past draw never changes.
+
+Hit ratio and upstream latency are reported under ``invoice_draw`` on
+``/linebot/stats``.
+"""
+
+import io
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+import requests
+import urllib3
+from django.conf import settings
+from django.db import DatabaseError
+
+from linebotcore import metrics
+
+from .draw import Draw
+from .models import InvoiceDraw
+from .snapshot import read_snapshot, write_snapshot
+
+# Default feed configuration, overridden by settings.INVOICE_DRAW
+DEFAULTS = {
+    'FEED_URL': 'https://invoice.etax.nat.gov.tw/invoice.xml',
+    'TTL': 600,                 # Seconds a fetched feed is served without revalidation
+    'STALE_IF_ERROR': 86400,    # Seconds an old feed may still be served while the upstream fails
+    'RETRY_AFTER': 30,          # Seconds between upstream retries while serving stale data or failing
+    'BATCH_LIMIT': 1000,        # Invoice numbers accepted by one batch check request
+    'BATCH_TOKENS': (),         # Bearer tokens accepted by the batch check endpoint (empty disables it)
+    'PERIODS': 3,               # Newest periods read from the feed (None reads all of them)
+    'SNAPSHOT_PATH': None,      # File the last good feed is saved to and loaded from at startup (None disables it)
+    'SCHEDULER': False,         # Refresh in a background thread of each web worker, see invoicedraw.scheduler
+    'REFRESH_INTERVAL': 3600,   # Seconds between scheduled refreshes
+    'DRAW_REFRESH_INTERVAL': 60,  # Seconds between scheduled refreshes on draw days until the new period is in
+    'DRAW_HOUR': 13,            # Taiwan-time hour of the 25th from which the new period is expected
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+}
+
+
+# Periods served from the database when the feed is unavailable, like the feed itself
+HISTORY_PERIODS = 3
+
+FEED = 'feed'
+SNAPSHOT = 'snapshot'
+HISTORY = 'history'
+
+
+class DrawUnavailable(Exception):
+    """The draw feed could not be fetched or parsed and no cached copy is usable."""
+
+
+def get_config():
+    """
+    Merge the project's INVOICE_DRAW setting over the defaults.
+
+    Returns:
+        dict: Effective feed configuration
+    """
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'INVOICE_DRAW', {}))
+    return config
+
+
+def iter_feed(source):
+    """
+    Stream the periods of the draw feed, newest first, as they are parsed.
+
+    The XML is read incrementally (``iterparse``) and each ``<item>`` is
+    released once its Draw is built, so stopping the iteration early stops
+    reading the source; neither the whole body nor the whole tree is held.
+    The prize text of a period (the description without its <p> markup, one
+    tier per line) is indexed once here, see invoicedraw.draw.
+
+    Args:
+        source (file-like): Binary stream of the feed XML (e.g. a raw HTTP response)
+
+    Yields:
+        Draw: The periods of the feed
+
+    Raises:
+        DrawUnavailable: If the XML is malformed before the requested periods are read
+    """
+    try:
+        for _, element in ET.iterparse(source, events=('end',)):
+            if element.tag != 'item':
+                continue
+            title = (element.findtext('title') or '').strip()
+            description = element.findtext('description') or ''
+            text = description.replace('<p>', '').replace('</p>', '\n').strip()
+            element.clear()
+            if title and text:
+                yield Draw(title, text)
+    except ET.ParseError as e:
+        raise DrawUnavailable(f'發票資料 XML 格式解析錯誤: {e}') from e
+
+
+def parse_feed(content, limit=None):
+    """
+    Parse the draw feed XML into its periods, newest first.
+
+    Args:
+        content (bytes or file-like): Feed XML, or a binary stream of it
+        limit (int): Stop after this many periods, None for all of them
+
+    Returns:
+        tuple[Draw]: The periods of the feed
+
+    Raises:
+        DrawUnavailable: If the XML is malformed or has no draw items
+    """
+    if isinstance(content, (bytes, bytearray)):
+        content = io.BytesIO(content)
+    items = []
+    for draw in iter_feed(content):
+        items.append(draw)
+        if limit is not None and len(items) >= limit:
+            break
+    if not items:
+        raise DrawUnavailable('發票 XML 中沒有找到任何開獎資料')
+    return tuple(items)
+
+
+class _CacheEntry:
+    __slots__ = ('items', 'etag', 'last_modified', 'fetched_at', 'expires_at', 'source')
+
+    def __init__(self, items, etag, last_modified, fetched_at, expires_at, source=FEED):
+        self.items = items
+        self.source = source              # FEED, SNAPSHOT (loaded at startup) or HISTORY (rows of InvoiceDraw)
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at      # Wall clock time of the last 200/304
+        self.expires_at = expires_at      # Monotonic deadline for serving without revalidation
+
+
+class _Flight:
+    # One in-progress upstream fetch shared by every waiting caller
+    __slots__ = ('done', 'items', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.items = None
+        self.error = None
+
+
+class DrawService:
+    """
+    Process-wide cache of the parsed draw feed with single-flight revalidation.
+    """
+
+    def __init__(self, config=None):
+        config = config or get_config()
+        self.url = config['FEED_URL']
+        self.ttl = config['TTL']
+        self.stale_if_error = config['STALE_IF_ERROR']
+        self.retry_after = config['RETRY_AFTER']
+        self.periods = config['PERIODS']
+        self.snapshot_path = config['SNAPSHOT_PATH']
+        self.timeout = (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT'])
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = config['USER_AGENT']
+        self._entry = None
+        self._failure = None      # (message, monotonic deadline) of a refresh that had nothing to serve
+        self._flight = None
+        self._archive = {}        # Period key -> Draw loaded from InvoiceDraw
+        self._snapshot_mtime = None
+        # Set while a DrawScheduler keeps the cache fresh: expired entries are
+        # served instead of making a user request wait for the upstream
+        self.scheduled = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0        # Misses that waited for another thread's fetch
+        self.fetches = 0
+        self.not_modified = 0
+        self.errors = 0
+        self.stale_served = 0
+        self.history_served = 0   # Refreshes answered from InvoiceDraw rows instead of the feed
+        self.failures_served = 0  # Calls answered with the cached failure instead of a fetch
+        self.archive_hits = 0
+        self.archive_misses = 0
+        self.snapshot_writes = 0
+        self.snapshot_loads = 0   # Refreshes answered by a newer snapshot of another process
+        self.upstream_latency = metrics.LatencyStats()
+        if self.snapshot_path:
+            self._load_snapshot()
+
+    def get(self):
+        """
+        The periods of the draw feed, newest first, from the cache when fresh.
+
+        While a DrawScheduler refreshes the service (``scheduled``), an expired
+        copy is served as is; only a cold cache waits for the upstream.
+
+        Returns:
+            tuple[Draw]: Draw periods
+
+        Raises:
+            DrawUnavailable: If the feed cannot be fetched and no cached copy is usable
+        """
+        entry = self._entry
+        if entry is not None and (self.scheduled or time.monotonic() < entry.expires_at):
+            self.hits += 1
+            return entry.items
+        self._raise_failure()
+
+        with self._lock:
+            entry = self._entry
+            if entry is not None and (self.scheduled or time.monotonic() < entry.expires_at):
+                self.hits += 1
+                return entry.items
+            self._raise_failure()
+            self.misses += 1
+            flight, leader = self._join_flight()
+        return self._fly(flight, leader, entry, adopt_snapshot=True)
+
+    def _raise_failure(self):
+        # Within RETRY_AFTER of a refresh that had nothing to serve, fail again without fetching
+        failure = self._failure
+        if failure is not None and time.monotonic() < failure[1]:
+            self.failures_served += 1
+            raise DrawUnavailable(failure[0])
+
+    def refresh(self):
+        """
+        Fetch (or revalidate) the feed now, whatever the age of the cached copy.
+
+        Readers keep getting the cached periods while the fetch runs; the new
+        periods replace them in a single assignment.
+
+        Returns:
+            tuple[Draw]: Draw periods
+
+        Raises:
+            DrawUnavailable: If the feed cannot be fetched and no cached copy is usable
+        """
+        with self._lock:
+            entry = self._entry
+            flight, leader = self._join_flight()
+        return self._fly(flight, leader, entry, adopt_snapshot=False)
+
+    def _join_flight(self):
+        # Called with the lock held: lead a new fetch or wait for the one in progress
+        flight = self._flight
+        if flight is None:
+            flight = self._flight = _Flight()
+            return flight, True
+        self.coalesced += 1
+        return flight, False
+
+    def _fly(self, flight, leader, entry, adopt_snapshot):
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.items
+
+        try:
+            flight.items = self._refresh(entry, adopt_snapshot)
+        except DrawUnavailable as e:
+            flight.error = e
+            self._failure = (str(e), time.monotonic() + self.retry_after)
+            raise
+        except Exception as e:
+            # Not an upstream failure (e.g. an OSError of the snapshot): not cached, but the waiters get it too
+            flight.error = e
+            raise
+        else:
+            self._failure = None
+        finally:
+            with self._lock:
+                self._flight = None
+            flight.done.set()
+        return flight.items
+
+    def current(self):
+        """
+        The latest draw period.
+
+        Returns:
+            Draw: Newest period of the feed
+        """
+        return self.get()[0]
+
+    def period(self, period):
+        """
+        The draw of a given period, from the feed when it is still listed there.
+
+        Args:
+            period (str): Period key such as '11307', see invoicedraw.draw.normalize_period
+
+        Returns:
+            Draw or None: The period's draw, None if neither the feed nor InvoiceDraw has it
+        """
+        try:
+            items = self.get()
+        except DrawUnavailable:
+            items = ()
+        for draw in items:
+            if draw.period == period:
+                return draw
+
+        draw = self._archive.get(period)
+        if draw is not None:
+            self.archive_hits += 1
+            return draw
+        self.archive_misses += 1
+        try:
+            row = InvoiceDraw.objects.filter(period=period).first()
+        except DatabaseError:
+            return None
+        if row is None:
+            return None
+        draw = self._archive[period] = row.to_draw()
+        return draw
+
+    def invalidate(self):
+        """Drop the cached feed and periods; the next call fetches them again."""
+        with self._lock:
+            self._entry = None
+            self._failure = None
+            self._archive = {}
+
+    def _refresh(self, entry, adopt_snapshot=False):
+        # Fetch (or revalidate) the feed; called by the single-flight leader only
+        if adopt_snapshot and self.snapshot_path:
+            # Another process (run_draw_scheduler, another worker) may have fetched it already
+            newer = self._newer_snapshot(entry)
+            if newer is not None:
+                self._entry = newer
+                self.snapshot_loads += 1
+                return newer.items
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        started = time.perf_counter()
+        try:
+            # Streamed: the body is parsed as it arrives and the rest of it is
+            # never downloaded once the newest PERIODS periods are read
+            with self.session.get(self.url, headers=headers, timeout=self.timeout, stream=True) as response:
+                self.fetches += 1
+                if response.status_code == 304 and entry is not None:
+                    self.not_modified += 1
+                    items = entry.items
+                    # A 304 may leave out the validators; the cached ones still describe the body
+                    etag = response.headers.get('ETag', entry.etag)
+                    last_modified = response.headers.get('Last-Modified', entry.last_modified)
+                elif response.status_code != 200:
+                    raise DrawUnavailable(f'發票 API 回應錯誤，狀態碼：{response.status_code}')
+                else:
+                    response.raw.decode_content = True   # gzip / deflate are undone by urllib3
+                    items = parse_feed(response.raw, self.periods)
+                    # Only the new body's validators: the old ones would revalidate it as the old feed
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+        except (requests.RequestException, urllib3.exceptions.HTTPError, DrawUnavailable) as e:
+            # urllib3 errors surface from reading the streamed body (read timeout, dropped connection)
+            self.errors += 1
+            return self._serve_stale(entry, e)
+        finally:
+            self.upstream_latency.record(time.perf_counter() - started)
+
+        self._entry = _CacheEntry(items, etag, last_modified, time.time(), time.monotonic() + self.ttl)
+        if self.snapshot_path:
+            self._save_snapshot(self._entry)
+        return items
+
+    def _load_snapshot(self):
+        # Start from the snapshot: fresh for what is left of its TTL, then
+        # revalidated (usually a 304) or served stale if the upstream is down
+        snapshot = read_snapshot(self.snapshot_path)
+        if snapshot is not None:
+            self._entry = self._snapshot_entry(snapshot)
+
+    def _newer_snapshot(self, entry):
+        # A snapshot written since our last look, fetched after our entry and still fresh
+        try:
+            mtime = os.stat(self.snapshot_path).st_mtime
+        except OSError:
+            return None
+        if mtime == self._snapshot_mtime:
+            return None
+        self._snapshot_mtime = mtime
+        snapshot = read_snapshot(self.snapshot_path)
+        if snapshot is None or (entry is not None and snapshot['fetched_at'] <= entry.fetched_at):
+            return None
+        if time.time() - snapshot['fetched_at'] >= self.ttl:
+            return None
+        return self._snapshot_entry(snapshot)
+
+    def _snapshot_entry(self, snapshot):
+        age = max(time.time() - snapshot['fetched_at'], 0)
+        return _CacheEntry(
+            snapshot['items'],
+            snapshot['etag'],
+            snapshot['last_modified'],
+            snapshot['fetched_at'],
+            time.monotonic() + max(self.ttl - age, 0),
+            SNAPSHOT,
+        )
+
+    def _save_snapshot(self, entry):
+        # Also after a 304, so the snapshot's age stays that of the last successful check
+        if write_snapshot(self.snapshot_path, entry.items, entry.etag, entry.last_modified, entry.fetched_at):
+            self.snapshot_writes += 1
+
+    def _serve_stale(self, entry, error):
+        # Keep answering from the last good feed while the upstream is down
+        if entry is None or entry.source == HISTORY or time.time() - entry.fetched_at > self.stale_if_error:
+            return self._serve_history(error)
+        self.stale_served += 1
+        # Retry the upstream after RETRY_AFTER seconds instead of on every message
+        entry.expires_at = time.monotonic() + self.retry_after
+        return entry.items
+
+    def _serve_history(self, error):
+        # No usable feed: fall back to the latest stored periods (re-read on every
+        # retry, so a sync made meanwhile is picked up)
+        try:
+            items = tuple(row.to_draw() for row in InvoiceDraw.objects.order_by('-period')[:HISTORY_PERIODS])
+        except DatabaseError:
+            items = ()
+        if not items:
+            if isinstance(error, DrawUnavailable):
+                raise error
+            raise DrawUnavailable(f'無法取得發票資料: {error}') from error
+        self.history_served += 1
+        self._entry = _CacheEntry(items, None, None, time.time(), time.monotonic() + self.retry_after, HISTORY)
+        return items
+
+    def stats(self):
+        """
+        Cache counters and upstream latency.
+
+        Returns:
+            dict: Draw service stats
+        """
+        entry = self._entry
+        lookups = self.hits + self.misses
+        return {
+            'url': self.url,
+            'cached_periods': len(entry.items) if entry else 0,
+            'source': entry.source if entry else None,
+            'age_s': round(time.time() - entry.fetched_at, 1) if entry else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'coalesced': self.coalesced,
+            'fetches': self.fetches,
+            'not_modified': self.not_modified,
+            'errors': self.errors,
+            'stale_served': self.stale_served,
+            'snapshot_writes': self.snapshot_writes,
+            'snapshot_loads': self.snapshot_loads,
+            'scheduled': self.scheduled,
+            'history_served': self.history_served,
+            'failures_served': self.failures_served,
+            'archive_periods': len(self._archive),
+            'archive_hits': self.archive_hits,
+            'archive_misses': self.archive_misses,
+            'upstream': self.upstream_latency.summary(),
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """
+    Return the process-wide draw service, creating it from settings on first use.
+
+    Returns:
+        DrawService: The shared service
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = DrawService()
+    return _service
+
+
+def stats():
+    """
+    Stats provider registered with linebotcore.metrics.
+
+    Returns:
+        dict: Draw service stats, or an empty dict before first use
+    """
+    return get_service().stats() if _service is not None else {}
+
+
+metrics.register('invoice_draw', stats)
@@ -0,0 +1,100 @@
+"""
+On-disk snapshot of the parsed draw feed.
+
+A worker that starts with an empty cache would have to reach the upstream
+before answering its first invoice query.  ``DrawService`` instead writes the
+periods of every newly fetched feed to a small versioned JSON file and loads
+it when it is created, so a restarted worker answers immediately and keeps
+answering from the last good feed while the upstream is down.
+
+The file is replaced atomically (written next to the target, then
+``os.replace``), so workers sharing it never read a partial snapshot.
+"""
+
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from .draw import Draw
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout changes; snapshots of another version are ignored
+SNAPSHOT_VERSION = 1
+
+
+def write_snapshot(path, items, etag=None, last_modified=None, fetched_at=None):
+    """
+    Atomically write the periods of a feed to a snapshot file.
+
+    Args:
+        path (str or Path): Snapshot file
+        items (tuple[Draw]): Periods of the feed, newest first
+        etag (str): ETag of the feed response, for revalidation after a restart
+        last_modified (str): Last-Modified of the feed response
+        fetched_at (float): Wall clock time of the fetch
+
+    Returns:
+        bool: True if the snapshot was written
+    """
+    path = Path(path)
+    data = {
+        'version': SNAPSHOT_VERSION,
+        'etag': etag,
+        'last_modified': last_modified,
+        'fetched_at': fetched_at,
+        'periods': [{'title': draw.title, 'text': draw.text} for draw in items],
+    }
+    content = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=f'.{path.name}.', dir=path.parent)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError as e:
+        logger.warning(f"Could not write invoice draw snapshot {path}: {e}")
+        return False
+    return True
+
+
+def read_snapshot(path):
+    """
+    Load a snapshot file written by ``write_snapshot``.
+
+    Args:
+        path (str or Path): Snapshot file
+
+    Returns:
+        dict or None: ``items`` (tuple[Draw]), ``etag``, ``last_modified`` and
+        ``fetched_at``, or None if the file is missing, unreadable or of another version
+    """
+    try:
+        data = json.loads(Path(path).read_bytes())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable invoice draw snapshot {path}: {e}")
+        return None
+    if not isinstance(data, dict) or data.get('version') != SNAPSHOT_VERSION:
+        logger.warning(f"Ignoring invoice draw snapshot {path} of another version")
+        return None
+    try:
+        items = tuple(Draw(period['title'], period['text']) for period in data['periods'])
+    except (KeyError, TypeError) as e:
+        logger.warning(f"Ignoring malformed invoice draw snapshot {path}: {e}")
+        return None
+    if not items:
+        return None
+    return {
+        'items': items,
+        'etag': data.get('etag'),
+        'last_modified': data.get('last_modified'),
+        'fetched_at': data.get('fetched_at') or 0.0,
+    }
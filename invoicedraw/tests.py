@@ -0,0 +1,698 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from datetime import timezone as dt_timezone
+from unittest import mock, skipUnless
+
+import requests
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from linebot.exceptions import LineBotApiError
+
+from .apps import serves_requests
+from .draw import (EXTRA_SIXTH_PRIZE, FIRST, FIRST_PRIZES, GRAND, GRAND_PRIZE, SPECIAL, SPECIAL_PRIZE, TAIPEI,
+                   Draw, format_text, normalize_period)
+from .fakefeed import ERROR, NORMAL, SLOW, FakeFeedServer
+from .models import InvoiceDraw, SavedInvoice
+from .qr import DEFAULTS as QR_DEFAULTS
+from .qr import ImageTooLarge, InvoiceQR, QRReader, QRUnavailable, parse_invoice_qr, read_limited
+from .qrdecode import pyzbar
+from .recheck import check_saved, notify_winners
+from .sample import sample_feed
+from .scheduler import draw_window_start, expected_period, next_delay
+from .service import DEFAULTS, HISTORY, SNAPSHOT, DrawService, DrawUnavailable, parse_feed
+from .snapshot import SNAPSHOT_VERSION, read_snapshot, write_snapshot
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+TEXT = format_text({
+    SPECIAL: ['93221989'],
+    GRAND: ['12345678'],
+    FIRST: ['39830731', '15658241', '02213627'],
+    '增開六獎': ['555'],
+})
+
+
+class DrawTests(SimpleTestCase):
+
+    def setUp(self):
+        self.draw = Draw('113年07月、08月', TEXT)
+
+    def test_period_key_from_title(self):
+        self.assertEqual(self.draw.period, '11307')
+        self.assertIsNone(Draw('統一發票', TEXT).period)
+
+    def test_check_exact_prizes(self):
+        self.assertEqual(self.draw.check('93221989'), SPECIAL_PRIZE)
+        self.assertEqual(self.draw.check('12345678'), GRAND_PRIZE)
+
+    def test_check_first_prize_by_trailing_digits(self):
+        self.assertEqual(self.draw.check('39830731'), FIRST_PRIZES[8])
+        self.assertEqual(self.draw.check('09830731'), FIRST_PRIZES[7])
+        self.assertEqual(self.draw.check('00658241'), FIRST_PRIZES[6])
+        self.assertEqual(self.draw.check('00000627'), FIRST_PRIZES[3])
+
+    def test_check_extra_sixth_and_misses(self):
+        self.assertEqual(self.draw.check('00000555'), EXTRA_SIXTH_PRIZE)
+        self.assertIsNone(self.draw.check('00000000'))
+        # Only the 頭獎 numbers win on their trailing digits
+        self.assertIsNone(self.draw.check('00001989'))
+
+    def test_check_suffix_and_many(self):
+        self.assertEqual(self.draw.check_suffix('731'), (FIRST,))
+        self.assertEqual(self.draw.check_suffix('000'), ())
+        self.assertEqual(self.draw.check_many(['39830731', '00000000', '00000555']),
+                         [FIRST_PRIZES[8], None, EXTRA_SIXTH_PRIZE])
+
+    def test_stored_draw_checks_the_same(self):
+        draw = InvoiceDraw.from_draw(self.draw).to_draw()
+        for number in ('93221989', '12345678', '09830731', '00000555', '00000000'):
+            self.assertEqual(draw.check(number), self.draw.check(number))
+
+
+class NormalizePeriodTests(SimpleTestCase):
+
+    def test_periods(self):
+        self.assertEqual(normalize_period('11309'), '11309')
+        self.assertEqual(normalize_period('11310'), '11309')
+        self.assertEqual(normalize_period(' 113年10月 '), '11309')
+        self.assertEqual(normalize_period('9901'), '09901')
+
+    def test_not_periods(self):
+        for text in ('11313', '11300', '113', 'abc', '1130901'):
+            self.assertIsNone(normalize_period(text), text)
+
+
+class ParseFeedTests(SimpleTestCase):
+
+    def cut(self, complete, tail):
+        # The feed of five periods with everything after the first ``complete`` replaced by ``tail``
+        lines = sample_feed(5, seed=1).split(b'\n')
+        return b'\n'.join(lines[:2 + complete]) + b'\n' + tail
+
+    def test_reads_every_period(self):
+        items = parse_feed(sample_feed(5, seed=1))
+        self.assertEqual([draw.period for draw in items], ['11307', '11305', '11303', '11301', '11211'])
+
+    def test_stops_reading_after_the_limit(self):
+        feed = sample_feed(500, seed=1)
+        source = io.BytesIO(feed)
+        self.assertEqual(len(parse_feed(source, limit=3)), 3)
+        self.assertLess(source.tell(), len(feed) // 4)
+
+    def test_malformed_feeds(self):
+        for content in (b'', b'not xml', b'<rss><channel></rss>', sample_feed(0)):
+            with self.assertRaises(DrawUnavailable):
+                parse_feed(content)
+
+    def test_truncated_feed(self):
+        # Cut off inside the fifth period
+        feed = self.cut(4, sample_feed(5, seed=1).split(b'\n')[6][:40])
+        # The periods wanted were complete before the cut
+        self.assertEqual([draw.period for draw in parse_feed(feed, limit=3)], ['11307', '11305', '11303'])
+        # Otherwise the periods read so far are not served
+        for limit in (5, None):
+            with self.assertRaises(DrawUnavailable):
+                parse_feed(feed, limit)
+
+    def test_malformed_after_complete_periods(self):
+        # Mismatched closing tag in the third period
+        feed = self.cut(2, b'<item><title>113\xe5\xb9\xb4</tilte></item></channel></rss>')
+        self.assertEqual(len(parse_feed(feed, limit=2)), 2)
+        with self.assertRaises(DrawUnavailable):
+            parse_feed(feed, limit=3)
+
+
+class SnapshotTests(SimpleTestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.dir = tmpdir.name
+        self.path = os.path.join(self.dir, 'draw.json')
+        self.items = parse_feed(sample_feed(3, seed=1))
+
+    def write(self, data):
+        with open(self.path, 'w') as f:
+            f.write(data if isinstance(data, str) else json.dumps(data))
+
+    def test_round_trip(self):
+        self.assertTrue(write_snapshot(self.path, self.items, '"v1"', 'Sun, 25 Aug 2024 05:30:00 GMT', 1000.0))
+        snapshot = read_snapshot(self.path)
+        self.assertEqual([(draw.title, draw.text) for draw in snapshot['items']],
+                         [(draw.title, draw.text) for draw in self.items])
+        self.assertEqual(snapshot['items'][0].check('00000000'), self.items[0].check('00000000'))
+        self.assertEqual((snapshot['etag'], snapshot['last_modified'], snapshot['fetched_at']),
+                         ('"v1"', 'Sun, 25 Aug 2024 05:30:00 GMT', 1000.0))
+        self.assertEqual(os.listdir(self.dir), ['draw.json'])
+
+    def test_failed_write_keeps_the_old_snapshot(self):
+        write_snapshot(self.path, self.items, '"v1"')
+        with mock.patch('invoicedraw.snapshot.os.replace', side_effect=OSError('disk full')), \
+                self.assertLogs('invoicedraw.snapshot', 'WARNING'):
+            self.assertFalse(write_snapshot(self.path, self.items[:1], '"v2"'))
+        self.assertEqual(read_snapshot(self.path)['etag'], '"v1"')
+        # The temporary file is removed
+        self.assertEqual(os.listdir(self.dir), ['draw.json'])
+
+    def test_missing_file(self):
+        self.assertIsNone(read_snapshot(self.path))
+
+    def test_other_version_is_ignored(self):
+        write_snapshot(self.path, self.items)
+        with open(self.path) as f:
+            data = json.load(f)
+        self.write(dict(data, version=SNAPSHOT_VERSION + 1))
+        with self.assertLogs('invoicedraw.snapshot', 'WARNING'):
+            self.assertIsNone(read_snapshot(self.path))
+
+    def test_corrupt_files_are_ignored(self):
+        for content in ('{"version": 1, "periods": [', '[]', {'version': SNAPSHOT_VERSION, 'periods': [{'title': 'x'}]}):
+            self.write(content)
+            with self.assertLogs('invoicedraw.snapshot', 'WARNING'):
+                self.assertIsNone(read_snapshot(self.path), content)
+        self.write({'version': SNAPSHOT_VERSION, 'periods': []})
+        self.assertIsNone(read_snapshot(self.path))
+
+
+def taipei(*args):
+    return datetime(*args, tzinfo=TAIPEI)
+
+
+class ScheduleTests(SimpleTestCase):
+    config = dict(DEFAULTS, REFRESH_INTERVAL=3600, DRAW_REFRESH_INTERVAL=60, DRAW_HOUR=13)
+
+    def test_expected_period(self):
+        for day, period in (
+            (date(2024, 9, 25), '11307'),
+            (date(2024, 3, 25), '11301'),
+            (date(2024, 11, 25), '11309'),
+            (date(2025, 1, 25), '11311'),    # Drawn in the next year
+        ):
+            self.assertEqual(expected_period(day), period, day)
+
+    def test_draw_window_start(self):
+        for local, start in (
+            (taipei(2024, 9, 10, 8), taipei(2024, 9, 25, 13)),
+            (taipei(2024, 9, 25, 12, 59), taipei(2024, 9, 25, 13)),
+            (taipei(2024, 9, 26, 20), taipei(2024, 9, 25, 13)),     # Window in progress
+            (taipei(2024, 9, 27, 1), taipei(2024, 11, 25, 13)),     # Window over after 36 hours
+            (taipei(2024, 10, 5), taipei(2024, 11, 25, 13)),        # Even month
+            (taipei(2024, 11, 30), taipei(2025, 1, 25, 13)),
+            (taipei(2024, 12, 31, 23, 59), taipei(2025, 1, 25, 13)),
+            (taipei(2025, 1, 26, 12), taipei(2025, 1, 25, 13)),
+        ):
+            self.assertEqual(draw_window_start(local, 13), start, local)
+
+    def test_next_delay(self):
+        for now, period, delay in (
+            (taipei(2024, 9, 10, 8), '11305', 3600),
+            (taipei(2024, 9, 25, 12, 30), '11305', 1800),               # Up to the draw hour
+            (taipei(2024, 9, 25, 12, 59, 59, 500000), '11305', 1),      # Never less than a second
+            (taipei(2024, 9, 25, 13, 30), '11305', 60),                 # Drawn, not in the feed yet
+            (datetime(2024, 9, 25, 5, 30, tzinfo=dt_timezone.utc), '11305', 60),
+            (taipei(2024, 9, 25, 13, 30), '11307', 3600),               # New period is in
+            (taipei(2024, 9, 26, 20), '11307', 3600),
+            (taipei(2024, 9, 27, 2), '11305', 3600),                    # Window over
+            (taipei(2024, 12, 31, 23), '11309', 3600),
+            (taipei(2025, 1, 25, 12), None, 3600),
+            (taipei(2025, 1, 25, 14), '11309', 60),
+            (taipei(2025, 1, 25, 14), '11311', 3600),
+            (taipei(2025, 1, 26, 20), None, 60),                        # Nothing cached
+        ):
+            self.assertEqual(next_delay(now, period, self.config), delay, (now, period))
+
+
+class MulticastApi:
+    # Records the multicast recipients; the calls numbered in ``fail`` (from 1) raise
+
+    def __init__(self, fail=(), during=None):
+        self.calls = []
+        self.fail = set(fail)
+        self.during = during
+
+    def multicast(self, to, message):
+        self.calls.append(list(to))
+        if self.during is not None:
+            during, self.during = self.during, None
+            during()
+        if len(self.calls) in self.fail:
+            raise LineBotApiError(500, {}, error=mock.Mock(message='boom'))
+
+
+class RecheckTests(TestCase):
+
+    def setUp(self):
+        self.draw = Draw('113年07月、08月', TEXT)
+
+    def save(self, rows, **fields):
+        SavedInvoice.objects.bulk_create([
+            SavedInvoice(user_id=user_id, number=number, suffix=number[-3:], period=period, **fields)
+            for user_id, number, period in rows
+        ])
+
+    def winners(self, count):
+        self.save([(f'U{i:04d}', '39830731', '11307') for i in range(count)],
+                  checked_at=timezone.now(), prize=FIRST, amount=200000)
+
+    def notified(self):
+        return set(SavedInvoice.objects.filter(notified_at__isnull=False).values_list('user_id', flat=True))
+
+    def test_check_saved_records_the_prizes(self):
+        self.save([('U1', '39830731', '11307'), ('U1', '00000000', '11307'), ('U2', '09830731', '11307'),
+                   ('U3', '00000555', '11307'), ('U4', '39830731', '11305')])
+        self.assertEqual(check_saved(self.draw, chunk_size=2), {'candidates': 3, 'winners': 3})
+        prizes = dict(SavedInvoice.objects.filter(period='11307').values_list('number', 'amount'))
+        self.assertEqual(prizes, {'39830731': 200000, '00000000': 0, '09830731': 40000, '00000555': 200})
+        # Checked rows are not checked again
+        self.assertEqual(check_saved(self.draw), {'candidates': 0, 'winners': 0})
+        self.assertFalse(SavedInvoice.objects.filter(period='11305').exclude(checked_at=None).exists())
+
+    def test_winners_are_notified_500_per_multicast(self):
+        self.winners(1001)
+        api = MulticastApi()
+        result = notify_winners(api, self.draw)
+        self.assertEqual([len(to) for to in api.calls], [500, 500, 1])
+        self.assertEqual((result['users'], result['notified'], result['multicasts']), (1001, 1001, 3))
+        self.assertEqual(notify_winners(api, self.draw)['users'], 0)
+        self.assertEqual(len(api.calls), 3)
+
+    def test_failed_multicast_is_retried_by_the_next_run(self):
+        self.winners(1001)
+        api = MulticastApi(fail={2})
+        with self.assertLogs('invoicedraw.recheck', 'ERROR'):
+            result = notify_winners(api, self.draw)
+        self.assertEqual((result['notified'], result['failed']), (501, 1))
+        self.assertEqual(len(self.notified()), 501)
+        retry = MulticastApi()
+        self.assertEqual(notify_winners(retry, self.draw)['notified'], 500)
+        self.assertEqual(retry.calls, [api.calls[1]])
+        self.assertEqual(len(self.notified()), 1001)
+
+    def test_overlapping_runs_notify_each_user_once(self):
+        self.winners(600)
+        other = MulticastApi()
+        # Another run starts while the first multicast of this one is in flight
+        api = MulticastApi(during=lambda: notify_winners(other, self.draw))
+        notify_winners(api, self.draw)
+        recipients = [user_id for to in api.calls + other.calls for user_id in to]
+        self.assertEqual(len(recipients), 600)
+        self.assertEqual(set(recipients), self.notified())
+
+    def test_dry_run_sends_nothing(self):
+        self.winners(3)
+        api = MulticastApi()
+        self.assertEqual(notify_winners(api, self.draw, dry_run=True)['users'], 3)
+        self.assertEqual((api.calls, self.notified()), ([], set()))
+
+
+class FakeFeedTests(TestCase):
+
+    def setUp(self):
+        self.feed = FakeFeedServer(slow_delay=0.5).start()
+        self.addCleanup(self.feed.stop)
+
+    def service(self, scenario=None, **config):
+        return DrawService(dict(DEFAULTS, FEED_URL=self.feed.feed_url(scenario), SNAPSHOT_PATH=None, TTL=0,
+                                RETRY_AFTER=0, **config))
+
+    def test_unchanged_feed_is_revalidated(self):
+        service = self.service()
+        items = service.get()
+        self.assertIs(service.get(), items)
+        self.assertEqual(self.feed.stats()['scenarios'][NORMAL]['status'], {'200': 1, '304': 1})
+        self.assertEqual((service.stats()['fetches'], service.stats()['not_modified']), (2, 1))
+
+    def test_server_errors(self):
+        with self.assertRaises(DrawUnavailable):
+            self.service(ERROR).get()
+        service = self.service()
+        items = service.get()
+        self.feed.scenario = ERROR
+        self.assertIs(service.get(), items)
+        self.assertEqual((service.stats()['errors'], service.stats()['stale_served']), (1, 1))
+        self.assertEqual(self.feed.stats()['scenarios'][ERROR]['status'], {'500': 2})
+
+    def test_slow_feed_times_out(self):
+        started = time.monotonic()
+        with self.assertRaises(DrawUnavailable):
+            self.service(SLOW, READ_TIMEOUT=0.1).get()
+        self.assertLess(time.monotonic() - started, 0.5)
+        service = self.service(READ_TIMEOUT=0.1)
+        items = service.get()
+        self.feed.scenario = SLOW
+        self.assertIs(service.get(), items)
+        self.assertEqual(service.stats()['stale_served'], 1)
+        # Without the timeout the slow feed is simply late
+        self.assertEqual(len(self.service(SLOW).get()), 3)
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.raw = io.BytesIO(body)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class FakeSession:
+    # Answers every request with the next queued response (or raises it)
+    headers = {}
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+        self.sent = []    # Request headers of each call
+
+    def get(self, url, headers=None, **kwargs):
+        self.calls += 1
+        self.sent.append(headers)
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class GatedSession(FakeSession):
+    # Holds every request until the test opens the gate
+
+    def __init__(self, *responses):
+        super().__init__(*responses)
+        self.gate = threading.Event()
+
+    def get(self, url, **kwargs):
+        self.gate.wait(5)
+        return super().get(url, **kwargs)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not reached')
+        time.sleep(0.001)
+
+
+class DrawServiceTests(TestCase):
+
+    def service(self, *responses, **config):
+        service = DrawService(dict(DEFAULTS, **dict({'SNAPSHOT_PATH': None}, **config)))
+        service.session = FakeSession(*responses)
+        return service
+
+    def run_threads(self, count, target):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def test_feed_is_cached(self):
+        service = self.service(FakeResponse(200, sample_feed(3, seed=1)))
+        self.assertEqual(len(service.get()), 3)
+        service.get()
+        self.assertEqual(service.session.calls, 1)
+        self.assertEqual(service.stats()['hits'], 1)
+
+    def test_download_stops_after_the_newest_periods(self):
+        feed = sample_feed(500, seed=1)
+        service = self.service(FakeResponse(200, feed), PERIODS=3)
+        self.assertEqual(len(service.get()), 3)
+        self.assertLess(service.session.responses[0].raw.tell(), len(feed) // 4)
+
+    def test_cold_start_failure_is_cached(self):
+        service = self.service(requests.ConnectionError('down'))
+        for _ in range(3):
+            with self.assertRaises(DrawUnavailable):
+                service.get()
+        self.assertEqual(service.session.calls, 1)
+        self.assertEqual(service.stats()['failures_served'], 2)
+
+    def test_failure_is_retried_after_the_backoff(self):
+        service = self.service(requests.ConnectionError('down'), FakeResponse(200, sample_feed(3, seed=1)),
+                               RETRY_AFTER=0)
+        with self.assertRaises(DrawUnavailable):
+            service.get()
+        self.assertEqual(len(service.get()), 3)
+        self.assertEqual(service.session.calls, 2)
+        self.assertIsNone(service._failure)
+
+    def test_expired_feed_is_revalidated(self):
+        validators = {'ETag': '"v1"', 'Last-Modified': 'Sun, 25 Aug 2024 05:30:00 GMT'}
+        service = self.service(FakeResponse(200, sample_feed(3, seed=1), validators), FakeResponse(304), TTL=0)
+        items = service.get()
+        self.assertIs(service.get(), items)
+        self.assertEqual(service.session.sent[1], {'If-None-Match': '"v1"',
+                                                   'If-Modified-Since': 'Sun, 25 Aug 2024 05:30:00 GMT'})
+        self.assertEqual(service.stats()['not_modified'], 1)
+        self.assertEqual(service._entry.etag, '"v1"')
+
+    def test_new_feed_replaces_the_validators(self):
+        service = self.service(FakeResponse(200, sample_feed(3, seed=1), {'ETag': '"v1"'}),
+                               FakeResponse(200, sample_feed(3, seed=2), {'Last-Modified': 'Sun, 25 Aug 2024 05:30:00 GMT'}),
+                               FakeResponse(304), TTL=0)
+        for _ in range(3):
+            service.get()
+        self.assertEqual(service.session.sent[2], {'If-Modified-Since': 'Sun, 25 Aug 2024 05:30:00 GMT'})
+
+    def test_concurrent_misses_share_one_fetch(self):
+        service = self.service()
+        service.session = GatedSession(FakeResponse(200, sample_feed(3, seed=1)))
+        results = []
+        threads = self.run_threads(8, lambda: results.append(service.get()))
+        wait_until(lambda: service.coalesced == 7)
+        service.session.gate.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(service.session.calls, 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(items is results[0] for items in results))
+
+    def test_unexpected_errors_reach_every_waiter(self):
+        service = self.service()
+        service.session = GatedSession(ValueError('bad feed'))
+        errors = []
+
+        def get():
+            try:
+                service.get()
+            except ValueError as e:
+                errors.append(e)
+
+        threads = self.run_threads(4, get)
+        wait_until(lambda: service.coalesced == 3)
+        service.session.gate.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 4)
+        self.assertIsNone(service._flight)
+        # Not an upstream failure, so the next call tries again
+        self.assertIsNone(service._failure)
+
+    def test_stale_feed_is_served_while_the_upstream_fails(self):
+        service = self.service(FakeResponse(200, sample_feed(3, seed=1)), FakeResponse(500), TTL=0, RETRY_AFTER=60)
+        items = service.get()
+        self.assertIs(service.get(), items)
+        # Retried only after RETRY_AFTER
+        self.assertIs(service.get(), items)
+        self.assertEqual(service.session.calls, 2)
+        self.assertEqual((service.stats()['stale_served'], service.stats()['errors']), (1, 1))
+        service._entry.fetched_at -= DEFAULTS['STALE_IF_ERROR'] + 1
+        service._entry.expires_at = 0
+        with self.assertRaises(DrawUnavailable):
+            service.get()
+
+    def test_snapshot_round_trip(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, 'draw.json')
+        first = self.service(FakeResponse(200, sample_feed(3, seed=1), {'ETag': '"v1"'}), SNAPSHOT_PATH=path, TTL=0)
+        items = first.get()
+        self.assertEqual(first.stats()['snapshot_writes'], 1)
+        # A restarted worker starts from the snapshot and revalidates it with the saved ETag
+        second = self.service(FakeResponse(304), SNAPSHOT_PATH=path, TTL=0)
+        self.assertEqual(second.stats()['source'], SNAPSHOT)
+        self.assertEqual([(draw.title, draw.text) for draw in second.get()],
+                         [(draw.title, draw.text) for draw in items])
+        self.assertEqual(second.session.sent, [{'If-None-Match': '"v1"'}])
+
+    def test_fresh_snapshot_is_adopted_at_startup(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, 'draw.json')
+        items = parse_feed(sample_feed(3, seed=1))
+        write_snapshot(path, items, '"v1"', fetched_at=time.time() - 60)
+        service = self.service(FakeResponse(500), SNAPSHOT_PATH=path, TTL=600)
+        self.assertEqual([draw.period for draw in service.get()], [draw.period for draw in items])
+        # Served for what is left of its TTL without reaching the upstream
+        self.assertEqual(service.session.calls, 0)
+        self.assertEqual((service.stats()['source'], service.stats()['hits']), (SNAPSHOT, 1))
+        self.assertLess(service._entry.expires_at - time.monotonic(), 541)
+
+    def test_history_is_served_when_the_feed_is_down(self):
+        InvoiceDraw.from_draw(Draw('113年07月、08月', TEXT)).save()
+        service = self.service(FakeResponse(500))
+        self.assertEqual([draw.period for draw in service.get()], ['11307'])
+        self.assertEqual(service.stats()['source'], HISTORY)
+
+
+class ServesRequestsTests(SimpleTestCase):
+
+    def serves(self, argv, environ=None):
+        with mock.patch.object(sys, 'argv', argv), mock.patch.dict(os.environ, environ or {}, clear=True):
+            return serves_requests()
+
+    def test_servers(self):
+        self.assertTrue(self.serves(['/venv/bin/gunicorn', 'linebottest.wsgi']))
+        self.assertTrue(self.serves(['/venv/lib/gunicorn/__main__.py', 'linebottest.wsgi']))
+        self.assertTrue(self.serves(['uvicorn', 'linebottest.asgi:application']))
+        self.assertTrue(self.serves(['manage.py', 'runserver'], {'RUN_MAIN': 'true'}))
+        self.assertTrue(self.serves(['manage.py', 'runserver', '--noreload']))
+
+    def test_other_processes(self):
+        self.assertFalse(self.serves(['manage.py', 'runserver']))
+        self.assertFalse(self.serves(['manage.py', 'migrate']))
+        self.assertFalse(self.serves(['/venv/bin/pytest']))
+        self.assertFalse(self.serves(['/venv/bin/celery', '-A', 'linebottest', 'worker']))
+        self.assertFalse(self.serves(['-c']))
+        self.assertFalse(self.serves([]))
+
+
+def testdata(name):
+    with open(os.path.join(TESTDATA, name), 'rb') as f:
+        return f.read()
+
+
+class ParseInvoiceQRTests(SimpleTestCase):
+
+    def test_left_qr_code(self):
+        invoice = parse_invoice_qr('AB398307311130815123400000064000000640000000012345678ydXZt4LAN1UHN')
+        self.assertEqual(invoice, InvoiceQR('AB', '39830731', date(2024, 8, 15), '11307'))
+
+    def test_malformed_payloads(self):
+        for text in (
+            '',
+            'https://invoice.etax.nat.gov.tw/',
+            'ab398307311130815',        # Lower-case track
+            'AB39830731113081',         # Date cut short
+            'AB398307311131345',        # No 13th month
+            'AB398307311130230',        # No 30 February
+            'AB３９８３０７３１1130815',  # Full-width digits
+            '**:1:1:1:紅茶:1:64',         # The right QR code
+        ):
+            self.assertIsNone(parse_invoice_qr(text), text)
+
+
+class ReadLimitedTests(SimpleTestCase):
+
+    def test_joins_chunks_up_to_the_cap(self):
+        self.assertEqual(read_limited([b'ab', b'cd'], 4), b'abcd')
+
+    def test_stops_reading_past_the_cap(self):
+        read = []
+
+        def chunks():
+            for chunk in (b'ab', b'cd', b'ef', b'gh'):
+                read.append(chunk)
+                yield chunk
+
+        with self.assertRaises(ImageTooLarge):
+            read_limited(chunks(), 5)
+        self.assertEqual(read, [b'ab', b'cd', b'ef'])
+
+
+class FakeContent:
+    # MessageContent of the SDK: streamed chunks and the underlying response
+
+    def __init__(self, content):
+        self.content = content
+        self.closed = False
+        self.response = mock.Mock()
+        self.response.response.close.side_effect = self.close
+
+    def close(self):
+        self.closed = True
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+
+class FakeLineBotApi:
+
+    def __init__(self, content):
+        self.content = FakeContent(content)
+        self.requested = []
+
+    def get_message_content(self, message_id):
+        self.requested.append(message_id)
+        return self.content
+
+
+class QRReaderTests(SimpleTestCase):
+
+    def setUp(self):
+        self.reader = QRReader(dict(QR_DEFAULTS, WORKERS=1, CHUNK_SIZE=128))
+        self.addCleanup(self.shutdown)
+        service = mock.Mock(period=lambda period: Draw('113年07月、08月', TEXT) if period == '11307' else None)
+        patcher = mock.patch('invoicedraw.qr.get_service', return_value=service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def shutdown(self):
+        if self.reader._pool is not None:
+            self.reader._pool.shutdown()
+
+    def test_decoder_processes_are_spawned(self):
+        self.assertEqual(self.reader._get_pool()._mp_context.get_start_method(), 'spawn')
+
+    def test_download_stops_past_max_bytes(self):
+        self.reader.max_bytes = 200
+        api = FakeLineBotApi(testdata('invoice_qr.png'))
+        with self.assertRaises(ImageTooLarge):
+            self.reader.read(api, 'm1')
+        self.assertTrue(api.content.closed)
+        self.assertEqual(self.reader.stats()['too_large'], 1)
+
+    def test_check_against_the_period_of_each_invoice(self):
+        won = InvoiceQR('AB', '39830731', date(2024, 8, 15), '11307')
+        future = InvoiceQR('CD', '39830731', date(2099, 1, 1), '18801')
+        results = self.reader.check([won, future])
+        self.assertEqual(results[0][2], FIRST_PRIZES[8])
+        self.assertEqual(results[1][1:], (None, None))
+
+    @mock.patch('invoicedraw.qr.pyzbar', None)
+    def test_without_decoder(self):
+        api = FakeLineBotApi(testdata('invoice_qr.png'))
+        with self.assertRaises(QRUnavailable):
+            self.reader.read(api, 'm1')
+        self.assertTrue(api.content.closed)
+
+    @skipUnless(pyzbar, 'pyzbar and the zbar library are not installed')
+    def test_photo_is_decoded_and_checked(self):
+        api = FakeLineBotApi(testdata('invoice_qr.png'))
+        [(invoice, draw, prize)] = self.reader.read(api, 'm1')
+        self.assertEqual(api.requested, ['m1'])
+        self.assertEqual((invoice.track, invoice.number, invoice.period), ('AB', '39830731', '11307'))
+        self.assertEqual(draw.period, '11307')
+        self.assertEqual(prize, FIRST_PRIZES[8])
+
+    @skipUnless(pyzbar, 'pyzbar and the zbar library are not installed')
+    def test_qr_code_without_invoice(self):
+        self.assertEqual(self.reader.read(FakeLineBotApi(testdata('not_invoice_qr.png')), 'm1'), [])
+        self.assertEqual(self.reader.stats()['without_invoice'], 1)
+
+    @skipUnless(pyzbar, 'pyzbar and the zbar library are not installed')
+    def test_not_an_image(self):
+        self.assertEqual(self.reader.read(FakeLineBotApi(b'not an image'), 'm1'), [])
+        self.assertEqual(self.reader.stats()['undecodable'], 1)
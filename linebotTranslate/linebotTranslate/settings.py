@@ -12,10 +12,15 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Make the apps shared by all bot projects (e.g. linebotcore) importable
+# from the repository root
+sys.path.append(str(BASE_DIR.parent))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -30,6 +35,46 @@ LINE_CHANNEL_SECRET = '25ab797b256b1cf56222e57bedcd7494'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Webhook pipeline: 'inline' runs the handlers before answering LINE,
+# 'thread' verifies the signature, queues the events for WORKERS threads and
+# returns 200 at once (falling back to inline when QUEUE_SIZE is reached),
+# 'inbox' stores the events in the WebhookInbox table for `manage.py process_inbox`,
+# which runs them through HANDLER. Queue depth and latencies are served at /linebot/stats
+LINEBOT_PIPELINE = {
+    'MODE': 'inline',
+    'WORKERS': 4,
+    'QUEUE_SIZE': 1000,
+    'HANDLER': 'translateapi.views.handle_event',
+}
+
+# Redelivered webhook events (same webhookEventId) are skipped before dispatch.
+# BACKEND 'memory' keeps the IDs per process; 'cache' shares them between
+# workers through the Django cache named CACHE_ALIAS
+LINEBOT_DEDUP = {
+    'ENABLED': True,
+    'BACKEND': 'memory',
+    'CACHE_ALIAS': 'default',
+    'MAX_ENTRIES': 10000,
+    'TTL': 600,
+}
+
+# HTTP transport of the LINE API client: a persistent keep-alive connection
+# pool of POOL_MAXSIZE connections (None = pipeline WORKERS + 1) with explicit
+# timeouts. POOLED False falls back to the SDK's one-connection-per-call client
+LINEBOT_TRANSPORT = {
+    'POOLED': True,
+    'POOL_MAXSIZE': None,
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'RETRIES': 0,
+}
+
+# LINE API host. Set LINE_API_ENDPOINT (e.g. http://127.0.0.1:8765, started with
+# `python manage.py fake_line_api`) to send every API call to the local fake
+# for load tests; None uses api.line.me / api-data.line.me
+LINE_API_ENDPOINT = os.environ.get('LINE_API_ENDPOINT')
+LINE_API_DATA_ENDPOINT = os.environ.get('LINE_API_DATA_ENDPOINT')
+
 ALLOWED_HOSTS = ['*']
 
 
@@ -43,7 +88,8 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'translateapi',
-    'variable_settings'
+    'variable_settings',
+    'linebotcore',
 ]
 
 MIDDLEWARE = [
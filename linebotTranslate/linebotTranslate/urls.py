@@ -19,5 +19,6 @@ from django.urls import path, include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('linebot/', include('linebotcore.urls')),  # Shared operational endpoints (webhook pipeline stats, ...)
     path('', include('translateapi.urls')),  # Include translateapi URLs
 ]
@@ -4,16 +4,19 @@ from django.conf import settings
 from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
 from django.views.decorators.csrf import csrf_exempt
 
-from linebot import LineBotApi, WebhookParser
+from linebot import WebhookParser
 from linebot.exceptions import InvalidSignatureError, LineBotApiError
 from linebot.models import MessageEvent, PostbackEvent, TextSendMessage
 from linebot.models import QuickReply, QuickReplyButton, PostbackAction
-from urllib.parse import parse_qsl
 
 from translate import Translator
 import variable_settings as varset
 
-line_bot_api = LineBotApi(settings.LINE_CHANNEL_ACCESS_TOKEN)
+from linebotcore.client import build_line_bot_api
+from linebotcore.pipeline import dispatch_events
+from linebotcore.router import CommandRouter
+
+line_bot_api = build_line_bot_api(settings.LINE_CHANNEL_ACCESS_TOKEN)
 parser = WebhookParser(settings.LINE_CHANNEL_SECRET)
 
 @csrf_exempt
@@ -33,35 +36,9 @@ def callback(request):
             # Return bad request response if there is an error with the Line Bot API
             return HttpResponseBadRequest()
 
-        # Process each event in the events list
-        for event in events:
-            if isinstance(event, MessageEvent):
-                userid, lang = readData(event)  # Read user ID and language settings
-                mtext = event.message.text  # Get the text message from the event
-
-                # Handle different commands based on the message text
-                if mtext == '@使用說明':
-                    showUse(event)  # Show usage instructions
-
-                elif mtext == '@英文':
-                    setLang(event, 'en', userid)  # Set language to English
-
-                elif mtext == '@日文':
-                    setLang(event, 'ja', userid)  # Set language to Japanese
-
-                elif mtext == '@其他語文':
-                    setElselang(event)  # Set other language options
-
-                elif mtext == '@顯示設定':
-                    showConfig(event, lang)  # Show current configuration
-
-                else:  # General text translation
-                    sendTranslate(event, lang, mtext)  # Translate the message
-
-            elif isinstance(event, PostbackEvent):  # Handle postback events
-                userid, lang = readData(event)  # Read user ID and language settings
-                backdata = dict(parse_qsl(event.postback.data))  # Parse postback data
-                sendData(event, backdata, userid)  # Send data back to the user
+        # Hand the events to the shared webhook pipeline (inline, worker threads or
+        # the durable inbox, depending on settings.LINEBOT_PIPELINE)
+        dispatch_events(events, handle_event, body)
 
         return HttpResponse()  # Return a successful response
 
@@ -69,6 +46,14 @@ def callback(request):
         return HttpResponseBadRequest()  # Return bad request response for non-POST methods
     
 
+def handle_event(event):
+    """Dispatch a single webhook event to the matching handler."""
+    if isinstance(event, (MessageEvent, PostbackEvent)):
+        userid, lang = readData(event)  # Read user ID and language settings
+        # Handlers are looked up in the command router at the bottom of this module
+        router.dispatch(event, userid, lang)
+
+
 def readData(event):  # Read user ID and language settings
         # Extract user ID from the event
         userid = event.source.user_id  # Read user ID
@@ -234,4 +219,15 @@ def sendData(event, backdata, userid):
     except Exception as e:
         # Handle errors and send error message
         line_bot_api.reply_message(event.reply_token, TextSendMessage(text='處理選項時發生錯誤'))
-        print(f"Error in sendData: {e}")
\ No newline at end of file
+        print(f"Error in sendData: {e}")
+
+
+# Command router: every handler is called with the user's ID and language appended
+router = CommandRouter()
+router.add_exact('@使用說明', lambda event, userid, lang: showUse(event))  # Show usage instructions
+router.add_exact('@英文', lambda event, userid, lang: setLang(event, 'en', userid))  # Set language to English
+router.add_exact('@日文', lambda event, userid, lang: setLang(event, 'ja', userid))  # Set language to Japanese
+router.add_exact('@其他語文', lambda event, userid, lang: setElselang(event))  # Set other language options
+router.add_exact('@顯示設定', lambda event, userid, lang: showConfig(event, lang))  # Show current configuration
+router.set_default(lambda event, mtext, userid, lang: sendTranslate(event, lang, mtext))  # General text translation
+router.set_postback_default(lambda event, backdata, userid, lang: sendData(event, backdata, userid))  # Postback data
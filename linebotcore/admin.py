@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import WebhookInbox
+
+# Register your models here.
+class WebhookInboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_id', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('event_id',)
+    ordering = ('-id',)
+    list_per_page = 50
+
+admin.site.register(WebhookInbox, WebhookInboxAdmin)
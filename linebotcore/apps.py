@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class LinebotcoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'linebotcore'
+    verbose_name = 'LINE Bot 共用元件'
+
+    def ready(self):
+        # Expose the inbox backlog next to the pipeline counters at /linebot/stats
+        from . import inbox, metrics
+        metrics.register('inbox', inbox.stats)
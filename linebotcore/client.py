@@ -0,0 +1,275 @@
+"""
+Pooled, keep-alive HTTP transport for the LINE Messaging API clients.
+
+The SDK's default ``RequestsHttpClient`` calls ``requests.post`` for every API
+call, which builds a throw-away Session each time: every reply opens a new TCP
+connection and TLS handshake to api.line.me.  ``PooledHttpClient`` keeps one
+``requests.Session`` per client with an ``HTTPAdapter`` connection pool sized
+for the worker threads, explicit (connect, read) timeouts and counters for
+connection reuse.
+
+The views build their module-level client with ``build_line_bot_api`` so the
+transport is configured in one place, ``settings.LINEBOT_TRANSPORT``, and the
+API host can be switched to the local fake (linebotcore.fakeline) through
+``settings.LINE_API_ENDPOINT`` / ``LINE_API_DATA_ENDPOINT``.
+
+Replies of events replayed from the inbox go through the ``ReplyDelivery``
+installed with ``reply_delivery`` (see linebotcore.inbox), which knows whether
+the event's replyToken has expired and whether the reply was already sent.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from linebot import LineBotApi
+from linebot.http_client import HttpClient, RequestsHttpClient, RequestsHttpResponse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .pipeline import get_config as get_pipeline_config
+
+# Default transport configuration, overridden by settings.LINEBOT_TRANSPORT
+DEFAULTS = {
+    'POOLED': True,           # False falls back to the SDK's RequestsHttpClient
+    'POOL_MAXSIZE': None,     # Connections kept per host; None = pipeline WORKERS + 1
+    'CONNECT_TIMEOUT': 3.05,  # Seconds to establish a connection
+    'READ_TIMEOUT': 10,       # Seconds to wait for the response
+    'RETRIES': 0,             # Retries on connection errors only (replies must not be sent twice)
+}
+
+
+def get_config():
+    """
+    Merge the project's LINEBOT_TRANSPORT setting over the defaults.
+
+    Returns:
+        dict: Effective transport configuration
+    """
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'LINEBOT_TRANSPORT', {}))
+    if config['POOL_MAXSIZE'] is None:
+        # One connection per worker thread plus the request thread
+        config['POOL_MAXSIZE'] = get_pipeline_config()['WORKERS'] + 1
+    return config
+
+
+class PooledHttpClient(HttpClient):
+    """
+    HttpClient on a persistent ``requests.Session`` with a bounded connection pool.
+    """
+
+    def __init__(self, timeout=HttpClient.DEFAULT_TIMEOUT, pool_maxsize=10, retries=0):
+        """
+        Args:
+            timeout: Default timeout, a float or a (connect, read) tuple
+            pool_maxsize (int): Connections kept alive per host
+            retries (int): Retries on connection errors (never on read errors)
+        """
+        super().__init__(timeout)
+        self.pool_maxsize = pool_maxsize
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(
+            pool_connections=2,   # api.line.me and api-data.line.me
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(total=retries, connect=retries, read=0, status=0, other=0,
+                              allowed_methods=None, raise_on_status=False),
+        )
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.latency = metrics.LatencyStats()
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _request(self, method, url, timeout, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            self.latency.record(time.perf_counter() - started)
+        return RequestsHttpResponse(response)
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        """GET request, see HttpClient.get."""
+        return self._request('GET', url, timeout, headers=headers, params=params, stream=stream)
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        """POST request, see HttpClient.post."""
+        return self._request('POST', url, timeout, headers=headers, data=data)
+
+    def delete(self, url, headers=None, data=None, timeout=None):
+        """DELETE request, see HttpClient.delete."""
+        return self._request('DELETE', url, timeout, headers=headers, data=data)
+
+    def put(self, url, headers=None, data=None, timeout=None):
+        """PUT request, see HttpClient.put."""
+        return self._request('PUT', url, timeout, headers=headers, data=data)
+
+    def close(self):
+        """Close every pooled connection."""
+        self.session.close()
+
+    def connection_stats(self):
+        """
+        Requests sent and connections opened, summed over the host pools.
+
+        Returns:
+            dict: requests, new_connections and reused (requests on an existing connection)
+        """
+        pools = self.adapter.poolmanager.pools
+        requests_sent = new_connections = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                requests_sent += pool.num_requests
+                new_connections += pool.num_connections
+        return {
+            'requests': requests_sent,
+            'new_connections': new_connections,
+            'reused': max(requests_sent - new_connections, 0),
+        }
+
+    def stats(self):
+        """
+        Connection reuse, error count and request latency.
+
+        Returns:
+            dict: Transport stats
+        """
+        connections = self.connection_stats()
+        return dict(
+            connections,
+            pool_maxsize=self.pool_maxsize,
+            reuse_ratio=round(connections['reused'] / connections['requests'], 4) if connections['requests'] else 0.0,
+            errors=self.errors,
+            latency=self.latency.summary(),
+        )
+
+
+REPLY_PATH = '/v2/bot/message/reply'
+
+# Reply delivery of the event handled on this thread, if any
+_delivery = threading.local()
+
+
+@contextmanager
+def reply_delivery(delivery):
+    """
+    Send the replies made on this thread through ``delivery`` while the block runs.
+
+    Args:
+        delivery: Object with ``send(post, data)``, e.g. linebotcore.inbox.ReplyDelivery
+    """
+    previous = getattr(_delivery, 'current', None)
+    _delivery.current = delivery
+    try:
+        yield delivery
+    finally:
+        _delivery.current = previous
+
+
+class DeliveryLineBotApi(LineBotApi):
+    """
+    LineBotApi whose replies (reply_message and linebotcore.payloads.reply_raw) go through
+    the current thread's reply delivery, if one is installed.
+    """
+
+    def _post(self, path, endpoint=None, data=None, headers=None, timeout=None):
+        delivery = getattr(_delivery, 'current', None)
+        if delivery is None or path != REPLY_PATH:
+            return super()._post(path, endpoint=endpoint, data=data, headers=headers, timeout=timeout)
+
+        def post(path, data, headers=None):
+            return LineBotApi._post(self, path, endpoint=endpoint, data=data, headers=headers, timeout=timeout)
+
+        return delivery.send(post, data)
+
+
+# HTTP clients and API clients created by build_line_bot_api, by name
+_clients = {}
+_apis = {}
+
+
+def build_http_client(config=None):
+    """
+    Create the HTTP client described by the transport configuration.
+
+    Args:
+        config (dict): Transport configuration, defaults to ``get_config()``
+
+    Returns:
+        HttpClient: PooledHttpClient, or the SDK's RequestsHttpClient when POOLED is off
+    """
+    config = config or get_config()
+    timeout = (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT'])
+    if not config['POOLED']:
+        return RequestsHttpClient(timeout=timeout)
+    return PooledHttpClient(timeout=timeout, pool_maxsize=config['POOL_MAXSIZE'], retries=config['RETRIES'])
+
+
+def build_line_bot_api(channel_access_token, name='default', **kwargs):
+    """
+    Create a LineBotApi using the configured transport.
+
+    Args:
+        channel_access_token (str): Channel access token
+        name (str): Name under which the client's stats are reported
+        **kwargs: Passed on to LineBotApi (endpoint, data_endpoint, ...)
+
+    Returns:
+        LineBotApi: The API client
+    """
+    # A single override endpoint (e.g. the fake API) serves both hosts
+    endpoint = getattr(settings, 'LINE_API_ENDPOINT', None)
+    data_endpoint = getattr(settings, 'LINE_API_DATA_ENDPOINT', None) or endpoint
+    kwargs.setdefault('endpoint', endpoint or LineBotApi.DEFAULT_API_ENDPOINT)
+    kwargs.setdefault('data_endpoint', data_endpoint or LineBotApi.DEFAULT_API_DATA_ENDPOINT)
+
+    http_client = build_http_client()
+    _clients[name] = http_client
+    api = DeliveryLineBotApi(channel_access_token, timeout=http_client.timeout, **kwargs)
+    # LineBotApi instantiates the class it is given; swap in the configured instance
+    api.http_client = http_client
+    _apis[name] = api
+    return api
+
+
+def use_endpoint(endpoint, data_endpoint=None):
+    """
+    Redirect every client built by build_line_bot_api to another API host.
+
+    Used by in-process benchmarks to target the local fake API after the
+    views (and their clients) have been imported.
+
+    Args:
+        endpoint (str): Base URL of the API, e.g. FakeLineServer.url
+        data_endpoint (str): Base URL of the data API, defaults to ``endpoint``
+    """
+    for api in _apis.values():
+        api.endpoint = endpoint
+        api.data_endpoint = data_endpoint or endpoint
+
+
+def stats():
+    """
+    Stats provider registered with linebotcore.metrics.
+
+    Returns:
+        dict: Stats of every pooled client, by name
+    """
+    return {
+        name: client.stats() if isinstance(client, PooledHttpClient) else {'pooled': False}
+        for name, client in _clients.items()
+    }
+
+
+metrics.register('transport', stats)
@@ -0,0 +1,253 @@
+"""
+Redelivery-aware deduplication of webhook events.
+
+When the callback is slow LINE redelivers the same event (same
+``webhookEventId``, ``deliveryContext.isRedelivery`` set).  ``dispatch_events``
+asks ``is_duplicate`` about every event and drops the ones already seen, so a
+redelivered ``action=buy`` postback is not handled twice.  An event whose
+handler raises is ``release``d again, so LINE's redelivery of it is handled
+instead of being dropped as a duplicate of the failed attempt.
+
+The local store is an LRU with a fixed TTL and a cap on the number of entries.
+With ``BACKEND = 'cache'`` the local store sits in front of a Django cache
+(``cache.add`` is atomic), so event IDs are shared by every worker process that
+uses the same cache.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+# Default dedup configuration, overridden by settings.LINEBOT_DEDUP
+DEFAULTS = {
+    'ENABLED': True,
+    'BACKEND': 'memory',       # 'memory' (per process) or 'cache' (shared through CACHE_ALIAS)
+    'CACHE_ALIAS': 'default',
+    'MAX_ENTRIES': 10000,      # Memory cap of the local LRU
+    'TTL': 600,                # Seconds an event ID is remembered
+}
+
+
+def get_config():
+    """
+    Merge the project's LINEBOT_DEDUP setting over the defaults.
+
+    Returns:
+        dict: Effective dedup configuration
+    """
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'LINEBOT_DEDUP', {}))
+    return config
+
+
+class DedupStore:
+    """
+    Bounded LRU of recently seen event IDs with a fixed time-to-live.
+
+    Because every entry has the same TTL, insertion order is also expiry order:
+    expired entries are always at the front of the OrderedDict.
+    """
+
+    def __init__(self, max_entries=10000, ttl=600, cache=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache = cache
+        self._entries = OrderedDict()  # event ID -> expiry timestamp
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.redeliveries = 0
+        self.releases = 0
+
+    def _expire(self, now):
+        # Drop expired entries from the front (caller holds the lock)
+        entries = self._entries
+        while entries:
+            key, expires_at = next(iter(entries.items()))
+            if expires_at > now:
+                break
+            del entries[key]
+            self.expirations += 1
+
+    def seen(self, key):
+        """
+        Record ``key`` and report whether it had already been recorded.
+
+        Args:
+            key (str): Event ID
+
+        Returns:
+            bool: True if the key was seen within the TTL
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if key in self._entries:
+                self.hits += 1
+                return True
+
+        # Ask the shared cache outside the lock; add() only succeeds for the first caller
+        if self.cache is not None and not self.cache.add(f'linebot:event:{key}', 1, self.ttl):
+            duplicate = True
+        else:
+            duplicate = False
+
+        with self._lock:
+            if key in self._entries:
+                # Another thread of this process recorded it meanwhile
+                self.hits += 1
+                return True
+            self._entries[key] = now + self.ttl
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            if duplicate:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return duplicate
+
+    def forget(self, key):
+        """
+        Drop a recorded key, locally and in the shared cache.
+
+        Args:
+            key (str): Event ID
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self.releases += 1
+        if self.cache is not None:
+            self.cache.delete(f'linebot:event:{key}')
+
+    def note_redelivery(self):
+        """Count an event LINE flagged as redelivered."""
+        with self._lock:
+            self.redeliveries += 1
+
+    def clear(self):
+        """Forget every recorded key (the shared cache is left untouched)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Hit/miss counters and the approximate memory used by the local LRU.
+
+        Returns:
+            dict: Dedup stats
+        """
+        with self._lock:
+            size = len(self._entries)
+            approx_bytes = sys.getsizeof(self._entries) + sum(sys.getsizeof(k) for k in self._entries)
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'cache' if self.cache is not None else 'memory',
+            'size': size,
+            'max_entries': self.max_entries,
+            'approx_bytes': approx_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'redeliveries': self.redeliveries,
+            'releases': self.releases,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Return the process-wide dedup store, creating it from settings on first use.
+
+    Returns:
+        DedupStore: The shared store
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = get_config()
+                cache = caches[config['CACHE_ALIAS']] if config['BACKEND'] == 'cache' else None
+                _store = DedupStore(config['MAX_ENTRIES'], config['TTL'], cache)
+    return _store
+
+
+def event_id(event):
+    """
+    The ``webhookEventId`` of an SDK event or raw event dict, if any.
+
+    Args:
+        event: LINE SDK event object or raw event dict
+
+    Returns:
+        str or None: The webhook event ID
+    """
+    if isinstance(event, dict):
+        return event.get('webhookEventId')
+    return getattr(event, 'webhook_event_id', None)
+
+
+def is_duplicate(event):
+    """
+    Check (and record) whether an event has already been dispatched.
+
+    Events without a ``webhookEventId`` are never treated as duplicates.
+
+    Args:
+        event: LINE SDK event object
+
+    Returns:
+        bool: True if the event should be skipped
+    """
+    if not get_config()['ENABLED']:
+        return False
+    key = event_id(event)
+    if not key:
+        return False
+    store = get_store()
+    delivery_context = getattr(event, 'delivery_context', None)
+    if delivery_context is not None and delivery_context.is_redelivery:
+        store.note_redelivery()
+    return store.seen(key)
+
+
+def release(event):
+    """
+    Forget an event recorded by ``is_duplicate`` because handling it failed.
+
+    Args:
+        event: LINE SDK event object
+    """
+    if not get_config()['ENABLED']:
+        return
+    key = event_id(event)
+    if key:
+        get_store().forget(key)
+
+
+def stats():
+    """
+    Stats provider registered with linebotcore.metrics.
+
+    Returns:
+        dict: Dedup stats, or only the enabled flag before first use
+    """
+    if _store is None:
+        return {'enabled': get_config()['ENABLED']}
+    return dict(get_store().stats(), enabled=get_config()['ENABLED'])
+
+
+metrics.register('dedup', stats)
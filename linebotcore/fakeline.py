@@ -0,0 +1,320 @@
+"""
+Local stand-in for the LINE Messaging API, for load tests.
+
+``FakeLineServer`` answers the endpoints the bots use (reply, push, multicast
+and message content) on a local port, records every call and can inject
+latency, 500 errors and 429 rate-limit responses.  Point the bots at it with
+``LINE_API_ENDPOINT`` in settings (or the environment) and run it with
+``python manage.py fake_line_api``, or start it in-process from a benchmark.
+
+Control endpoints (no auth):
+
+* ``GET /fake/stats``  -- counters per endpoint and status
+* ``GET /fake/calls``  -- the most recent recorded calls (``?limit=50``)
+* ``POST /fake/reset`` -- clear counters and recorded calls
+"""
+
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from . import metrics
+
+# LINE API limits checked by the fake
+MAX_MESSAGES = 5
+MAX_MULTICAST_RECIPIENTS = 500
+
+CONTENT_PATH = re.compile(r'^/v2/bot/message/(?P<message_id>[^/]+)/content$')
+
+
+class _FakeLineHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without TCP_NODELAY a kept-alive
+    # connection waits on the client's delayed ACK (~40 ms) for every response
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.fake.connection_opened()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.fake.handle(self, 'GET')
+
+    def do_POST(self):
+        self.server.fake.handle(self, 'POST')
+
+    def send_body(self, status, body, content_type='application/json', headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients may drop a connection mid-response (e.g. a size-capped content download)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeLineServer:
+    """
+    Threaded HTTP server imitating the LINE Messaging API endpoints.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 throttle_rate=0.0, connection_delay=0.0, content_size=64 * 1024,
+                 record_limit=1000, seed=None):
+        """
+        Args:
+            host (str): Interface to listen on
+            port (int): Port to listen on, 0 picks a free port
+            latency (float): Seconds added to every API response
+            jitter (float): Random extra seconds (0..jitter) added to the latency
+            error_rate (float): Fraction of API calls answered with 500
+            throttle_rate (float): Fraction of API calls answered with 429
+            connection_delay (float): Seconds spent on every new connection (simulated TLS handshake)
+            content_size (int): Size in bytes of the message content returned
+            record_limit (int): Number of recent calls kept for /fake/calls
+            seed (int): Seed of the error/throttle/jitter draws, for repeatable runs
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.connection_delay = connection_delay
+        self.content = bytes(range(256)) * (content_size // 256) + bytes(content_size % 256)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._calls = deque(maxlen=record_limit)
+        self._thread = None
+        self.reset()
+
+        self.httpd = _FakeHTTPServer((host, port), _FakeLineHandler)
+        self.httpd.fake = self
+
+    @property
+    def url(self):
+        """Base URL to use as LINE_API_ENDPOINT."""
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serve on a background daemon thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-line-api', daemon=True)
+        self._thread.start()
+        metrics.register('fake_line_api', self.stats)
+        return self
+
+    def serve_forever(self):
+        """Serve on the calling thread until interrupted."""
+        metrics.register('fake_line_api', self.stats)
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        metrics.unregister('fake_line_api')
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.httpd.server_close()
+
+    # --- counters -------------------------------------------------------
+
+    def reset(self):
+        """Clear counters and recorded calls."""
+        with self._lock:
+            self._calls.clear()
+            self.connections = 0
+            self.status_counts = Counter()    # (endpoint, status) -> calls
+            self.messages_sent = 0
+            self.recipients = 0
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+        if self.connection_delay:
+            time.sleep(self.connection_delay)
+
+    def stats(self):
+        """
+        Call counters per endpoint and status.
+
+        Returns:
+            dict: Fake API stats
+        """
+        with self._lock:
+            endpoints = {}
+            for (endpoint, status), count in self.status_counts.items():
+                counts = endpoints.setdefault(endpoint, {'calls': 0, 'status': {}})
+                counts['calls'] += count
+                counts['status'][str(status)] = count
+            return {
+                'connections': self.connections,
+                'calls': sum(self.status_counts.values()),
+                'messages_sent': self.messages_sent,
+                'recipients': self.recipients,
+                'endpoints': endpoints,
+            }
+
+    def calls(self, limit=None):
+        """
+        The most recent recorded calls, oldest first.
+
+        Args:
+            limit (int): Maximum number of calls returned
+
+        Returns:
+            list[dict]: method, endpoint, status, request_id, time and parsed body of each call
+        """
+        with self._lock:
+            calls = list(self._calls)
+        return calls[-limit:] if limit else calls
+
+    def _record(self, method, endpoint, status, request_id, body):
+        with self._lock:
+            self.status_counts[(endpoint, status)] += 1
+            self._calls.append({
+                'time': time.time(), 'method': method, 'endpoint': endpoint,
+                'status': status, 'request_id': request_id, 'body': body,
+            })
+
+    def _draw(self):
+        # One draw per API call: (extra latency, injected status or None)
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            return delay, 429
+        if roll < self.throttle_rate + self.error_rate:
+            return delay, 500
+        return delay, None
+
+    # --- request handling -----------------------------------------------
+
+    def handle(self, request, method):
+        url = urlsplit(request.path)
+        path = url.path
+
+        # Always consume the body so the kept-alive connection stays in sync
+        length = int(request.headers.get('Content-Length', 0) or 0)
+        raw = request.rfile.read(length) if length else b''
+
+        if path.startswith('/fake/'):
+            self._handle_control(request, method, path, dict(parse_qsl(url.query)))
+            return
+
+        request_id = uuid.uuid4().hex
+        headers = {'X-Line-Request-Id': request_id}
+
+        content_match = CONTENT_PATH.match(path) if method == 'GET' else None
+        if method == 'POST' and path in ('/v2/bot/message/reply', '/v2/bot/message/push',
+                                         '/v2/bot/message/multicast'):
+            endpoint = path.rsplit('/', 1)[1]
+        elif content_match:
+            endpoint = 'content'
+        else:
+            request.send_body(404, {'message': 'Not found'}, headers=headers)
+            self._record(method, path, 404, request_id, None)
+            return
+
+        if not request.headers.get('Authorization', '').startswith('Bearer '):
+            self._respond(request, method, endpoint, 401, request_id, None,
+                          {'message': 'Authentication failed. Confirm that the access token in the authorization header is valid.'})
+            return
+
+        delay, injected = self._draw()
+        if delay:
+            time.sleep(delay)
+
+        body = None
+        if raw:
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                self._respond(request, method, endpoint, 400, request_id, None,
+                              {'message': 'The request body has 1 error(s)'})
+                return
+
+        if injected == 429:
+            self._respond(request, method, endpoint, 429, request_id, body,
+                          {'message': 'The API rate limit has been exceeded. Try again later.'})
+            return
+        if injected == 500:
+            self._respond(request, method, endpoint, 500, request_id, body,
+                          {'message': 'Internal server error'})
+            return
+
+        if endpoint == 'content':
+            request.send_body(200, self.content, content_type='image/jpeg', headers=headers)
+            self._record(method, endpoint, 200, request_id, {'messageId': content_match.group('message_id')})
+            return
+
+        error = self._validate(endpoint, body)
+        if error:
+            self._respond(request, method, endpoint, 400, request_id, body, {'message': error})
+            return
+
+        with self._lock:
+            recipients = len(body['to']) if endpoint == 'multicast' else 1
+            self.messages_sent += len(body['messages']) * recipients
+            self.recipients += recipients
+        self._respond(request, method, endpoint, 200, request_id, body, {})
+
+    def _respond(self, request, method, endpoint, status, request_id, body, payload):
+        request.send_body(status, payload, headers={'X-Line-Request-Id': request_id})
+        self._record(method, endpoint, status, request_id, body)
+
+    @staticmethod
+    def _validate(endpoint, body):
+        # The subset of the API's request validation the bots can trip over
+        if not isinstance(body, dict):
+            return 'The request body must be a JSON object'
+        messages = body.get('messages')
+        if not isinstance(messages, list) or not 1 <= len(messages) <= MAX_MESSAGES:
+            return f'messages must contain 1 to {MAX_MESSAGES} items'
+        if endpoint == 'reply' and not body.get('replyToken'):
+            return 'Invalid reply token'
+        if endpoint == 'push' and not body.get('to'):
+            return 'The property, \'to\', in the request body is invalid'
+        if endpoint == 'multicast':
+            to = body.get('to')
+            if not isinstance(to, list) or not 1 <= len(to) <= MAX_MULTICAST_RECIPIENTS:
+                return f'to must contain 1 to {MAX_MULTICAST_RECIPIENTS} user IDs'
+        return None
+
+    def _handle_control(self, request, method, path, query):
+        if method == 'GET' and path == '/fake/stats':
+            request.send_body(200, self.stats())
+        elif method == 'GET' and path == '/fake/calls':
+            try:
+                limit = int(query.get('limit', 50))
+            except ValueError:
+                limit = -1
+            if limit < 0:
+                request.send_body(400, {'message': 'limit must be a non-negative integer'})
+                return
+            request.send_body(200, self.calls(limit))
+        elif method == 'POST' and path == '/fake/reset':
+            self.reset()
+            request.send_body(200, {})
+        else:
+            request.send_body(404, {'message': 'Not found'})
@@ -0,0 +1,256 @@
+"""
+Durable webhook inbox backed by the ``WebhookInbox`` table.
+
+In ``'inbox'`` pipeline mode the callback views store the raw JSON of every
+signature-verified event with one batched INSERT and return 200; the
+``manage.py process_inbox`` worker later claims the rows in batches, rebuilds
+the SDK event objects and runs the project's event handler on them.
+
+A replyToken is only accepted shortly after the event, and only once.  While
+a replayed event is handled its replies go through a ``ReplyDelivery``: an
+event older than ``REPLY_TOKEN_TTL`` has its reply pushed to the chat it came
+from (or skipped, see ``EXPIRED_REPLY``), and a reply that went out is
+recorded in ``replied_at`` so a retried attempt never sends it again.
+"""
+
+import json
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from linebot.models import (
+    MessageEvent, FollowEvent, UnfollowEvent, JoinEvent, LeaveEvent,
+    PostbackEvent, BeaconEvent, AccountLinkEvent, MemberJoinedEvent,
+    MemberLeftEvent, ThingsEvent, UnsendEvent, VideoPlayCompleteEvent,
+    UnknownEvent
+)
+
+from .client import REPLY_PATH
+from .models import WebhookInbox
+
+logger = logging.getLogger(__name__)
+
+PUSH_PATH = '/v2/bot/message/push'
+
+# Webhook event type -> SDK event class, as in linebot.WebhookParser.parse
+EVENT_CLASSES = {
+    'message': MessageEvent,
+    'follow': FollowEvent,
+    'unfollow': UnfollowEvent,
+    'join': JoinEvent,
+    'leave': LeaveEvent,
+    'postback': PostbackEvent,
+    'beacon': BeaconEvent,
+    'accountLink': AccountLinkEvent,
+    'memberJoined': MemberJoinedEvent,
+    'memberLeft': MemberLeftEvent,
+    'things': ThingsEvent,
+    'unsend': UnsendEvent,
+    'videoPlayComplete': VideoPlayCompleteEvent,
+}
+
+
+def event_from_dict(data):
+    """
+    Rebuild an SDK event object from the JSON dict LINE sent.
+
+    Args:
+        data (dict): One element of the webhook body's ``events`` list
+
+    Returns:
+        linebot.models.events.Event: The parsed event
+    """
+    event_class = EVENT_CLASSES.get(data.get('type'), UnknownEvent)
+    return event_class.new_from_json_dict(data)
+
+
+def append_events(body, event_ids=None):
+    """
+    Store the events of a verified webhook body with a single batched insert.
+
+    Args:
+        body (str): Raw webhook request body, already signature-verified
+        event_ids (set): If given, only events with one of these ``webhookEventId``
+            values (or without an ID) are stored; the others were deduplicated
+
+    Returns:
+        int: Number of events stored
+    """
+    raw_events = json.loads(body).get('events', [])
+    if event_ids is not None:
+        raw_events = [
+            raw_event for raw_event in raw_events
+            if not raw_event.get('webhookEventId') or raw_event['webhookEventId'] in event_ids
+        ]
+    rows = [
+        WebhookInbox(
+            event_id=raw_event.get('webhookEventId', ''),
+            payload=json.dumps(raw_event, ensure_ascii=False),
+        )
+        for raw_event in raw_events
+    ]
+    WebhookInbox.objects.bulk_create(rows)
+    return len(rows)
+
+
+def claim_batch(limit=50, stale_after=300):
+    """
+    Atomically claim up to ``limit`` pending events for this worker.
+
+    Rows stuck in 'processing' for longer than ``stale_after`` seconds (e.g.
+    their worker was killed) are claimable again.
+
+    Args:
+        limit (int): Maximum number of rows to claim
+        stale_after (int): Seconds after which a processing claim expires
+
+    Returns:
+        list[WebhookInbox]: Claimed rows, oldest first
+    """
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    claim = {'status': WebhookInbox.STATUS_PROCESSING, 'claim_token': token, 'claimed_at': now}
+    with transaction.atomic():
+        # The status conditions in the UPDATEs keep two workers from claiming the same row
+        pending = WebhookInbox.objects.filter(status=WebhookInbox.STATUS_PENDING)
+        ids = list(pending.order_by('id').values_list('id', flat=True)[:limit])
+        claimed = pending.filter(id__in=ids).update(**claim)
+        if claimed < limit:
+            stale = WebhookInbox.objects.filter(
+                status=WebhookInbox.STATUS_PROCESSING,
+                claimed_at__lt=now - timedelta(seconds=stale_after),
+            )
+            ids = list(stale.order_by('id').values_list('id', flat=True)[:limit - claimed])
+            stale.filter(id__in=ids).update(**claim)
+    return list(WebhookInbox.objects.filter(claim_token=token).order_by('id'))
+
+
+class ReplyDelivery:
+    """
+    Sends the replies of one replayed inbox event (installed with linebotcore.client.reply_delivery).
+    """
+
+    def __init__(self, row, data, token_ttl=60, expired_reply='push', now=None):
+        """
+        Args:
+            row (WebhookInbox): The claimed row
+            data (dict): The event's JSON, as LINE sent it
+            token_ttl (float): Seconds after the event its replyToken is still accepted
+            expired_reply (str): 'push' to send an expired reply to the event's chat, 'skip' to drop it
+            now (float): Current Unix time, for tests
+        """
+        self.row = row
+        timestamp = data.get('timestamp')
+        now = time.time() if now is None else now
+        self.expired = timestamp is not None and now - timestamp / 1000 > token_ttl
+        source = data.get('source') or {}
+        self.to = source.get('groupId') or source.get('roomId') or source.get('userId')
+        self.expired_reply = expired_reply
+        # The same key on every attempt, so LINE accepts a retried push only once
+        self.retry_key = str(uuid.uuid5(uuid.NAMESPACE_URL, f'linebot:event:{data.get("webhookEventId") or row.pk}'))
+
+    def send(self, post, data):
+        """
+        Send one reply of the event.
+
+        Args:
+            post (callable): ``post(path, data, headers=None)`` sending a request to the API
+            data (str or bytes): JSON body of the reply request
+
+        Returns:
+            The API response, or None if nothing was sent
+        """
+        if self.row.replied_at is not None:
+            logger.info(f"Inbox event {self.row.pk} was already replied to, not replying again")
+            return None
+        if not self.expired:
+            response = post(REPLY_PATH, data)
+        elif self.expired_reply == 'push' and self.to:
+            body = json.loads(data)
+            push = {
+                'to': self.to,
+                'messages': body['messages'],
+                'notificationDisabled': body.get('notificationDisabled', False),
+            }
+            headers = {'Content-Type': 'application/json', 'X-Line-Retry-Key': self.retry_key}
+            response = post(PUSH_PATH, json.dumps(push, ensure_ascii=False), headers)
+        else:
+            logger.warning(f"Reply token of inbox event {self.row.pk} has expired, reply dropped")
+            return None
+        mark_replied(self.row)
+        return response
+
+
+def mark_replied(row):
+    """
+    Record that a claimed row's reply went out.
+
+    Args:
+        row (WebhookInbox): The claimed row
+    """
+    row.replied_at = timezone.now()
+    WebhookInbox.objects.filter(id=row.id).update(replied_at=row.replied_at)
+
+
+def mark_done(ids):
+    """
+    Mark claimed rows as successfully handled.
+
+    Args:
+        ids (list[int]): Primary keys of the handled rows
+    """
+    WebhookInbox.objects.filter(id__in=ids).update(
+        status=WebhookInbox.STATUS_DONE, processed_at=timezone.now(), error=''
+    )
+
+
+def mark_failed(row, error, max_attempts=3):
+    """
+    Record a failed attempt; the row goes back to pending until ``max_attempts``.
+
+    Args:
+        row (WebhookInbox): The claimed row
+        error (str): Error description
+        max_attempts (int): Attempts after which the row is marked failed
+    """
+    row.attempts += 1
+    row.status = WebhookInbox.STATUS_FAILED if row.attempts >= max_attempts else WebhookInbox.STATUS_PENDING
+    row.error = error
+    row.claim_token = ''
+    row.processed_at = timezone.now()
+    row.save(update_fields=['attempts', 'status', 'error', 'claim_token', 'processed_at'])
+
+
+def purge_done(older_than_days):
+    """
+    Delete handled rows older than the given number of days.
+
+    Args:
+        older_than_days (int): Retention period in days
+
+    Returns:
+        int: Number of rows deleted
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = WebhookInbox.objects.filter(
+        status=WebhookInbox.STATUS_DONE, processed_at__lt=cutoff
+    ).delete()
+    return deleted
+
+
+def stats():
+    """
+    Stats provider registered with linebotcore.metrics (one grouped COUNT query).
+
+    Returns:
+        dict: Number of inbox rows per status
+    """
+    counts = {status: 0 for status, _ in WebhookInbox.STATUS_CHOICES}
+    for row in WebhookInbox.objects.values('status').annotate(total=Count('id')):
+        counts[row['status']] = row['total']
+    return counts
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from linebotcore.router import CommandRouter
+
+
+def _noop(*args):
+    return None
+
+
+def build_router(command_count):
+    # Same shape as testapp: N exact commands plus the three text rules
+    router = CommandRouter()
+    for i in range(command_count):
+        router.add_exact(f'@指令{i}', _noop)
+    router.add_pattern(r'\d{3}', _noop, priority=30)
+    router.add_suffix('介紹', _noop, priority=20)
+    router.add_prefix('@', _noop, priority=10)
+    router.set_default(_noop)
+    return router
+
+
+def build_chain(command_count):
+    # Baseline: the old if/elif chain, i.e. comparing the text with every command in order
+    commands = [f'@指令{i}' for i in range(command_count)]
+
+    def resolve(text):
+        for command in commands:
+            if text == command:
+                return _noop
+        if len(text) == 3 and text.isdigit():
+            return _noop
+        if text.endswith('介紹'):
+            return _noop
+        if text.startswith('@'):
+            return _noop
+        return _noop
+    return resolve
+
+
+class Command(BaseCommand):
+    help = '量測指令路由在不同指令數量下的每次分派成本'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000,10000', help='以逗號分隔的指令數量')
+        parser.add_argument('--iterations', type=int, default=200000, help='每種情境的分派次數')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        iterations = options['iterations']
+
+        self.stdout.write(f'{"指令數":>8} {"情境":<10} {"router (ns)":>12} {"if/elif (ns)":>13}')
+        for size in sizes:
+            router = build_router(size)
+            chain = build_chain(size)
+            samples = {
+                'exact-last': f'@指令{size - 1}',
+                'suffix': '焙烏龍介紹',
+                'pattern': '123',
+                'default': 'hello',
+            }
+            for label, text in samples.items():
+                router_ns = self._time(router.resolve_text, text, iterations)
+                chain_ns = self._time(chain, text, max(iterations // max(size // 100, 1), 1000))
+                self.stdout.write(f'{size:>8} {label:<10} {router_ns:>12.0f} {chain_ns:>13.0f}')
+
+    @staticmethod
+    def _time(resolve, text, iterations):
+        resolve(text)  # Warm up (compiles the router's matcher)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            resolve(text)
+        return (time.perf_counter() - started) / iterations * 1e9
@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from linebot import LineBotApi
+from linebot.http_client import RequestsHttpClient
+from linebot.models import TextSendMessage
+
+from linebotcore.client import PooledHttpClient
+from linebotcore.fakeline import FakeLineServer
+from linebotcore.metrics import percentile
+
+
+class Command(BaseCommand):
+    help = '以本機模擬 LINE API 比較預設連線方式與連線池的回覆延遲'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='每種連線方式送出的回覆數')
+        parser.add_argument('--concurrency', type=int, default=4, help='同時送出回覆的執行緒數')
+        parser.add_argument('--handshake-ms', type=float, default=0.0,
+                            help='模擬每條新連線的建立成本 (毫秒)，例如 30 約等於連到 api.line.me 的 TLS 交握')
+
+    def handle(self, *args, **options):
+        server = FakeLineServer(connection_delay=options['handshake_ms'] / 1000, record_limit=0).start()
+        endpoint = server.url
+        message = TextSendMessage(text='我是中原 Linebot,\n您好!')
+
+        self.stdout.write(
+            f'{"連線方式":<10} {"回覆數":>6} {"新連線":>6} {"avg (ms)":>9} {"p50 (ms)":>9} '
+            f'{"p95 (ms)":>9} {"p99 (ms)":>9} {"回覆/秒":>8}'
+        )
+        try:
+            for label in ('requests', 'pooled'):
+                api = LineBotApi('bench-token', endpoint=endpoint)
+                if label == 'pooled':
+                    api.http_client = PooledHttpClient(timeout=(3.05, 10), pool_maxsize=options['concurrency'])
+                else:
+                    api.http_client = RequestsHttpClient(timeout=(3.05, 10))
+
+                # Warm up outside the measurement, then count only the measured connections
+                api.reply_message('warm-up', message)
+                server.reset()
+
+                samples, elapsed = self._run(api, message, options['requests'], options['concurrency'])
+                samples.sort()
+                self.stdout.write(
+                    f'{label:<10} {len(samples):>6} {server.stats()["connections"]:>6} '
+                    f'{sum(samples) / len(samples) * 1000:>9.2f} {percentile(samples, 50) * 1000:>9.2f} '
+                    f'{percentile(samples, 95) * 1000:>9.2f} {percentile(samples, 99) * 1000:>9.2f} '
+                    f'{len(samples) / elapsed:>8.0f}'
+                )
+                if label == 'pooled':
+                    self.stdout.write(f'連線池統計: {api.http_client.stats()}')
+                    api.http_client.close()
+        finally:
+            server.stop()
+
+    @staticmethod
+    def _run(api, message, count, concurrency):
+        def reply(i):
+            started = time.perf_counter()
+            api.reply_message(f'token-{i}', message)
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(reply, range(count)))
+        return samples, time.perf_counter() - started
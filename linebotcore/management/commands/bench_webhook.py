@@ -0,0 +1,231 @@
+import base64
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import get_resolver
+
+from linebotcore import client as line_client
+from linebotcore.fakeline import FakeLineServer
+from linebotcore.metrics import percentile
+from linebotcore.pipeline import get_pipeline, get_config as get_pipeline_config
+
+DRINKS = ['春烏龍', '輕烏龍', '焙烏龍', '黃金珍珠奶綠', '烘吉鮮奶', '焙烏龍鮮奶', '甘蔗春烏龍', '優酪春烏龍']
+PHRASES = ['你好', '今天天氣很好', '請問廁所在哪裡', '我想要一杯珍珠奶茶', '謝謝你的幫忙', '這個多少錢']
+
+
+def _three_digits(rng):
+    return f'{rng.randrange(1000):03d}'
+
+
+def _many_numbers(rng):
+    # A stack of receipts typed into one message
+    return '\n'.join(f'{rng.randrange(10 ** 8):08d}' for _ in range(rng.randint(2, 20)))
+
+
+# Command mixes per bot app: (label, weight, event type, text or postback data factory)
+MIXES = {
+    'testapp': [
+        ('@菜單', 15, 'message', lambda rng: '@菜單'),
+        ('飲料介紹', 25, 'message', lambda rng: f'{rng.choice(DRINKS)}介紹'),
+        ('3碼對獎', 20, 'message', _three_digits),
+        ('@傳送文字', 10, 'message', lambda rng: '@傳送文字'),
+        ('postback:buy', 10, 'postback', lambda rng: 'action=buy'),
+        ('postback:drink_category', 10, 'postback',
+         lambda rng: f'action=drink_category&category={rng.choice(["tea", "milk", "other"])}'),
+        ('自由文字', 10, 'message', lambda rng: rng.choice(PHRASES)),
+    ],
+    'linebotinvoice': [
+        ('3碼對獎', 50, 'message', _three_digits),
+        ('多筆對獎', 10, 'message', _many_numbers),
+        ('@顯示本期中獎號碼', 15, 'message', lambda rng: '@顯示本期中獎號碼'),
+        ('@對獎', 10, 'message', lambda rng: '@對獎'),
+        ('自由文字', 15, 'message', lambda rng: rng.choice(PHRASES)),
+    ],
+    'translateapi': [
+        ('@英文', 10, 'message', lambda rng: '@英文'),
+        ('@顯示設定', 10, 'message', lambda rng: '@顯示設定'),
+        ('翻譯', 60, 'message', lambda rng: rng.choice(PHRASES)),
+        ('postback:lang', 20, 'postback', lambda rng: f'lang={rng.choice(["fr", "de", "es", "ko", "th"])}'),
+    ],
+}
+
+
+def detect_mix():
+    # The bot app of the current project decides the command mix
+    for label in MIXES:
+        if apps.is_installed(label):
+            return label
+    raise CommandError(f'找不到對應的指令組合，請以 --mix 指定：{", ".join(MIXES)}')
+
+
+def build_event(kind, value, rng):
+    # Same shape as a real webhook event, with a unique webhookEventId so dedup keeps it
+    event = {
+        'type': kind,
+        'mode': 'active',
+        'timestamp': int(time.time() * 1000),
+        'source': {'type': 'user', 'userId': f'Ubench{rng.randrange(1000):04d}'},
+        'webhookEventId': uuid.uuid4().hex.upper()[:26],
+        'deliveryContext': {'isRedelivery': False},
+        'replyToken': uuid.uuid4().hex,
+    }
+    if kind == 'postback':
+        event['postback'] = {'data': value}
+    else:
+        event['message'] = {'id': str(rng.randrange(10 ** 17)), 'type': 'text', 'text': value}
+    return event
+
+
+def sign(body):
+    digest = hmac.new(settings.LINE_CHANNEL_SECRET.encode('utf-8'), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+class Command(BaseCommand):
+    help = '產生帶有簽章的模擬 webhook 請求，量測 callback 的吞吐量與各指令延遲'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='送出的 webhook 請求數')
+        parser.add_argument('--concurrency', type=int, default=8, help='同時送出請求的執行緒數')
+        parser.add_argument('--events-per-request', type=int, default=1, help='每個請求包含的事件數')
+        parser.add_argument('--mix', choices=sorted(MIXES), default=None, help='指令組合，預設依專案自動判斷')
+        parser.add_argument('--url', default=None,
+                            help='以真實 HTTP 送到此 callback 網址 (例如 http://127.0.0.1:8000/callback)，'
+                                 '未指定則在程序內以 Django test client 送出')
+        parser.add_argument('--path', default='/callback', help='程序內模式的 callback 路徑')
+        parser.add_argument('--fake-line', action='store_true',
+                            help='程序內模式：啟動模擬 LINE API 並讓 bot 的回覆送到該伺服器')
+        parser.add_argument('--fake-latency-ms', type=float, default=30.0, help='模擬 LINE API 的回應延遲 (毫秒)')
+        parser.add_argument('--test-db', action='store_true', help='程序內模式：使用暫時的測試資料庫，不動到 db.sqlite3')
+        parser.add_argument('--seed', type=int, default=None, help='隨機種子，用於重現相同的請求序列')
+
+    def handle(self, *args, **options):
+        in_process = options['url'] is None
+        if not in_process and (options['fake_line'] or options['test_db']):
+            raise CommandError('--fake-line 與 --test-db 只能用於程序內模式 (未指定 --url)')
+
+        mix = MIXES[options['mix'] or detect_mix()]
+        rng = random.Random(options['seed'])
+        bodies = self._build_bodies(mix, rng, options['requests'], options['events_per_request'])
+
+        fake = old_config = None
+        if in_process:
+            # Import the URLconf (and with it the views' API clients) before redirecting them
+            get_resolver().url_patterns
+            if options['test_db']:
+                old_config = setup_databases(verbosity=0, interactive=False)
+            if options['fake_line']:
+                fake = FakeLineServer(latency=options['fake_latency_ms'] / 1000, record_limit=0).start()
+                line_client.use_endpoint(fake.url)
+
+        try:
+            results, elapsed = self._run(bodies, options)
+            if in_process and get_pipeline_config()['MODE'] == 'thread':
+                # Wait for the queued handlers so their latency is part of the report
+                get_pipeline().join()
+            self._report(results, elapsed)
+            if in_process and get_pipeline_config()['MODE'] == 'thread':
+                self.stdout.write(f'背景處理延遲: {get_pipeline().run_latency.summary()}')
+            if fake is not None:
+                self.stdout.write(f'模擬 LINE API: {json.dumps(fake.stats(), ensure_ascii=False)}')
+        finally:
+            if fake is not None:
+                fake.stop()
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+
+    @staticmethod
+    def _build_bodies(mix, rng, count, events_per_request):
+        labels = [entry[0] for entry in mix]
+        weights = [entry[1] for entry in mix]
+        by_label = {entry[0]: entry for entry in mix}
+        bodies = []
+        for _ in range(count):
+            events = []
+            chosen = rng.choices(labels, weights, k=events_per_request)
+            for label in chosen:
+                _, _, kind, factory = by_label[label]
+                events.append(build_event(kind, factory(rng), rng))
+            body = json.dumps({'destination': 'Ubenchdestination', 'events': events},
+                              ensure_ascii=False).encode('utf-8')
+            # A request is reported under the command of its first event
+            bodies.append((chosen[0], body))
+        return bodies
+
+    def _run(self, bodies, options):
+        if options['url'] is None:
+            local = threading.local()
+
+            def send(body):
+                # One test client per thread; handler exceptions become 500s instead of raising
+                if not hasattr(local, 'client'):
+                    local.client = Client(raise_request_exception=False)
+                response = local.client.post(options['path'], data=body, content_type='application/json',
+                                            HTTP_X_LINE_SIGNATURE=sign(body))
+                return response.status_code
+        else:
+            local = threading.local()
+
+            def send(body):
+                if not hasattr(local, 'session'):
+                    local.session = requests.Session()
+                response = local.session.post(options['url'], data=body, timeout=30, headers={
+                    'Content-Type': 'application/json', 'X-Line-Signature': sign(body),
+                })
+                return response.status_code
+
+        def fire(item):
+            label, body = item
+            started = time.perf_counter()
+            try:
+                status = send(body)
+            except Exception as e:
+                status = type(e).__name__
+            return label, status, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(fire, bodies))
+        return results, time.perf_counter() - started
+
+    def _report(self, results, elapsed):
+        by_label = defaultdict(list)
+        for label, status, seconds in results:
+            by_label[label].append((status, seconds))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'共 {len(results)} 個請求，耗時 {elapsed:.2f} 秒，吞吐量 {len(results) / elapsed:.1f} 請求/秒'
+        ))
+        self.stdout.write(
+            f'{"指令":<24} {"請求數":>6} {"錯誤率":>7} {"p50 (ms)":>9} {"p95 (ms)":>9} {"p99 (ms)":>9}'
+        )
+        for label, samples in sorted(by_label.items(), key=lambda item: -len(item[1])):
+            self._report_line(label, samples)
+        self._report_line('全部', [(status, seconds) for _, status, seconds in results])
+
+        statuses = defaultdict(int)
+        for _, status, _ in results:
+            statuses[status] += 1
+        self.stdout.write(f'回應狀態: {dict(statuses)}')
+
+    def _report_line(self, label, samples):
+        latencies = sorted(seconds for _, seconds in samples)
+        errors = sum(1 for status, _ in samples if status != 200)
+        self.stdout.write(
+            f'{label:<24} {len(samples):>6} {errors / len(samples):>7.1%} '
+            f'{percentile(latencies, 50) * 1000:>9.2f} {percentile(latencies, 95) * 1000:>9.2f} '
+            f'{percentile(latencies, 99) * 1000:>9.2f}'
+        )
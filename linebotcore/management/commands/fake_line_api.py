@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from linebotcore.fakeline import FakeLineServer
+
+
+class Command(BaseCommand):
+    help = '啟動本機模擬 LINE Messaging API (reply/push/multicast/content)，供壓力測試使用'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='監聽位址')
+        parser.add_argument('--port', type=int, default=8765, help='監聽埠號')
+        parser.add_argument('--latency-ms', type=float, default=0.0, help='每次 API 呼叫增加的延遲 (毫秒)')
+        parser.add_argument('--jitter-ms', type=float, default=0.0, help='額外隨機延遲上限 (毫秒)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='回應 500 錯誤的比例 (0~1)')
+        parser.add_argument('--throttle-rate', type=float, default=0.0, help='回應 429 (超過速率限制) 的比例 (0~1)')
+        parser.add_argument('--connection-delay-ms', type=float, default=0.0, help='每條新連線的建立成本 (毫秒)')
+        parser.add_argument('--content-kb', type=int, default=64, help='取得訊息內容時回傳的大小 (KB)')
+        parser.add_argument('--seed', type=int, default=None, help='隨機種子，用於重現相同的錯誤分布')
+
+    def handle(self, *args, **options):
+        server = FakeLineServer(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency_ms'] / 1000,
+            jitter=options['jitter_ms'] / 1000,
+            error_rate=options['error_rate'],
+            throttle_rate=options['throttle_rate'],
+            connection_delay=options['connection_delay_ms'] / 1000,
+            content_size=options['content_kb'] * 1024,
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'模擬 LINE API 已啟動：{server.url}'))
+        self.stdout.write(f'讓 bot 連到此伺服器：LINE_API_ENDPOINT={server.url} python manage.py runserver')
+        self.stdout.write(f'呼叫統計：{server.url}/fake/stats，最近的呼叫：{server.url}/fake/calls')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('收到中斷訊號，停止模擬伺服器')
+        finally:
+            server.stop()
+        self.stdout.write(json.dumps(server.stats(), ensure_ascii=False, indent=2))
@@ -0,0 +1,69 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from linebotcore import inbox
+from linebotcore.client import reply_delivery
+from linebotcore.pipeline import get_config
+
+class Command(BaseCommand):
+    help = '從 webhook 收件匣批次領取事件並交給專案的事件處理函式'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='每批領取的事件數')
+        parser.add_argument('--idle-sleep', type=float, default=0.5, help='收件匣為空時的等待秒數')
+        parser.add_argument('--max-attempts', type=int, default=3, help='失敗幾次後標記為失敗')
+        parser.add_argument('--stale-after', type=int, default=300, help='處理中超過幾秒可被重新領取')
+        parser.add_argument('--purge-days', type=int, default=None, help='啟動時刪除幾天前已完成的事件')
+        parser.add_argument('--once', action='store_true', help='清空收件匣後即結束，不持續輪詢')
+
+    def handle(self, *args, **options):
+        config = get_config()
+        handler_path = config['HANDLER']
+        if not handler_path:
+            raise CommandError("settings.LINEBOT_PIPELINE['HANDLER'] 未設定")
+        handler = import_string(handler_path)
+
+        if options['purge_days'] is not None:
+            purged = inbox.purge_done(options['purge_days'])
+            self.stdout.write(f'已刪除 {purged} 筆已完成的事件')
+
+        self.stdout.write(self.style.SUCCESS(f'開始處理收件匣 (handler: {handler_path})'))
+        handled = failed = 0
+        started = time.perf_counter()
+        try:
+            while True:
+                close_old_connections()
+                rows = inbox.claim_batch(options['batch_size'], options['stale_after'])
+                if not rows:
+                    if options['once']:
+                        break
+                    time.sleep(options['idle_sleep'])
+                    continue
+
+                done_ids = []
+                for row in rows:
+                    try:
+                        data = json.loads(row.payload)
+                        # Replies of late or retried events are pushed, skipped or not repeated
+                        delivery = inbox.ReplyDelivery(row, data, config['REPLY_TOKEN_TTL'], config['EXPIRED_REPLY'])
+                        with reply_delivery(delivery):
+                            handler(inbox.event_from_dict(data))
+                        done_ids.append(row.id)
+                    except Exception as e:
+                        inbox.mark_failed(row, f'{type(e).__name__}: {e}', options['max_attempts'])
+                        failed += 1
+                        self.stderr.write(f'事件 {row.event_id or row.id} 處理失敗: {e}')
+                inbox.mark_done(done_ids)
+                handled += len(done_ids)
+        except KeyboardInterrupt:
+            self.stdout.write('收到中斷訊號，停止處理')
+
+        elapsed = time.perf_counter() - started
+        rate = handled / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'完成 {handled} 筆、失敗 {failed} 筆，耗時 {elapsed:.1f} 秒 ({rate:.1f} 筆/秒)'
+        ))
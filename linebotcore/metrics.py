@@ -0,0 +1,114 @@
+"""
+Process-wide registry of runtime counters for the LINE bots.
+
+Components that want to be observable register a provider function under a
+name; ``snapshot()`` calls every provider and returns the combined result,
+which the ``linebot/stats`` endpoint serves as JSON.
+"""
+
+import threading
+from collections import deque
+
+
+# Mapping of component name -> zero-argument callable returning a dict
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def register(name, provider):
+    """
+    Register (or replace) the stats provider for a component.
+
+    Args:
+        name (str): Key under which the stats appear in the snapshot
+        provider (callable): Zero-argument callable returning a JSON-serialisable dict
+    """
+    with _providers_lock:
+        _providers[name] = provider
+
+
+def unregister(name):
+    """
+    Remove the stats provider registered under ``name`` (if any).
+
+    Args:
+        name (str): Component name used when registering
+    """
+    with _providers_lock:
+        _providers.pop(name, None)
+
+
+def snapshot():
+    """
+    Collect the current stats of every registered component.
+
+    Returns:
+        dict: Component name -> stats dict
+    """
+    with _providers_lock:
+        providers = list(_providers.items())
+    return {name: provider() for name, provider in providers}
+
+
+class LatencyStats:
+    """
+    Thread-safe latency recorder keeping totals plus a window of recent samples
+    from which percentiles are computed.
+    """
+
+    def __init__(self, window=1024):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """
+        Record one latency sample.
+
+        Args:
+            seconds (float): Measured duration in seconds
+        """
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def summary(self):
+        """
+        Summarise the recorded samples in milliseconds.
+
+        Returns:
+            dict: count, avg, max and p50/p95/p99 over the recent window
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total, maximum = self.count, self.total, self.max
+        return {
+            'count': count,
+            'avg_ms': round(total / count * 1000, 3) if count else 0.0,
+            'max_ms': round(maximum * 1000, 3),
+            'p50_ms': round(percentile(samples, 50) * 1000, 3),
+            'p95_ms': round(percentile(samples, 95) * 1000, 3),
+            'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        }
+
+
+def percentile(sorted_samples, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+
+    Args:
+        sorted_samples (list): Samples in ascending order
+        pct (float): Percentile between 0 and 100
+
+    Returns:
+        float: The percentile value, or 0.0 for an empty list
+    """
+    if not sorted_samples:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_samples))) - 1, 0)
+    return sorted_samples[min(rank, len(sorted_samples) - 1)]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(blank=True, max_length=64, verbose_name='事件 ID')),
+                ('payload', models.TextField(verbose_name='事件內容')),
+                ('status', models.CharField(choices=[('pending', '待處理'), ('processing', '處理中'), ('done', '已完成'), ('failed', '失敗')], default='pending', max_length=16, verbose_name='狀態')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='嘗試次數')),
+                ('claim_token', models.CharField(blank=True, max_length=32, verbose_name='領取代碼')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='接收時間')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='領取時間')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='完成時間')),
+                ('error', models.TextField(blank=True, verbose_name='錯誤訊息')),
+            ],
+            options={
+                'verbose_name': 'Webhook 收件匣',
+                'verbose_name_plural': 'Webhook 收件匣',
+                'indexes': [models.Index(fields=['status', 'id'], name='linebotcore_inbox_status_id')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linebotcore', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookinbox',
+            name='replied_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='回覆時間'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import models
+
+# Create your models here.
+class WebhookInbox(models.Model):
+    """
+    Durable inbox of signature-verified webhook events waiting for the
+    ``process_inbox`` worker. One row holds the raw JSON of one event.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '待處理'),
+        (STATUS_PROCESSING, '處理中'),
+        (STATUS_DONE, '已完成'),
+        (STATUS_FAILED, '失敗'),
+    ]
+
+    event_id = models.CharField(max_length=64, blank=True, verbose_name='事件 ID')
+    payload = models.TextField(verbose_name='事件內容')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='狀態')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='嘗試次數')
+    claim_token = models.CharField(max_length=32, blank=True, verbose_name='領取代碼')
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name='接收時間')
+    claimed_at = models.DateTimeField(null=True, blank=True, verbose_name='領取時間')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='完成時間')
+    # Set once the event's reply went out, so a retried attempt never sends it again
+    replied_at = models.DateTimeField(null=True, blank=True, verbose_name='回覆時間')
+    error = models.TextField(blank=True, verbose_name='錯誤訊息')
+
+    def __str__(self):
+        return f'{self.event_id or self.pk} ({self.status})'
+
+    class Meta:
+        verbose_name = 'Webhook 收件匣'
+        verbose_name_plural = 'Webhook 收件匣'
+        indexes = [
+            # Workers claim the oldest pending rows: WHERE status = ? ORDER BY id
+            models.Index(fields=['status', 'id'], name='linebotcore_inbox_status_id'),
+        ]
@@ -0,0 +1,233 @@
+"""
+Pre-serialized reply payloads.
+
+``LineBotApi.reply_message`` turns the SDK message objects into dicts and
+JSON-encodes them on every call.  For replies that never change (demo texts,
+templates, imagemaps, ...) this module does that work once: the messages are
+declared in a ``PayloadCache``, serialized to UTF-8 JSON bytes at startup, and
+each reply only splices the reply token into the cached bytes.
+
+Replies that depend on data which rarely changes (the drink menus) go in a
+``VersionedPayloadCache`` instead: entries are built on first use and kept
+until the data's version number changes.
+"""
+
+import json
+import threading
+
+from . import metrics
+
+
+def serialize_messages(messages):
+    """
+    Encode SDK send-message objects to the JSON array LINE expects.
+
+    Args:
+        messages: A SendMessage or a list of SendMessage objects
+
+    Returns:
+        bytes: UTF-8 encoded JSON array of the messages
+    """
+    if not isinstance(messages, (list, tuple)):
+        messages = [messages]
+    return json.dumps(
+        [message.as_json_dict() for message in messages],
+        ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+
+
+def reply_raw(api, reply_token, messages_json, notification_disabled=False, timeout=None):
+    """
+    Call the reply API with already serialized messages.
+
+    Args:
+        api (LineBotApi): Client used for the request (auth headers, endpoint, error handling)
+        reply_token (str): replyToken received via webhook
+        messages_json (bytes): Output of ``serialize_messages``
+        notification_disabled (bool): True to disable the push notification
+        timeout: Optional request timeout, as for LineBotApi.reply_message
+    """
+    body = b''.join((
+        b'{"replyToken":', json.dumps(reply_token).encode('ascii'),
+        b',"messages":', messages_json,
+        b',"notificationDisabled":', b'true' if notification_disabled else b'false',
+        b'}',
+    ))
+    # Same request LineBotApi.reply_message makes, minus the per-call encoding
+    api._post('/v2/bot/message/reply', data=body, timeout=timeout)
+
+
+class PayloadCache:
+    """
+    Named static replies, serialized once and reused for every reply.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._messages = {}   # key -> SendMessage(s) or zero-argument builder
+        self._payloads = {}   # key -> serialized bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        metrics.register(f'payloads:{name}', self.stats)
+
+    def register(self, key, messages):
+        """
+        Declare a static reply.
+
+        Args:
+            key (str): Name used by the handlers
+            messages: SendMessage, list of SendMessage, or a zero-argument callable returning them
+        """
+        with self._lock:
+            self._messages[key] = messages
+            self._payloads.pop(key, None)
+
+    def _build(self, key):
+        messages = self._messages[key]
+        if callable(messages):
+            messages = messages()
+        payload = serialize_messages(messages)
+        with self._lock:
+            self._payloads[key] = payload
+        return payload
+
+    def build_all(self):
+        """Serialize every registered reply (called once at startup)."""
+        for key in list(self._messages):
+            self._build(key)
+
+    def get(self, key):
+        """
+        Serialized messages of a static reply, building them on first use.
+
+        Args:
+            key (str): Name given to ``register``
+
+        Returns:
+            bytes: JSON array of the messages
+        """
+        payload = self._payloads.get(key)
+        if payload is not None:
+            self.hits += 1
+            return payload
+        self.misses += 1
+        return self._build(key)
+
+    def reply(self, api, reply_token, key):
+        """
+        Send a static reply.
+
+        Args:
+            api (LineBotApi): Client used for the request
+            reply_token (str): replyToken received via webhook
+            key (str): Name given to ``register``
+        """
+        reply_raw(api, reply_token, self.get(key))
+
+    def stats(self):
+        """
+        Hit/miss counters and cache size.
+
+        Returns:
+            dict: Payload cache stats
+        """
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._payloads),
+            'bytes': sum(len(payload) for payload in self._payloads.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class VersionedPayloadCache:
+    """
+    Replies rendered from versioned data, serialized on first use and reused until the version changes.
+    """
+
+    def __init__(self, name, max_entries=1024):
+        """
+        Args:
+            name (str): Name of the cache on /linebot/stats (``payloads:<name>``)
+            max_entries (int): Entries kept per version; the oldest are dropped first
+        """
+        self.name = name
+        self.max_entries = max_entries
+        # (version, {key: serialized bytes}), replaced as a whole when the version changes
+        self._generation = (None, {})
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0      # Version changes that dropped the cached replies
+        metrics.register(f'payloads:{name}', self.stats)
+
+    def get(self, version, key, build):
+        """
+        Serialized messages of a reply, built for this version on first use.
+
+        Args:
+            version (int): Version of the data the reply is rendered from
+            key (hashable): Reply within the version, e.g. ('page', 'tea', 12)
+            build (callable): Zero-argument callable returning the SendMessage(s)
+
+        Returns:
+            bytes: JSON array of the messages
+        """
+        current, payloads = self._generation
+        if version == current:
+            payload = payloads.get(key)
+            if payload is not None:
+                self.hits += 1
+                return payload
+        self.misses += 1
+        payload = serialize_messages(build())
+        with self._lock:
+            current, payloads = self._generation
+            if version != current:
+                # Older versions start a generation too: a version can go back (e.g. the catalog's
+                # stamp file was deleted), and a reply that is never stored would miss forever
+                payloads = {}
+                self._generation = (version, payloads)
+                if current is not None:
+                    self.flushes += 1
+            if key not in payloads and len(payloads) >= self.max_entries:
+                del payloads[next(iter(payloads))]
+                self.evictions += 1
+            payloads[key] = payload
+        return payload
+
+    def reply(self, api, reply_token, version, key, build):
+        """
+        Send a reply rendered from versioned data.
+
+        Args:
+            api (LineBotApi): Client used for the request
+            reply_token (str): replyToken received via webhook
+            version (int): Version of the data the reply is rendered from
+            key (hashable): Reply within the version
+            build (callable): Zero-argument callable returning the SendMessage(s)
+        """
+        reply_raw(api, reply_token, self.get(version, key, build))
+
+    def stats(self):
+        """
+        Hit/miss counters, current version and cache size.
+
+        Returns:
+            dict: Payload cache stats
+        """
+        version, payloads = self._generation
+        lookups = self.hits + self.misses
+        return {
+            'version': version,
+            'entries': len(payloads),
+            'bytes': sum(len(payload) for payload in list(payloads.values())),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'flushes': self.flushes,
+        }
@@ -0,0 +1,274 @@
+"""
+Ack-first webhook pipeline.
+
+The callback views verify the LINE signature, parse the events and pass them to
+``dispatch_events`` together with the function that handles a single event.
+Redelivered events are filtered out first (see linebotcore.dedup); then,
+depending on ``settings.LINEBOT_PIPELINE['MODE']``, the events are either
+handled inline (the original behaviour), queued to a pool of worker threads,
+or appended to the durable ``WebhookInbox`` table for ``manage.py process_inbox``
+(see linebotcore.inbox), so the callback can return 200 to LINE immediately.
+
+The thread pool works the same under ``runserver``/WSGI and under ``asgi.py``:
+the handlers are synchronous and mostly wait on SQLite and HTTP calls, so the
+workers never block the event loop.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import metrics
+from .dedup import event_id, is_duplicate, release
+
+logger = logging.getLogger(__name__)
+
+# Default pipeline configuration, overridden by settings.LINEBOT_PIPELINE
+DEFAULTS = {
+    'MODE': 'inline',    # 'inline', 'thread' or 'inbox'
+    'WORKERS': 4,        # Number of worker threads in 'thread' mode
+    'QUEUE_SIZE': 1000,  # Maximum number of queued events before falling back to inline
+    'HANDLER': None,     # Dotted path of the project's handle_event, used by process_inbox
+    'REPLY_TOKEN_TTL': 60,      # Seconds after the event a replyToken is still accepted (process_inbox)
+    'EXPIRED_REPLY': 'push',    # Reply of an event replayed after that: 'push' to its source or 'skip'
+}
+
+# Sentinel put on the queue to stop a worker thread
+_STOP = object()
+
+
+def get_config():
+    """
+    Merge the project's LINEBOT_PIPELINE setting over the defaults.
+
+    Returns:
+        dict: Effective pipeline configuration
+    """
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'LINEBOT_PIPELINE', {}))
+    return config
+
+
+class EventPipeline:
+    """
+    Bounded queue of webhook events drained by a fixed pool of worker threads.
+    """
+
+    def __init__(self, workers=4, queue_size=1000, name='linebot-pipeline'):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.failed = 0
+        self.wait_latency = metrics.LatencyStats()
+        self.run_latency = metrics.LatencyStats()
+
+    def start(self):
+        """Start the worker threads (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        """
+        Ask every worker to finish its queued work and exit.
+
+        Args:
+            timeout (float): Seconds to wait for each worker thread
+        """
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, handler, event):
+        """
+        Queue one event for a worker thread.
+
+        Args:
+            handler (callable): Function handling a single event
+            event: LINE SDK event object
+
+        Returns:
+            bool: False if the queue is full and the event was not queued
+        """
+        try:
+            self._queue.put_nowait((handler, event, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def join(self):
+        """Block until every queued event has been handled."""
+        self._queue.join()
+
+    def _run(self):
+        # Worker loop: handle queued events until the stop sentinel arrives
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                handler, event, enqueued_at = item
+                started = time.perf_counter()
+                self.wait_latency.record(started - enqueued_at)
+                # Worker threads hold their own DB connection; drop stale ones
+                close_old_connections()
+                try:
+                    handler(event)
+                except Exception:
+                    with self._lock:
+                        self.failed += 1
+                    logger.exception("Error handling queued webhook event")
+                finally:
+                    close_old_connections()
+                    self.run_latency.record(time.perf_counter() - started)
+            finally:
+                self._queue.task_done()
+
+    def stats(self):
+        """
+        Current queue and latency counters.
+
+        Returns:
+            dict: Pipeline stats
+        """
+        return {
+            'workers': len(self._threads),
+            'queue_size': self.queue_size,
+            'queue_depth': self._queue.qsize(),
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'queue_wait': self.wait_latency.summary(),
+            'handler': self.run_latency.summary(),
+        }
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+# Handler latency of events run inline (including queue-full fallbacks)
+inline_latency = metrics.LatencyStats()
+
+
+def get_pipeline():
+    """
+    Return the process-wide pipeline, creating and starting it on first use.
+
+    Returns:
+        EventPipeline: The shared pipeline
+    """
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                config = get_config()
+                pipeline = EventPipeline(workers=config['WORKERS'], queue_size=config['QUEUE_SIZE'])
+                pipeline.start()
+                _pipeline = pipeline
+    return _pipeline
+
+
+def run_inline(handler, event):
+    """
+    Handle one event on the calling thread and record its latency.
+
+    Args:
+        handler (callable): Function handling a single event
+        event: LINE SDK event object
+    """
+    started = time.perf_counter()
+    try:
+        handler(event)
+    finally:
+        inline_latency.record(time.perf_counter() - started)
+
+
+def _releasing(handler):
+    # Release the dedup key of an event whose handler raised, so LINE's redelivery is handled
+    def handle(event):
+        try:
+            handler(event)
+        except Exception:
+            release(event)
+            raise
+    return handle
+
+
+def dispatch_events(events, handler, body=None):
+    """
+    Hand parsed webhook events to their handler according to the configured mode.
+
+    Args:
+        events (list): LINE SDK event objects from WebhookParser.parse
+        handler (callable): Function handling a single event
+        body (str): Raw verified request body, stored as-is in 'inbox' mode
+    """
+    # Drop events LINE redelivered after we already accepted them
+    events = [event for event in events if not is_duplicate(event)]
+
+    mode = get_config()['MODE']
+    if mode == 'inbox' and body is not None:
+        # Imported here because the inbox needs the app registry to be ready
+        from .inbox import append_events
+        try:
+            append_events(body, {event_id(event) for event in events})
+        except Exception:
+            # Nothing was stored, so none of them has been accepted
+            for event in events:
+                release(event)
+            raise
+        return
+
+    handler = _releasing(handler)
+    if mode == 'thread':
+        pipeline = get_pipeline()
+        for event in events:
+            if not pipeline.submit(handler, event):
+                # Queue is full: keep the event rather than dropping it
+                logger.warning("Webhook pipeline queue full, handling event inline")
+                run_inline(handler, event)
+    else:
+        for position, event in enumerate(events):
+            try:
+                run_inline(handler, event)
+            except Exception:
+                # The rest of the body is not handled either; let its redelivery through
+                for pending in events[position + 1:]:
+                    release(pending)
+                raise
+
+
+def stats():
+    """
+    Stats provider registered with linebotcore.metrics.
+
+    Returns:
+        dict: Mode, inline handler latency and (in thread mode) pipeline counters
+    """
+    result = {'mode': get_config()['MODE'], 'inline': inline_latency.summary()}
+    if _pipeline is not None:
+        result.update(_pipeline.stats())
+    return result
+
+
+metrics.register('pipeline', stats)
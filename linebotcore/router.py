@@ -0,0 +1,231 @@
+"""
+Registry-based command router shared by the LINE bot projects.
+
+Replaces the long ``if mtext == ... elif ...`` chains in the callbacks:
+
+* exact commands (``@菜單``) are a single dict lookup;
+* prefix / suffix / regex rules (``…介紹``, ``@…``, 3-digit invoice numbers)
+  are compiled into one alternation regex ordered by explicit priority, so a
+  text is matched against all of them with one ``fullmatch`` call;
+* postbacks are routed on the ``action`` field of their data;
+* other events (follow, image messages, ...) are routed on their class.
+
+Exact commands always win over rules, which fixes the old ordering bugs where
+the ``@`` drink fallback swallowed ``@飲料選單`` and the invoice commands.
+
+Handlers are called as ``handler(event, *args, *extra)`` where ``args`` is
+empty for exact commands and events, ``(captured_text,)`` for rules and the
+default handler, ``(backdata,)`` for postbacks, and ``extra`` is whatever the
+caller passed to ``dispatch``.
+
+The rule regex is compiled on first use after a registration.  The matcher
+and its handler table are published together as one tuple under a lock, so
+worker threads resolving texts never see one without the other.
+"""
+
+import re
+import threading
+from urllib.parse import parse_qsl
+
+from linebot.models import MessageEvent, PostbackEvent, TextMessage
+
+
+class CommandRouter:
+    """
+    Dispatch table for text commands, postback actions and event types.
+    """
+
+    def __init__(self):
+        self._exact = {}
+        self._rules = []        # (priority, order, (head, captured, tail) regex parts, handler)
+        self._compiled = None   # (alternation of all rules or None, {group: (handler, arg group)})
+        self._lock = threading.Lock()
+        self._default = None
+        self._postbacks = {}
+        self._postback_default = None
+        self._events = {}       # (event class, message class or None) -> handler
+
+    # --- registration ---------------------------------------------------
+
+    def add_exact(self, texts, handler):
+        """
+        Route one or more exact message texts to ``handler(event, *extra)``.
+
+        Args:
+            texts (str or list[str]): Command text(s)
+            handler (callable): Handler function
+
+        Returns:
+            callable: The handler, so the method can be used as a decorator helper
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        for text in texts:
+            self._exact[text] = handler
+        return handler
+
+    def add_prefix(self, prefix, handler, priority=0):
+        """
+        Route texts starting with ``prefix`` to ``handler(event, rest, *extra)``.
+
+        Args:
+            prefix (str): Literal prefix
+            handler (callable): Handler function receiving the text after the prefix
+            priority (int): Higher priorities are tried first
+        """
+        return self._add_rule(re.escape(prefix), '.*', '', handler, priority)
+
+    def add_suffix(self, suffix, handler, priority=0):
+        """
+        Route texts ending with ``suffix`` to ``handler(event, rest, *extra)``.
+
+        Args:
+            suffix (str): Literal suffix
+            handler (callable): Handler function receiving the text before the suffix
+            priority (int): Higher priorities are tried first
+        """
+        return self._add_rule('', '.*', re.escape(suffix), handler, priority)
+
+    def add_pattern(self, pattern, handler, priority=0):
+        """
+        Route texts fully matching a regex to ``handler(event, text, *extra)``.
+
+        Args:
+            pattern (str): Regular expression without named groups
+            handler (callable): Handler function receiving the whole text
+            priority (int): Higher priorities are tried first
+        """
+        return self._add_rule('', pattern, '', handler, priority)
+
+    def _add_rule(self, head, captured, tail, handler, priority):
+        # A rule is the regex head + (captured argument) + tail
+        with self._lock:
+            self._rules.append((priority, len(self._rules), (head, captured, tail), handler))
+            self._compiled = None
+        return handler
+
+    def set_default(self, handler):
+        """
+        Handler ``handler(event, text, *extra)`` for texts nothing else matched.
+        """
+        self._default = handler
+        return handler
+
+    def add_postback(self, action, handler):
+        """
+        Route postbacks whose data has ``action=<action>`` to ``handler(event, backdata, *extra)``.
+
+        Args:
+            action (str): Value of the ``action`` field
+            handler (callable): Handler function receiving the parsed postback data dict
+        """
+        self._postbacks[action] = handler
+        return handler
+
+    def set_postback_default(self, handler):
+        """
+        Handler ``handler(event, backdata, *extra)`` for postbacks without a registered action.
+        """
+        self._postback_default = handler
+        return handler
+
+    def add_event(self, event_class, handler, message_class=None):
+        """
+        Route other events (follow, unfollow, image messages, ...) to ``handler(event, *extra)``.
+
+        Args:
+            event_class (type): SDK event class, e.g. FollowEvent or MessageEvent
+            handler (callable): Handler function
+            message_class (type): For MessageEvent, the SDK message class, e.g. ImageMessage
+        """
+        self._events[(event_class, message_class)] = handler
+        return handler
+
+    # --- matching -------------------------------------------------------
+
+    def _compile(self):
+        # Sort by priority (high first), then registration order, and build
+        # one alternation; re tries alternatives left to right
+        with self._lock:
+            if self._compiled is None:
+                ordered = sorted(self._rules, key=lambda rule: (-rule[0], rule[1]))
+                parts = []
+                handlers = {}
+                for index, (_, _, (head, captured, tail), handler) in enumerate(ordered):
+                    parts.append(f'(?P<r{index}>{head}(?P<a{index}>{captured}){tail})')
+                    handlers[f'r{index}'] = (handler, f'a{index}')
+                matcher = re.compile('|'.join(parts), re.DOTALL) if parts else None
+                self._compiled = (matcher, handlers)
+            return self._compiled
+
+    def resolve_text(self, text):
+        """
+        Find the handler for a message text without calling it.
+
+        Args:
+            text (str): Message text
+
+        Returns:
+            tuple: (handler, args) or (None, ()) if nothing matches and no default is set
+        """
+        handler = self._exact.get(text)
+        if handler is not None:
+            return handler, ()
+        compiled = self._compiled
+        if compiled is None:
+            compiled = self._compile()
+        matcher, rule_handlers = compiled
+        if matcher is not None:
+            match = matcher.fullmatch(text)
+            if match:
+                handler, arg_group = rule_handlers[match.lastgroup]
+                return handler, (match.group(arg_group),)
+        if self._default is not None:
+            return self._default, (text,)
+        return None, ()
+
+    def resolve_postback(self, data):
+        """
+        Find the handler for postback data without calling it.
+
+        Args:
+            data (str): Raw postback data, e.g. ``action=buy&item=1``
+
+        Returns:
+            tuple: (handler, (backdata,)) or (None, ()) if no handler applies
+        """
+        backdata = dict(parse_qsl(data))
+        handler = self._postbacks.get(backdata.get('action'), self._postback_default)
+        if handler is None:
+            return None, ()
+        return handler, (backdata,)
+
+    def dispatch(self, event, *extra):
+        """
+        Call the handler registered for an event.
+
+        Args:
+            event: LINE SDK event object
+            *extra: Additional arguments appended to the handler call
+
+        Returns:
+            bool: True if a handler was found and called
+        """
+        handler, args = None, ()
+        if isinstance(event, MessageEvent):
+            if isinstance(event.message, TextMessage):
+                handler, args = self.resolve_text(event.message.text)
+            else:
+                handler = self._events.get((MessageEvent, type(event.message)))
+        elif isinstance(event, PostbackEvent):
+            handler, args = self.resolve_postback(event.postback.data)
+        else:
+            handler = self._events.get((type(event), None))
+
+        if handler is None:
+            return False
+        handler(event, *args, *extra)
+        return True
+
+    def __len__(self):
+        return len(self._exact) + len(self._rules) + len(self._postbacks)
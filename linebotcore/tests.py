@@ -0,0 +1,606 @@
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from linebot.exceptions import LineBotApiError
+from linebot.models import TextSendMessage
+
+from . import dedup, inbox, metrics, pipeline
+from .client import REPLY_PATH, DeliveryLineBotApi, PooledHttpClient, reply_delivery
+from .fakeline import FakeLineServer
+from .models import WebhookInbox
+from .payloads import PayloadCache, VersionedPayloadCache, reply_raw, serialize_messages
+from .pipeline import EventPipeline, dispatch_events
+from .router import CommandRouter
+
+
+class RecordingHttpClient:
+    # Stands in for the transport: records the requests, answers 200
+    timeout = 5
+
+    class Response:
+        status_code = 200
+        headers = {}
+        text = '{}'
+        json = {}
+
+    def __init__(self):
+        self.requests = []
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        self.requests.append((url, json.loads(data)))
+        return self.Response()
+
+
+def raw_event(event_id='01HEVENT', timestamp=None, source=None):
+    # A text message event as LINE sends it
+    return {
+        'type': 'message',
+        'webhookEventId': event_id,
+        'timestamp': int((time.time() if timestamp is None else timestamp) * 1000),
+        'replyToken': 'reply-token',
+        'source': source or {'type': 'user', 'userId': 'U1'},
+        'mode': 'active',
+        'deliveryContext': {'isRedelivery': False},
+        'message': {'type': 'text', 'id': '1', 'text': '123'},
+    }
+
+
+def menu(event):
+    pass
+
+
+def drink(event, name):
+    pass
+
+
+def invoice(event, number):
+    pass
+
+
+def fallback(event, text):
+    pass
+
+
+class CommandRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = CommandRouter()
+        self.router.add_exact(['@菜單', '@menu'], menu)
+        self.router.add_prefix('@', drink, priority=10)
+        self.router.add_suffix('介紹', drink, priority=20)
+        self.router.add_pattern(r'\d{3}', invoice, priority=30)
+
+    def test_exact_commands_win_over_rules(self):
+        self.assertEqual(self.router.resolve_text('@菜單'), (menu, ()))
+        self.assertEqual(self.router.resolve_text('@menu'), (menu, ()))
+
+    def test_rules_capture_their_argument_by_priority(self):
+        self.assertEqual(self.router.resolve_text('@紅茶'), (drink, ('紅茶',)))
+        self.assertEqual(self.router.resolve_text('@紅茶介紹'), (drink, ('@紅茶',)))
+        self.assertEqual(self.router.resolve_text('123'), (invoice, ('123',)))
+
+    def test_unmatched_text_goes_to_the_default(self):
+        self.assertEqual(self.router.resolve_text('1234'), (None, ()))
+        self.router.set_default(fallback)
+        self.assertEqual(self.router.resolve_text('1234'), (fallback, ('1234',)))
+
+    def test_rules_registered_after_use_are_matched(self):
+        self.assertEqual(self.router.resolve_text('1234'), (None, ()))
+        self.router.add_pattern(r'\d{4}', invoice, priority=40)
+        self.assertEqual(self.router.resolve_text('1234'), (invoice, ('1234',)))
+
+    def test_resolve_postback(self):
+        self.router.add_postback('buy', menu)
+        self.assertEqual(self.router.resolve_postback('action=buy&item=1'), (menu, ({'action': 'buy', 'item': '1'},)))
+        self.assertEqual(self.router.resolve_postback('action=sell'), (None, ()))
+
+    def test_concurrent_resolves_during_registration(self):
+        errors = []
+
+        def resolve():
+            try:
+                for _ in range(2000):
+                    self.router.resolve_text('@紅茶介紹')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=resolve) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for i in range(200):
+            self.router.add_exact(f'@指令{i}', menu)
+            self.router.add_pattern(f'x{i}', invoice)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class DedupStoreTests(SimpleTestCase):
+
+    def test_seen_records_the_key(self):
+        store = dedup.DedupStore()
+        self.assertFalse(store.seen('a'))
+        self.assertTrue(store.seen('a'))
+        self.assertEqual((store.stats()['hits'], store.stats()['misses']), (1, 1))
+
+    def test_keys_expire_and_are_evicted(self):
+        store = dedup.DedupStore(max_entries=2, ttl=0)
+        store.seen('a')
+        self.assertFalse(store.seen('a'))
+        store = dedup.DedupStore(max_entries=2)
+        for key in 'abc':
+            store.seen(key)
+        self.assertFalse(store.seen('a'))
+        self.assertEqual(store.stats()['evictions'], 2)
+
+    def test_shared_cache_is_seen_by_other_stores(self):
+        cache = LocMemCache('dedup-tests', {})
+        dedup.DedupStore(cache=cache).seen('a')
+        self.assertTrue(dedup.DedupStore(cache=cache).seen('a'))
+
+    def test_forget_releases_the_key_everywhere(self):
+        cache = LocMemCache('dedup-tests-forget', {})
+        store = dedup.DedupStore(cache=cache)
+        store.seen('a')
+        store.forget('a')
+        self.assertIsNone(cache.get('linebot:event:a'))
+        self.assertFalse(store.seen('a'))
+
+
+@override_settings(LINEBOT_PIPELINE={'MODE': 'inline'}, LINEBOT_DEDUP={'BACKEND': 'memory'})
+class DispatchDedupTests(SimpleTestCase):
+
+    def setUp(self):
+        dedup._store = None
+        self.handled = []
+
+    def tearDown(self):
+        dedup._store = None
+
+    def handler(self, event):
+        self.handled.append(event.webhook_event_id)
+
+    def failing_handler(self, event):
+        raise RuntimeError('boom')
+
+    def test_redelivered_event_is_dropped(self):
+        event = inbox.event_from_dict(raw_event('a'))
+        dispatch_events([event], self.handler)
+        dispatch_events([event], self.handler)
+        self.assertEqual(self.handled, ['a'])
+
+    def test_redelivery_of_a_failed_event_is_handled(self):
+        event = inbox.event_from_dict(raw_event('a'))
+        with self.assertRaises(RuntimeError):
+            dispatch_events([event], self.failing_handler)
+        dispatch_events([event], self.handler)
+        self.assertEqual(self.handled, ['a'])
+
+    def test_events_after_a_failure_are_released_too(self):
+        events = [inbox.event_from_dict(raw_event(key)) for key in 'ab']
+
+        def fail_on_a(event):
+            if event.webhook_event_id == 'a':
+                raise RuntimeError('boom')
+            self.handler(event)
+
+        with self.assertRaises(RuntimeError):
+            dispatch_events(events, fail_on_a)
+        dispatch_events(events, self.handler)
+        self.assertEqual(self.handled, ['a', 'b'])
+
+
+@override_settings(LINEBOT_PIPELINE={'MODE': 'thread'}, LINEBOT_DEDUP={'BACKEND': 'memory'})
+class ThreadPipelineTests(SimpleTestCase):
+
+    def setUp(self):
+        dedup._store = None
+        self.handled = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        if pipeline._pipeline is not None:
+            pipeline._pipeline.stop()
+        pipeline._pipeline = None
+        dedup._store = None
+
+    def use(self, workers=1, queue_size=10, start=True):
+        # Install a fresh process-wide pipeline for dispatch_events
+        pipeline._pipeline = EventPipeline(workers=workers, queue_size=queue_size)
+        if start:
+            pipeline._pipeline.start()
+        return pipeline._pipeline
+
+    def events(self, keys):
+        return [inbox.event_from_dict(raw_event(key)) for key in keys]
+
+    def handler(self, event):
+        with self.lock:
+            self.handled.append((event.webhook_event_id, threading.current_thread().name))
+
+    def keys(self):
+        return [key for key, _ in self.handled]
+
+    def test_full_queue_falls_back_to_inline(self):
+        workers = self.use(queue_size=1, start=False)
+        with self.assertLogs('linebotcore.pipeline', 'WARNING'):
+            dispatch_events(self.events('ab'), self.handler)
+        # Nothing drains the queue yet, so 'b' was handled on the calling thread
+        self.assertEqual(self.handled, [('b', threading.current_thread().name)])
+        workers.start()
+        workers.join()
+        self.assertEqual(self.handled[1], ('a', 'linebot-pipeline-0'))
+        self.assertEqual((workers.stats()['submitted'], workers.stats()['rejected']), (1, 1))
+
+    def test_failed_event_is_queued_again_on_redelivery(self):
+        workers = self.use()
+        failing = {'a'}
+
+        def fail_once(event):
+            if event.webhook_event_id in failing:
+                failing.discard(event.webhook_event_id)
+                raise RuntimeError('boom')
+            self.handler(event)
+
+        events = self.events('ab')
+        with self.assertLogs('linebotcore.pipeline', 'ERROR'):
+            dispatch_events(events, fail_once)
+            workers.join()
+        # The worker survived and released the dedup key of the failed event only
+        self.assertEqual(self.keys(), ['b'])
+        dispatch_events(events, fail_once)
+        workers.join()
+        self.assertEqual(self.keys(), ['b', 'a'])
+        self.assertEqual((workers.stats()['submitted'], workers.stats()['failed']), (3, 1))
+
+    def test_stop_drains_the_queue(self):
+        workers = self.use()
+        for event in self.events('abc'):
+            workers.submit(self.handler, event)
+        workers.stop()
+        self.assertEqual(self.keys(), ['a', 'b', 'c'])
+        self.assertEqual(workers.stats()['workers'], 0)
+
+    def test_stats(self):
+        workers = self.use(workers=2)
+        dispatch_events(self.events('abc'), self.handler)
+        workers.join()
+        stats = pipeline.stats()
+        self.assertEqual(stats['mode'], 'thread')
+        self.assertEqual((stats['workers'], stats['queue_depth']), (2, 0))
+        self.assertEqual((stats['submitted'], stats['rejected'], stats['failed']), (3, 0, 0))
+        self.assertEqual((stats['queue_wait']['count'], stats['handler']['count']), (3, 3))
+
+
+def fake_line_api(test, **options):
+    # Serve a FakeLineServer for the duration of the test
+    server = FakeLineServer(**options).start()
+    test.addCleanup(server.stop)
+    return server
+
+
+class PayloadTests(SimpleTestCase):
+
+    def setUp(self):
+        self.server = fake_line_api(self)
+        self.api = DeliveryLineBotApi('token', endpoint=self.server.url)
+        self.api.http_client = PooledHttpClient()
+        self.addCleanup(self.api.http_client.close)
+        self.addCleanup(metrics.unregister, 'payloads:tests')
+
+    def test_serialize_messages(self):
+        self.assertEqual(serialize_messages(TextSendMessage(text='菜單')),
+                         '[{"type":"text","text":"菜單"}]'.encode('utf-8'))
+        self.assertEqual(serialize_messages([TextSendMessage(text='a'), TextSendMessage(text='b')]),
+                         b'[{"type":"text","text":"a"},{"type":"text","text":"b"}]')
+
+    def test_reply_raw_splices_the_reply_token(self):
+        payload = serialize_messages(TextSendMessage(text='菜單'))
+        with mock.patch.object(self.api.http_client, 'post', wraps=self.api.http_client.post) as post:
+            reply_raw(self.api, 'token-1', payload)
+            reply_raw(self.api, 'token"2', payload, notification_disabled=True)
+        sent = [call.kwargs['data'] for call in post.call_args_list]
+        self.assertEqual(sent, [
+            '{"replyToken":"token-1","messages":[{"type":"text","text":"菜單"}],"notificationDisabled":false}'.encode('utf-8'),
+            '{"replyToken":"token\\"2","messages":[{"type":"text","text":"菜單"}],"notificationDisabled":true}'.encode('utf-8'),
+        ])
+        self.assertEqual(payload, '[{"type":"text","text":"菜單"}]'.encode('utf-8'))
+        calls = self.server.calls()
+        self.assertEqual([(call['endpoint'], call['status']) for call in calls], [('reply', 200)] * 2)
+        self.assertEqual(calls[1]['body']['replyToken'], 'token"2')
+
+    def test_payload_cache_builds_each_reply_once(self):
+        built = []
+
+        def build():
+            built.append(1)
+            return TextSendMessage(text='hi')
+
+        cache = PayloadCache('tests')
+        cache.register('hi', build)
+        cache.register('bye', [TextSendMessage(text='bye')])
+        cache.build_all()
+        for _ in range(3):
+            cache.reply(self.api, 'reply-token', 'hi')
+        self.assertEqual(len(built), 1)
+        self.assertEqual(cache.get('bye'), b'[{"type":"text","text":"bye"}]')
+        self.assertEqual(cache.stats(), {'entries': 2, 'bytes': 59, 'hits': 4, 'misses': 0, 'hit_ratio': 1.0})
+        self.assertEqual([call['body']['messages'] for call in self.server.calls()],
+                         [[{'type': 'text', 'text': 'hi'}]] * 3)
+
+    def test_registering_again_replaces_the_payload(self):
+        cache = PayloadCache('tests')
+        cache.register('hi', TextSendMessage(text='hi'))
+        self.assertEqual(cache.get('hi'), b'[{"type":"text","text":"hi"}]')
+        cache.register('hi', TextSendMessage(text='hello'))
+        self.assertEqual(cache.get('hi'), b'[{"type":"text","text":"hello"}]')
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (0, 2))
+
+
+class FakeLineServerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.server = fake_line_api(self)
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+
+    def post(self, path, body, auth=True, **kwargs):
+        headers = {'Authorization': 'Bearer token'} if auth else {}
+        data = body if isinstance(body, bytes) else json.dumps(body)
+        return self.session.post(self.server.url + path, data=data, headers=headers, **kwargs)
+
+    def reply(self, messages=1):
+        return {'replyToken': 'reply-token', 'messages': [{'type': 'text', 'text': 'hi'}] * messages}
+
+    def test_valid_calls_are_counted(self):
+        self.assertEqual(self.post('/v2/bot/message/reply', self.reply(2)).status_code, 200)
+        multicast = {'to': ['U1', 'U2', 'U3'], 'messages': [{'type': 'text', 'text': 'hi'}]}
+        self.assertEqual(self.post('/v2/bot/message/multicast', multicast).status_code, 200)
+        stats = self.server.stats()
+        self.assertEqual((stats['calls'], stats['messages_sent'], stats['recipients']), (2, 5, 4))
+        self.assertEqual(stats['endpoints']['reply'], {'calls': 1, 'status': {'200': 1}})
+        self.assertEqual(stats['connections'], 1)
+
+    def test_invalid_requests(self):
+        for path, body, auth, status in (
+            ('/v2/bot/message/reply', self.reply(), False, 401),
+            ('/v2/bot/message/reply', b'{"replyToken":', True, 400),
+            ('/v2/bot/message/reply', [self.reply()], True, 400),
+            ('/v2/bot/message/reply', 'reply', True, 400),
+            ('/v2/bot/message/reply', self.reply(6), True, 400),
+            ('/v2/bot/message/reply', {'messages': self.reply()['messages']}, True, 400),
+            ('/v2/bot/message/push', self.reply(), True, 400),
+            ('/v2/bot/message/multicast', {'to': ['U1'] * 501, 'messages': self.reply()['messages']}, True, 400),
+            ('/v2/bot/message/narrowcast', self.reply(), True, 404),
+        ):
+            self.assertEqual(self.post(path, body, auth=auth).status_code, status, (path, body))
+        # Every answer kept the connection usable
+        self.assertEqual(self.post('/v2/bot/message/reply', self.reply()).status_code, 200)
+        self.assertEqual(self.server.stats()['messages_sent'], 1)
+
+    def test_injected_errors(self):
+        self.server.error_rate = 1.0
+        self.assertEqual(self.post('/v2/bot/message/reply', self.reply()).status_code, 500)
+        self.server.error_rate, self.server.throttle_rate = 0.0, 1.0
+        self.assertEqual(self.post('/v2/bot/message/reply', self.reply()).status_code, 429)
+        self.assertEqual(self.server.stats()['messages_sent'], 0)
+
+    def test_message_content(self):
+        response = self.session.get(self.server.url + '/v2/bot/message/m1/content',
+                                    headers={'Authorization': 'Bearer token'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.server.content)
+        self.assertEqual(self.server.calls()[-1]['body'], {'messageId': 'm1'})
+
+    def test_control_endpoints(self):
+        for _ in range(3):
+            self.post('/v2/bot/message/reply', self.reply())
+        calls = self.session.get(self.server.url + '/fake/calls?limit=2').json()
+        self.assertEqual([call['endpoint'] for call in calls], ['reply', 'reply'])
+        for limit in ('abc', '-1'):
+            self.assertEqual(self.session.get(self.server.url + '/fake/calls?limit=' + limit).status_code, 400)
+        self.assertEqual(self.session.get(self.server.url + '/fake/stats').json()['calls'], 3)
+        self.assertEqual(self.session.post(self.server.url + '/fake/reset').status_code, 200)
+        self.assertEqual(self.server.stats()['calls'], 0)
+
+
+class VersionedPayloadCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = VersionedPayloadCache('tests', max_entries=2)
+        self.addCleanup(metrics.unregister, 'payloads:tests')
+        self.built = []
+
+    def get(self, version, key):
+        def build():
+            self.built.append((version, key))
+            return TextSendMessage(text=f'{key} v{version}')
+        return self.cache.get(version, key, build)
+
+    def test_hits_within_a_version(self):
+        self.assertEqual(self.get(1, 'a'), b'[{"type":"text","text":"a v1"}]')
+        self.assertIs(self.get(1, 'a'), self.get(1, 'a'))
+        self.assertEqual(self.built, [(1, 'a')])
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio'], stats['entries']), (2, 1, 0.6667, 1))
+
+    def test_new_version_flushes(self):
+        self.get(1, 'a')
+        self.get(1, 'b')
+        self.assertEqual(self.get(2, 'a'), b'[{"type":"text","text":"a v2"}]')
+        self.get(2, 'a')
+        stats = self.cache.stats()
+        self.assertEqual((stats['version'], stats['entries'], stats['flushes'], stats['misses']), (2, 1, 1, 3))
+
+    def test_oldest_entries_are_evicted(self):
+        for key in 'abc':
+            self.get(1, key)
+        self.get(1, 'c')
+        self.get(1, 'a')
+        self.assertEqual(self.built, [(1, 'a'), (1, 'b'), (1, 'c'), (1, 'a')])
+        self.assertEqual((self.cache.stats()['entries'], self.cache.stats()['evictions']), (2, 2))
+
+    def test_older_version_is_cached_too(self):
+        # e.g. the catalog version starting again from 0 once its stamp file is deleted
+        self.get(5, 'a')
+        self.assertEqual(self.get(0, 'a'), b'[{"type":"text","text":"a v0"}]')
+        self.get(0, 'a')
+        self.assertEqual(self.built, [(5, 'a'), (0, 'a')])
+        self.assertEqual((self.cache.stats()['version'], self.cache.stats()['hits']), (0, 1))
+
+
+class PooledHttpClientTests(SimpleTestCase):
+
+    def api(self, server, **kwargs):
+        api = DeliveryLineBotApi('token', endpoint=server.url)
+        api.http_client = PooledHttpClient(**kwargs)
+        self.addCleanup(api.http_client.close)
+        return api
+
+    def test_connections_stay_within_the_pool(self):
+        server = fake_line_api(self)
+        api = self.api(server, pool_maxsize=4)
+
+        def reply():
+            for _ in range(25):
+                api.reply_message('reply-token', TextSendMessage(text='hi'))
+
+        threads = [threading.Thread(target=reply) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = api.http_client.stats()
+        self.assertEqual(stats['requests'], 100)
+        self.assertLessEqual(stats['new_connections'], 4)
+        self.assertEqual(stats['new_connections'], server.stats()['connections'])
+        self.assertEqual((stats['errors'], stats['latency']['count']), (0, 100))
+
+    def test_transport_errors_are_counted(self):
+        server = fake_line_api(self)
+        api = self.api(server, timeout=(1, 0.05))
+        server.latency = 0.5
+        with self.assertRaises(requests.RequestException):
+            api.reply_message('reply-token', TextSendMessage(text='hi'))
+        server.latency, server.error_rate = 0.0, 1.0
+        # An error answered by the API is not a transport error
+        with self.assertRaises(LineBotApiError):
+            api.reply_message('reply-token', TextSendMessage(text='hi'))
+        stats = api.http_client.stats()
+        self.assertEqual((stats['errors'], stats['latency']['count']), (1, 2))
+
+
+class InboxTests(TestCase):
+
+    def append(self, *events):
+        return inbox.append_events(json.dumps({'destination': 'U0', 'events': list(events)}))
+
+    def test_append_keeps_only_undeduplicated_events(self):
+        body = json.dumps({'events': [raw_event('a'), raw_event('b'), raw_event('')]})
+        self.assertEqual(inbox.append_events(body, {'a'}), 2)
+        self.assertEqual(sorted(WebhookInbox.objects.values_list('event_id', flat=True)), ['', 'a'])
+
+    def test_claim_batch_claims_each_row_once(self):
+        self.append(*(raw_event(str(i)) for i in range(5)))
+        first = inbox.claim_batch(limit=3)
+        second = inbox.claim_batch(limit=3)
+        self.assertEqual([row.event_id for row in first], ['0', '1', '2'])
+        self.assertEqual([row.event_id for row in second], ['3', '4'])
+        self.assertEqual(inbox.claim_batch(), [])
+
+    def test_stale_claims_are_claimed_again(self):
+        self.append(raw_event('a'))
+        inbox.claim_batch()
+        WebhookInbox.objects.update(claimed_at=timezone.now() - timedelta(seconds=600))
+        self.assertEqual([row.event_id for row in inbox.claim_batch(stale_after=300)], ['a'])
+
+    def test_mark_failed_retries_until_max_attempts(self):
+        self.append(raw_event('a'))
+        for attempt in range(1, 4):
+            row = inbox.claim_batch()[0]
+            inbox.mark_failed(row, 'boom', max_attempts=3)
+            row.refresh_from_db()
+            self.assertEqual(row.attempts, attempt)
+        self.assertEqual(row.status, WebhookInbox.STATUS_FAILED)
+        self.assertEqual(inbox.claim_batch(), [])
+
+    def test_mark_done(self):
+        self.append(raw_event('a'))
+        row = inbox.claim_batch()[0]
+        inbox.mark_done([row.id])
+        row.refresh_from_db()
+        self.assertEqual(row.status, WebhookInbox.STATUS_DONE)
+        self.assertEqual(inbox.stats()[WebhookInbox.STATUS_DONE], 1)
+
+
+class ReplyDeliveryTests(TestCase):
+
+    def setUp(self):
+        self.posts = []
+
+    def post(self, path, data, headers=None):
+        self.posts.append((path, json.loads(data), headers))
+        return 'response'
+
+    def delivery(self, data, **kwargs):
+        inbox.append_events(json.dumps({'events': [data]}))
+        row = inbox.claim_batch()[0]
+        return row, inbox.ReplyDelivery(row, data, **kwargs)
+
+    def reply_body(self):
+        return json.dumps({'replyToken': 'reply-token', 'messages': [{'type': 'text', 'text': 'hi'}]})
+
+    def test_fresh_event_is_replied_and_recorded(self):
+        row, delivery = self.delivery(raw_event())
+        self.assertEqual(delivery.send(self.post, self.reply_body()), 'response')
+        self.assertEqual(self.posts[0][0], REPLY_PATH)
+        row.refresh_from_db()
+        self.assertIsNotNone(row.replied_at)
+
+    def test_expired_token_is_pushed_to_the_source(self):
+        data = raw_event(timestamp=time.time() - 120, source={'type': 'group', 'groupId': 'G1', 'userId': 'U1'})
+        _, delivery = self.delivery(data, token_ttl=60)
+        delivery.send(self.post, self.reply_body())
+        path, body, headers = self.posts[0]
+        self.assertEqual(path, inbox.PUSH_PATH)
+        self.assertEqual(body['to'], 'G1')
+        self.assertEqual(body['messages'], [{'type': 'text', 'text': 'hi'}])
+        self.assertIn('X-Line-Retry-Key', headers)
+
+    def test_expired_token_can_be_skipped(self):
+        row, delivery = self.delivery(raw_event(timestamp=time.time() - 120), expired_reply='skip')
+        self.assertIsNone(delivery.send(self.post, self.reply_body()))
+        self.assertEqual(self.posts, [])
+        row.refresh_from_db()
+        self.assertIsNone(row.replied_at)
+
+    def test_retry_never_replies_twice(self):
+        row, delivery = self.delivery(raw_event())
+        delivery.send(self.post, self.reply_body())
+        # The handler raised after replying; the next attempt claims the row again
+        inbox.mark_failed(row, 'later step failed')
+        retried = inbox.claim_batch()[0]
+        self.assertIsNone(inbox.ReplyDelivery(retried, raw_event()).send(self.post, self.reply_body()))
+        self.assertEqual(len(self.posts), 1)
+
+    def test_retry_key_is_stable_per_event(self):
+        data = raw_event('01HSAME')
+        row, first = self.delivery(data)
+        self.assertEqual(first.retry_key, inbox.ReplyDelivery(row, data).retry_key)
+
+    def test_api_replies_go_through_the_delivery(self):
+        _, delivery = self.delivery(raw_event(timestamp=time.time() - 120))
+        api = DeliveryLineBotApi('token', endpoint='http://line.test')
+        api.http_client = RecordingHttpClient()
+        with reply_delivery(delivery):
+            api.reply_message('reply-token', TextSendMessage(text='hi'))
+        api.reply_message('reply-token', TextSendMessage(text='outside'))
+        urls = [url for url, _ in api.http_client.requests]
+        self.assertEqual(urls, ['http://line.test' + inbox.PUSH_PATH, 'http://line.test' + REPLY_PATH])
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+# URL patterns for the shared linebotcore application
+urlpatterns = [
+    path('stats', views.stats, name='linebot_stats'),  # Runtime counters as JSON
+]
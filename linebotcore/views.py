@@ -0,0 +1,22 @@
+"""
+Operational views shared by the LINE bot projects.
+"""
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from . import metrics
+
+
+@require_http_methods(["GET"])  # Stats are read-only
+def stats(request):
+    """
+    Return the counters of every registered component (webhook pipeline, caches, ...).
+
+    Args:
+        request (HttpRequest): Django HTTP request object
+
+    Returns:
+        JsonResponse: Component name -> stats dict
+    """
+    return JsonResponse(metrics.snapshot(), json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,165 @@
+import json
+import os
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from linebot.models import ImageMessage, MessageEvent, SourceGroup, SourceRoom, SourceUser, TextMessage
+
+import invoicedraw
+from invoicedraw.draw import Draw
+from invoicedraw.models import SavedInvoice
+from invoicedraw.qr import DEFAULTS as QR_DEFAULTS
+from invoicedraw.qr import QRReader
+from invoicedraw.qrdecode import pyzbar
+
+from . import views
+
+DRAW = Draw('113年07月、08月', '特別獎：93221989\n特獎：12345678\n頭獎：39830731、15658241、02213627')
+
+
+class InvoiceNumberRouteTests(SimpleTestCase):
+
+    def test_ascii_numbers_are_routed(self):
+        self.assertEqual(views.router.resolve_text('731'), (views.show3digit, ('731',)))
+        self.assertEqual(views.router.resolve_text('39830731'), (views.show8digit, ('39830731',)))
+        self.assertEqual(views.router.resolve_text('731 39830731'), (views.showMany, ('731 39830731',)))
+        self.assertEqual(views.router.resolve_text('存 39830731')[0], views.saveInvoice)
+
+    def test_unicode_digits_are_not_invoice_numbers(self):
+        # Full-width and Arabic-Indic digits match \d but are not invoice numbers
+        for text in ('７３１', '３９８３０７３１', '７３１ ３９８３０７３１', '٧٣١', '存 ３９８３０７３１'):
+            self.assertEqual(views.router.resolve_text(text), (views.reply_default, (text,)), text)
+
+
+@override_settings(INVOICE_DRAW=dict(settings.INVOICE_DRAW, BATCH_TOKENS=['secret'], BATCH_LIMIT=3))
+@mock.patch.object(views, 'get_draw_service', return_value=mock.Mock(current=mock.Mock(return_value=DRAW)))
+class CheckInvoicesTests(SimpleTestCase):
+
+    def post(self, numbers, token='secret'):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return self.client.post(reverse('invoice_check'), json.dumps({'numbers': numbers}),
+                                content_type='application/json', headers=headers)
+
+    def test_batch_check(self, service):
+        result = self.post(['39830731', '00000000']).json()
+        self.assertEqual((result['checked'], result['winners']), (2, 1))
+        self.assertEqual(result['results'][0], {'number': '39830731', 'prize': '頭獎', 'amount': 200000})
+
+    def test_unicode_digits_are_rejected(self, service):
+        result = self.post(['３９８３０７３１']).json()
+        self.assertEqual(result['checked'], 0)
+        self.assertIn('error', result['results'][0])
+
+    def test_batch_limit(self, service):
+        self.assertEqual(self.post(['00000000'] * 4).status_code, 400)
+
+    def test_token_is_required(self, service):
+        for token in (None, 'wrong', 'secret2'):
+            response = self.post(['39830731'], token=token)
+            self.assertEqual(response.status_code, 401, token)
+            self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+        service.assert_not_called()
+
+    def test_disabled_without_tokens(self, service):
+        with override_settings(INVOICE_DRAW=dict(settings.INVOICE_DRAW, BATCH_TOKENS=[])):
+            self.assertEqual(self.post(['39830731']).status_code, 404)
+
+
+class FakeLineBotApi:
+    # Serves the image content and records the replies
+
+    def __init__(self, content):
+        self.content = content
+        self.replies = []
+
+    def get_message_content(self, message_id):
+        content = mock.Mock()
+        content.iter_content.return_value = [self.content]
+        return content
+
+    def reply_message(self, reply_token, message):
+        self.replies.append(message.text)
+
+
+class ImageMessageTests(SimpleTestCase):
+
+    def setUp(self):
+        with open(os.path.join(os.path.dirname(invoicedraw.__file__), 'testdata', 'invoice_qr.png'), 'rb') as f:
+            self.api = FakeLineBotApi(f.read())
+        self.reader = QRReader(dict(QR_DEFAULTS, WORKERS=1))
+        self.addCleanup(lambda: self.reader._pool and self.reader._pool.shutdown())
+        service = mock.Mock(period=lambda period: DRAW if period == DRAW.period else None)
+        for patcher in (mock.patch.object(views, 'line_bot_api', self.api),
+                        mock.patch.object(views, 'get_qr_reader', return_value=self.reader),
+                        mock.patch('invoicedraw.qr.get_service', return_value=service)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def send_image(self):
+        views.handle_image_message(MessageEvent(reply_token='reply-token', source=SourceUser(user_id='U1'),
+                                                message=ImageMessage(id='m1')))
+        return self.api.replies
+
+    @skipUnless(pyzbar, 'pyzbar and the zbar library are not installed')
+    def test_invoice_photo_is_checked(self):
+        self.assertEqual(self.send_image(), ['AB-39830731 (11307 期)：恭喜！中了頭獎，獎金 200,000 元'])
+
+    @mock.patch('invoicedraw.qr.pyzbar', None)
+    def test_without_decoder_asks_for_the_number(self):
+        self.assertEqual(self.send_image(), ['目前無法辨識圖片中的發票，請直接輸入發票號碼進行對獎。'])
+
+
+class SavedInvoiceTests(TestCase):
+
+    def setUp(self):
+        self.api = FakeLineBotApi(b'')
+        self.service = mock.Mock(period=mock.Mock(return_value=None))
+        for patcher in (mock.patch.object(views, 'line_bot_api', self.api),
+                        mock.patch.object(views, 'get_draw_service', return_value=self.service)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def event(self, text, source=None):
+        return MessageEvent(reply_token='reply-token', source=source or SourceUser(user_id='U1'),
+                            message=TextMessage(id='1', text=text))
+
+    def save(self, text, source=None):
+        views.saveInvoice(self.event(text, source), text)
+        return self.api.replies[-1]
+
+    def test_saved_before_the_draw(self):
+        reply = self.save('存 39830731, 00000000 11307')
+        self.assertTrue(reply.startswith('已儲存 2 張 11307 期發票。\n開獎後會自動對獎'), reply)
+        saved = SavedInvoice.objects.filter(user_id='U1', period='11307', checked_at=None)
+        self.assertEqual(sorted(saved.values_list('number', 'suffix')), [('00000000', '000'), ('39830731', '731')])
+
+    def test_saved_after_the_draw_is_checked_at_once(self):
+        self.service.period.return_value = DRAW
+        reply = self.save('存 39830731 00000000 11307')
+        self.assertIn('39830731：頭獎，獎金 200,000 元', reply)
+        row = SavedInvoice.objects.get(number='39830731')
+        self.assertEqual((row.prize, row.amount), ('頭獎', 200000))
+        # The bulk recheck will not notify it again
+        self.assertFalse(SavedInvoice.objects.filter(notified_at=None).exists())
+
+    def test_show_saved(self):
+        views.showSaved(self.event('@我的發票'))
+        self.assertTrue(self.api.replies[-1].startswith('您還沒有儲存任何發票'))
+        self.save('存 39830731 11307')
+        self.save('存 12345678 11309')
+        self.service.period.side_effect = lambda period: DRAW if period == '11307' else None
+        views.showSaved(self.event('@我的發票'))
+        self.assertEqual(self.api.replies[-1], '最近儲存的 2 張發票：\n12345678 (11309 期)：尚未開獎\n'
+                                               '39830731 (11307 期)：頭獎，獎金 200,000 元')
+
+    def test_sources_without_a_user_id(self):
+        for source in (SourceGroup(group_id='G1'), SourceRoom(room_id='R1')):
+            self.assertEqual(self.save('存 39830731 11307', source), views.NO_USER_MESSAGE)
+            views.showSaved(self.event('@我的發票', source))
+            self.assertEqual(self.api.replies[-1], views.NO_USER_MESSAGE)
+        self.assertFalse(SavedInvoice.objects.exists())
+        # A group member who shares the user ID is served
+        self.save('存 39830731 11307', SourceGroup(group_id='G1', user_id='U2'))
+        self.assertTrue(SavedInvoice.objects.filter(user_id='U2').exists())
@@ -15,8 +15,8 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin  # import Django admin site for administration interface
-from django.urls import path, re_path  # path for simple routes, re_path for regex-based routes
-from linebotinvoice.views import callback, test_page  # import webhook callback and test page views
+from django.urls import path, re_path, include  # path for simple routes, re_path for regex-based routes
+from linebotinvoice.views import callback, check_invoices, test_page  # import webhook callback, batch check and test page views
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -24,8 +24,12 @@ urlpatterns = [
     # Define LINE webhook callback route: match exact '/callback' URL using regex
     # This endpoint receives POST requests from LINE platform to trigger message handling
     re_path(r'^callback$', callback, name='linebot_callback'),
+    # Batch invoice check: POST {"numbers": [...]} and get the prize of every number as JSON
+    path('invoice/check', check_invoices, name='invoice_check'),
     # Define Django admin interface route under '/admin/' URL
     path('admin/', admin.site.urls, name='admin'),
+    # Shared operational endpoints (webhook pipeline stats, ...)
+    path('linebot/', include('linebotcore.urls')),
     # Define test page route for basic server verification
     path('', test_page, name='test_page'),
 ]
@@ -3,15 +3,19 @@ LINE Bot webhook callback views for handling incoming messages and events.
 This module contains the main callback function that processes LINE webhook requests.
 """
 
+import hmac
 import json
 import logging
-from django.http import HttpResponse, HttpResponseBadRequest
+import re
+from datetime import datetime
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
+from django.utils import timezone
 
 # Import LINE SDK components
-from linebot import LineBotApi, WebhookHandler, WebhookParser
+from linebot import WebhookHandler, WebhookParser
 from linebot.exceptions import InvalidSignatureError, LineBotApiError
 from linebot.models import (
     MessageEvent, TextMessage, TextSendMessage,
@@ -19,21 +23,38 @@ from linebot.models import (
     TemplateSendMessage, ButtonsTemplate, MessageAction
 )
 
-import requests
-
-try:
-    import xml.etree.ElementTree as ET  # Import ElementTree for XML parsing
-except ImportError:  # Catch ImportError if the module is not found
-    import xml.etree.ElementTree as ET  # Fallback import for compatibility
+from invoicedraw.draw import EXTRA_SIXTH, FIRST, GRAND, SPECIAL, TAIPEI, normalize_period, period_of
+from invoicedraw.models import SavedInvoice
+from invoicedraw.qr import ImageTooLarge, QRUnavailable, get_reader as get_qr_reader
+from invoicedraw.service import DrawUnavailable, get_config as get_draw_config, get_service as get_draw_service
+from linebotcore.client import build_line_bot_api
+from linebotcore.pipeline import dispatch_events
+from linebotcore.router import CommandRouter
 
 # Configure logging for debugging LINE Bot events
 logger = logging.getLogger(__name__)
 
 # Initialize LINE API with credentials from settings
-line_bot_api = LineBotApi(settings.LINE_CHANNEL_ACCESS_TOKEN)
+line_bot_api = build_line_bot_api(settings.LINE_CHANNEL_ACCESS_TOKEN)
 webhook_handler = WebhookHandler(settings.LINE_CHANNEL_SECRET)
 parser = WebhookParser(settings.LINE_CHANNEL_SECRET)
 
+# Several invoice numbers in one message: 3 or 8 digits each, separated by
+# whitespace, commas or 、.  Digits are [0-9] throughout: \d also matches
+# full-width and other Unicode digits, which never equal a winning number
+MULTI_NUMBER_PATTERN = r'[0-9]{3}(?:[0-9]{5})?(?:[\s,，、]+[0-9]{3}(?:[0-9]{5})?)+'
+NUMBER = re.compile(r'[0-9]+')
+# Numbers checked per LINE message; longer lists are cut to keep the reply readable
+MAX_MESSAGE_NUMBERS = 100
+FULL_NUMBER = re.compile(r'[0-9]{8}')
+# '存 12345678', several numbers, optionally with the period: '存 12345678 87654321 11307'
+SAVE_PATTERN = r'存\s*[0-9][0-9\s,，、年月]*'
+SAVE_SEPARATORS = re.compile(r'[\s,，、]+')
+# Saved invoices listed by @我的發票
+SAVED_LIST_LIMIT = 20
+# Reply to 存 / @我的發票 from a group or room that does not share the sender's user ID
+NO_USER_MESSAGE = '無法取得您的 LINE 帳號，請在與本帳號的一對一聊天中儲存或查看發票。'
+
 
 @csrf_exempt  # Disable CSRF protection for webhook endpoint since LINE platform won't have CSRF token
 @require_http_methods(["POST"])  # Only allow POST requests for webhook callback
@@ -61,33 +82,9 @@ def callback(request):
         # Parse events from the body
         events = parser.parse(body, signature)
         
-        # Process each event
-        for event in events:
-            if isinstance(event, MessageEvent):
-                if isinstance(event.message, TextMessage):
-                    mtext = event.message.text
-                    # Handle specific commands
-                    if mtext == '@顯示本期中獎號碼':
-                        showCurrent(event)
-                    elif mtext == '@顯示前期中獎號碼':
-                        showOld(event)
-                    elif mtext == '@對獎':
-                        line_bot_api.reply_message(event.reply_token, TextSendMessage(text='請輸入發票後面後三碼以進行對獎'))
-                    elif len(mtext) == 3 and mtext.isdigit():
-                        show3digit(event, mtext)
-                    else:
-                        # Default response for other text messages
-                        if "你好" in mtext or "嗨" in mtext or "hello" in mtext.lower():
-                            # Respond to greeting
-                            response_message = "你好！我是發票小幫手，可以協助您處理發票相關事務。請問需要什麼服務呢？"
-                        elif "發票" in mtext:
-                            # Respond to invoice-related queries
-                            response_message = "我可以協助您處理發票相關的需求，例如儲存發票、查詢發票或對獎。請告訴我您想做什麼。"
-                        else:
-                            # Default response
-                            response_message = "感謝您的訊息！我是發票小幫手，目前我可以協助您處理發票相關事務。\n\n請試試以下功能：\n@顯示本期中獎號碼\n@顯示前期中獎號碼\n@對獎"
-                        
-                        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=response_message))
+        # Hand the events to the shared webhook pipeline (inline, worker threads or
+        # the durable inbox, depending on settings.LINEBOT_PIPELINE)
+        dispatch_events(events, handle_event, body)
         
         # Return success response to LINE platform
         return HttpResponse(status=200)
@@ -103,29 +100,60 @@ def callback(request):
         return HttpResponse(status=500)
     
 
+def handle_event(event):
+    """
+    Dispatch a single LINE webhook event to the matching handler.
+    
+    Args:
+        event (Event): LINE event parsed from the webhook payload
+    """
+    # Commands, image messages and follow events are looked up in the command
+    # router registered at the bottom of this module
+    router.dispatch(event)
+
+
+def reply_check_prompt(event):
+    """
+    Ask the user for the last three digits (or all 8 digits) of the invoice to check.
+    
+    Args:
+        event (MessageEvent): LINE message event
+    """
+    line_bot_api.reply_message(event.reply_token, TextSendMessage(text='請輸入發票後三碼或完整 8 碼號碼以進行對獎'))
+
+
+def reply_default(event, mtext):
+    """
+    Default response for text messages that are not commands.
+    
+    Args:
+        event (MessageEvent): LINE message event
+        mtext (str): Text sent by the user
+    """
+    if "你好" in mtext or "嗨" in mtext or "hello" in mtext.lower():
+        # Respond to greeting
+        response_message = "你好！我是發票小幫手，可以協助您處理發票相關事務。請問需要什麼服務呢？"
+    elif "發票" in mtext:
+        # Respond to invoice-related queries
+        response_message = "我可以協助您處理發票相關的需求，例如儲存發票、查詢發票或對獎。請告訴我您想做什麼。"
+    else:
+        # Default response
+        response_message = "感謝您的訊息！我是發票小幫手，目前我可以協助您處理發票相關事務。\n\n請試試以下功能：\n@顯示本期中獎號碼\n@顯示前期中獎號碼\n@對獎\n@期別 11309 12345678\n存 12345678\n@我的發票"
+    
+    line_bot_api.reply_message(event.reply_token, TextSendMessage(text=response_message))
+
+
 def showCurrent(event):
     """
-    Fetches the current winning invoice numbers from the external API and sends them to the user.
+    Sends the current winning invoice numbers, read from the shared draw feed cache.
 
     Parameters:
     - event: The LINE event object containing the reply token and message details.
     """
     try:
-        # Fetch the XML content from the invoice API
-        content = requests.get('https://invoice.etax.nat.gov.tw/invoice.xml')
-        # Parse the XML content
-        tree = ET.fromstring(content.text)
-        items = list(tree.iter(tag='item'))  # Retrieve all 'item' tags
-        
-        # Extract the title (period) and winning numbers
-        title = items[0][0].text  # Period
-        ptext = items[0][3].text  # Winning numbers
-        ptext = ptext.replace('<p>', '').replace('</p>', '\n')  # Clean up the text
-        
-        # Prepare the message to send back to the user
-        message = title + '\n' + ptext[:-1]  # Remove the last newline character
-        
-        # Send the message back to the user
+        # Latest period of the draw feed (fetched at most once per TTL by the shared service)
+        draw = get_draw_service().current()
+        message = draw.title + '\n' + draw.text
         line_bot_api.reply_message(event.reply_token, TextSendMessage(text=message))
     except Exception as e:
         # Log the error for debugging purposes
@@ -135,36 +163,16 @@ def showCurrent(event):
 
 def showOld(event):
     """
-    Fetches the previous winning invoice numbers from the external API and sends them to the user.
+    Sends the winning invoice numbers of the two previous periods, read from the shared draw feed cache.
 
     Parameters:
     - event: The LINE event object containing the reply token and message details.
     """
     try:
-        # Fetch the XML content from the invoice API
-        content = requests.get('https://invoice.etax.nat.gov.tw/invoice.xml')
-        # Parse the XML content
-        tree = ET.fromstring(content.text)  # Parse XML
-        items = list(tree.iter(tag='item'))  # Retrieve all 'item' tags
-        
-        # Initialize the message to be sent back
-        message = ""
-        
-        # Loop through the first two items to extract winning numbers
-        for i in range(1, 3):
-            title = items[i][0].text  # Extract the title (period)
-            ptext = items[i][3].text  # Extract the winning numbers
-            ptext = ptext.replace('<p>', '').replace('</p>', '\n')  # Clean up the text
-            
-            # Append the title and winning numbers to the message
-            message += f"{title}\n{ptext}\n"
-        
-        # Remove the last newline character from the message
-        message = message[:-1]
-        
-        # Send the message back to the user
+        # Periods of the draw feed, newest first; the previous two follow the current one
+        items = get_draw_service().get()
+        message = '\n\n'.join(f"{draw.title}\n{draw.text}" for draw in items[1:3])
         line_bot_api.reply_message(event.reply_token, TextSendMessage(text=message))
-    
     except Exception as e:
         # Log the error for debugging purposes
         logger.error(f"Error fetching previous winning numbers: {e}")
@@ -173,42 +181,32 @@ def showOld(event):
 
 def show3digit(event, mtext):
     """
-    Fetches the current winning numbers from the external API and checks if the user's input matches any winning numbers.
+    Checks the last three digits sent by the user against the current winning numbers.
 
     Parameters:
     - event: The LINE event object containing the reply token and message details.
     - mtext: The last three digits of the user's invoice number to check against winning numbers.
     """
     try:
-        # Fetch the XML content from the invoice API
-        content = requests.get('https://invoice.etax.nat.gov.tw/invoice.xml')
-        tree = ET.fromstring(content.text)  # Parse the XML content
-        items = list(tree.iter(tag='item'))  # Retrieve all 'item' tags
-        
-        # Extract winning numbers from the parsed XML
-        ptext = items[0][3].text  # Winning numbers
-        ptext = ptext.replace('<p>', '')  # Clean up the text
-        prizelist = ptext.split('</p>')  # Split the winning numbers into a list
-        
-        # Extract specific winning numbers
-        prize1list = prizelist[0][-3:]  # Last three digits of the special prize
-        prize2list = prizelist[1][-3:]  # Last three digits of the grand prize
-        prize3list = prizelist[2].split('、')  # Split the third prize numbers
-        prize6list = [prize[-3:] for prize in prize3list]  # Last three digits of the first three prizes
-        
+        # Prize tiers whose numbers end with these digits: one lookup in the
+        # draw's precomputed suffix table
+        tiers = get_draw_service().current().check_suffix(mtext)
+
         # Determine the message based on the user's input
-        if mtext == prize1list:
+        if SPECIAL in tiers:
             message = '符合特別獎後三碼！'
-        elif mtext == prize2list:
+        elif GRAND in tiers:
             message = '符合特獎後三碼！'
-        elif mtext in prize6list:
+        elif FIRST in tiers:
             message = '符合頭獎後三碼！恭喜！至少中六獎！'
+        elif EXTRA_SIXTH in tiers:
+            message = '符合增開六獎！恭喜獲得獎金 200 元！'
         else:
             message = '很可惜，未中獎。請輸入下一張發票最後三碼。'
 
         # Send the response message back to the user
         line_bot_api.reply_message(event.reply_token, TextSendMessage(text=message))
-    
+
     except Exception as e:
         # Log the error for debugging purposes
         logger.error(f"Error fetching winning numbers: {e}")
@@ -216,6 +214,276 @@ def show3digit(event, mtext):
         line_bot_api.reply_message(event.reply_token, TextSendMessage(text='讀取發票號碼發生錯誤！'))
 
 
+def show8digit(event, mtext):
+    """
+    Checks a full 8-digit invoice number against every prize tier of the current period.
+
+    Parameters:
+    - event: The LINE event object containing the reply token and message details.
+    - mtext: The 8-digit invoice number to check.
+    """
+    try:
+        # At most eight lookups in the draw's suffix index, whatever the prize
+        prize = get_draw_service().current().check(mtext)
+        if prize is None:
+            message = f'很可惜，{mtext} 未中獎。'
+        else:
+            message = f'恭喜！{mtext} 中了{prize.name}，獎金 {prize.amount:,} 元！'
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=message))
+    except Exception as e:
+        # Log the error for debugging purposes
+        logger.error(f"Error checking invoice number: {e}")
+        # Send an error message back to the user
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text='讀取發票號碼發生錯誤！'))
+
+
+def showPeriod(event, mtext):
+    """
+    Shows the winning numbers of a given period, or checks a full invoice number against them.
+
+    Parameters:
+    - event: The LINE event object containing the reply token and message details.
+    - mtext: The text after '@期別', e.g. ' 11309' or ' 11309 12345678'.
+    """
+    try:
+        parts = mtext.split()
+        period = normalize_period(parts[0]) if parts else None
+        if period is None or len(parts) > 2 or (len(parts) == 2 and not FULL_NUMBER.fullmatch(parts[1])):
+            message = '請輸入「@期別 期別」或「@期別 期別 8 碼發票號碼」，例如：@期別 11309 12345678'
+        else:
+            # Feed cache first, then the stored InvoiceDraw rows (an indexed lookup by period)
+            draw = get_draw_service().period(period)
+            if draw is None:
+                message = f'查無 {period} 期的開獎資料。'
+            elif len(parts) == 1:
+                message = draw.title + '\n' + draw.text
+            else:
+                prize = draw.check(parts[1])
+                if prize is None:
+                    message = f'很可惜，{parts[1]} 在 {draw.title} 未中獎。'
+                else:
+                    message = f'恭喜！{parts[1]} 在 {draw.title} 中了{prize.name}，獎金 {prize.amount:,} 元！'
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=message))
+    except Exception as e:
+        # Log the error for debugging purposes
+        logger.error(f"Error checking invoice period: {e}")
+        # Send an error message back to the user
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text='讀取發票號碼發生錯誤！'))
+
+
+def showMany(event, mtext):
+    """
+    Checks several invoice numbers sent in one message and answers with one consolidated reply.
+
+    Parameters:
+    - event: The LINE event object containing the reply token and message details.
+    - mtext: The message text, 3-digit and/or 8-digit numbers separated by spaces, newlines or commas.
+    """
+    try:
+        numbers = NUMBER.findall(mtext)
+        skipped = max(len(numbers) - MAX_MESSAGE_NUMBERS, 0)
+        numbers = numbers[:MAX_MESSAGE_NUMBERS]
+        draw = get_draw_service().current()
+        full = [number for number in numbers if len(number) == 8]
+        prizes = dict(zip(full, draw.check_many(full)))
+
+        lines = []
+        losers = 0
+        for number in numbers:
+            if len(number) == 8:
+                prize = prizes[number]
+                if prize is None:
+                    losers += 1
+                else:
+                    lines.append(f'{number}：{prize.name}，獎金 {prize.amount:,} 元')
+                continue
+            tiers = draw.check_suffix(number)
+            if SPECIAL in tiers or GRAND in tiers:
+                lines.append(f'{number}：符合{tiers[0]}後三碼，請核對完整號碼')
+            elif FIRST in tiers:
+                lines.append(f'{number}：符合頭獎後三碼，至少中六獎')
+            elif EXTRA_SIXTH in tiers:
+                lines.append(f'{number}：符合增開六獎，獎金 200 元')
+            else:
+                losers += 1
+
+        message = f'{draw.title} 共對獎 {len(numbers)} 張，中獎 {len(lines)} 張'
+        if lines:
+            message += '\n' + '\n'.join(lines)
+        if losers:
+            message += f'\n未中獎 {losers} 張'
+        if skipped:
+            message += f'\n一次最多對獎 {MAX_MESSAGE_NUMBERS} 張，其餘 {skipped} 張請另外傳送'
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=message))
+    except Exception as e:
+        # Log the error for debugging purposes
+        logger.error(f"Error checking invoice numbers: {e}")
+        # Send an error message back to the user
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text='讀取發票號碼發生錯誤！'))
+
+
+@csrf_exempt  # Called by scripts and other services, not by forms
+@require_http_methods(["POST"])
+def check_invoices(request):
+    """
+    Check a batch of full invoice numbers against the current period.
+
+    The caller sends one of ``INVOICE_DRAW['BATCH_TOKENS']`` as
+    ``Authorization: Bearer <token>``; without configured tokens the endpoint
+    is disabled. The body is ``{"numbers": ["12345678", ...]}`` with at most
+    ``BATCH_LIMIT`` numbers; each number is answered in input order with its
+    prize (null when it wins nothing) or an error when it is not 8 digits.
+
+    Args:
+        request (HttpRequest): Django HTTP request object with a JSON body
+
+    Returns:
+        JsonResponse: Period title, counts and one result per number
+    """
+    config = get_draw_config()
+    if not config['BATCH_TOKENS']:
+        return JsonResponse({'error': '批次對獎未開放'}, status=404, json_dumps_params={'ensure_ascii': False})
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme != 'Bearer' or not any(hmac.compare_digest(token.encode(), allowed.encode())
+                                     for allowed in config['BATCH_TOKENS']):
+        response = JsonResponse({'error': '驗證失敗'}, status=401, json_dumps_params={'ensure_ascii': False})
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+
+    try:
+        numbers = json.loads(request.body)['numbers']
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'error': '請求內容必須是 {"numbers": [...]} 格式的 JSON'}, status=400, json_dumps_params={'ensure_ascii': False})
+    if not isinstance(numbers, list):
+        return JsonResponse({'error': 'numbers 必須是陣列'}, status=400, json_dumps_params={'ensure_ascii': False})
+    limit = config['BATCH_LIMIT']
+    if len(numbers) > limit:
+        return JsonResponse({'error': f'每次最多對獎 {limit} 張發票'}, status=400, json_dumps_params={'ensure_ascii': False})
+
+    try:
+        draw = get_draw_service().current()
+    except DrawUnavailable as e:
+        logger.error(f"Error fetching winning numbers: {e}")
+        return JsonResponse({'error': '無法取得發票資料，請稍後再試'}, status=503, json_dumps_params={'ensure_ascii': False})
+
+    valid = [isinstance(number, str) and FULL_NUMBER.fullmatch(number) is not None for number in numbers]
+    # One batch call for every valid number; results are consumed in input order
+    prizes = iter(draw.check_many([number for number, ok in zip(numbers, valid) if ok]))
+    results = []
+    winners = 0
+    for number, ok in zip(numbers, valid):
+        if not ok:
+            results.append({'number': number, 'error': '發票號碼必須是 8 位數字'})
+            continue
+        prize = next(prizes)
+        if prize is None:
+            results.append({'number': number, 'prize': None, 'amount': 0})
+        else:
+            winners += 1
+            results.append({'number': number, 'prize': prize.name, 'amount': prize.amount})
+
+    return JsonResponse({
+        'period': draw.title,
+        'checked': sum(valid),
+        'winners': winners,
+        'results': results,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def saveInvoice(event, mtext):
+    """
+    Saves invoice numbers for the user; they are checked and the user notified once their period is drawn.
+
+    Parameters:
+    - event: The LINE event object containing the reply token and message details.
+    - mtext: The message text, '存' followed by 8-digit numbers and optionally a period such as 11309.
+    """
+    # Group and room events carry no user ID unless the sender shares it
+    user_id = getattr(event.source, 'user_id', None)
+    if not user_id:
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=NO_USER_MESSAGE))
+        return
+    try:
+        tokens = [token for token in SAVE_SEPARATORS.split(mtext[1:]) if token]
+        numbers = list(dict.fromkeys(token for token in tokens if FULL_NUMBER.fullmatch(token)))
+        others = [token for token in tokens if not FULL_NUMBER.fullmatch(token)]
+        period = normalize_period(others[0]) if len(others) == 1 else None
+        if not numbers or len(others) > 1 or (others and period is None):
+            message = '請輸入「存 8 碼發票號碼」，可一次輸入多張或加上期別，例如：存 12345678 87654321 11309'
+        else:
+            # Without a period the invoice is taken to be from the current two-month period
+            period = period or period_of(datetime.now(TAIPEI))
+            numbers = numbers[:MAX_MESSAGE_NUMBERS]
+            SavedInvoice.objects.bulk_create(
+                [SavedInvoice(user_id=user_id, number=number, suffix=number[-3:], period=period)
+                 for number in numbers],
+                ignore_conflicts=True,
+            )
+            message = f'已儲存 {len(numbers)} 張 {period} 期發票。'
+            draw = get_draw_service().period(period)
+            if draw is None:
+                message += '\n開獎後會自動對獎，中獎時通知您。'
+            else:
+                # Saved after the draw: the bulk check has already run, answer right away
+                # and record the result so a later recheck does not notify again
+                prizes = draw.check_many(numbers)
+                now = timezone.now()
+                saved = SavedInvoice.objects.filter(user_id=user_id, period=period)
+                saved.filter(number__in=numbers, checked_at__isnull=True).update(checked_at=now, notified_at=now)
+                won = []
+                for number, prize in zip(numbers, prizes):
+                    if prize is not None:
+                        saved.filter(number=number).update(prize=prize.name, amount=prize.amount)
+                        won.append(f'{number}：{prize.name}，獎金 {prize.amount:,} 元')
+                message += f'\n{draw.title} 已開獎，' + ('中獎發票：\n' + '\n'.join(won) if won else '很可惜，未中獎。')
+            message += '\n輸入「@我的發票」可查看已儲存的發票。'
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=message))
+    except Exception as e:
+        # Log the error for debugging purposes
+        logger.error(f"Error saving invoice numbers: {e}")
+        # Send an error message back to the user
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text='儲存發票發生錯誤！'))
+
+
+def showSaved(event):
+    """
+    Lists the user's most recently saved invoices with their results.
+
+    Parameters:
+    - event: The LINE event object containing the reply token and message details.
+    """
+    user_id = getattr(event.source, 'user_id', None)
+    if not user_id:
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=NO_USER_MESSAGE))
+        return
+    try:
+        saved = list(
+            SavedInvoice.objects.filter(user_id=user_id)
+            .order_by('-id').values_list('number', 'period')[:SAVED_LIST_LIMIT]
+        )
+        if not saved:
+            message = '您還沒有儲存任何發票，請輸入「存 8 碼發票號碼」儲存。'
+        else:
+            service = get_draw_service()
+            draws = {period: service.period(period) for period in {period for _, period in saved}}
+            lines = []
+            for number, period in saved:
+                draw = draws[period]
+                if draw is None:
+                    lines.append(f'{number} ({period} 期)：尚未開獎')
+                    continue
+                prize = draw.check(number)
+                result = f'{prize.name}，獎金 {prize.amount:,} 元' if prize else '未中獎'
+                lines.append(f'{number} ({period} 期)：{result}')
+            message = f'最近儲存的 {len(saved)} 張發票：\n' + '\n'.join(lines)
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=message))
+    except Exception as e:
+        # Log the error for debugging purposes
+        logger.error(f"Error listing saved invoices: {e}")
+        # Send an error message back to the user
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text='讀取已儲存的發票發生錯誤！'))
+
+
 @webhook_handler.add(MessageEvent, message=ImageMessage)
 def handle_image_message(event):
     """
@@ -231,10 +499,28 @@ def handle_image_message(event):
         
         logger.info(f"Received image from {user_id}, message_id: {message_id}")
         
-        # Respond to the image
-        response_message = "我收到了您傳送的圖片，如果這是發票照片，我會嘗試辨識其中的資訊。"
-        
-        # TODO: Implement invoice image processing logic
+        # Stream the image, decode its e-invoice QR code in the decoder pool and
+        # check each invoice against the draw of its own period
+        try:
+            results = get_qr_reader().read(line_bot_api, message_id)
+            if not results:
+                response_message = "圖片中找不到電子發票的 QR Code，請拍攝發票左側的 QR Code，或直接輸入發票號碼。"
+            else:
+                lines = []
+                for invoice, draw, prize in results:
+                    label = f'{invoice.track}-{invoice.number} ({invoice.period} 期)'
+                    if draw is None:
+                        lines.append(f'{label}：尚未開獎')
+                    elif prize is None:
+                        lines.append(f'{label}：很可惜，未中獎')
+                    else:
+                        lines.append(f'{label}：恭喜！中了{prize.name}，獎金 {prize.amount:,} 元')
+                response_message = '\n'.join(lines)
+        except ImageTooLarge:
+            response_message = "圖片太大，請只拍攝發票左側的 QR Code 後再傳送一次。"
+        except QRUnavailable as e:
+            logger.warning(f"Invoice QR decoding unavailable: {e}")
+            response_message = "目前無法辨識圖片中的發票，請直接輸入發票號碼進行對獎。"
         
         # Send response back to user
         line_bot_api.reply_message(
@@ -295,6 +581,24 @@ def handle_unfollow(event):
         logger.error(f"Error handling unfollow event: {e}")
 
 
+# Command router shared with the other bot projects: exact commands are a dict
+# lookup, the 3-digit invoice pattern is a precompiled rule
+router = CommandRouter()
+router.add_exact('@顯示本期中獎號碼', showCurrent)
+router.add_exact('@顯示前期中獎號碼', showOld)
+router.add_exact('@對獎', reply_check_prompt)
+router.add_prefix('@期別', showPeriod)
+router.add_exact('@我的發票', showSaved)
+router.add_pattern(SAVE_PATTERN, saveInvoice)
+router.add_pattern(r'[0-9]{3}', show3digit, priority=10)
+router.add_pattern(r'[0-9]{8}', show8digit, priority=10)
+router.add_pattern(MULTI_NUMBER_PATTERN, showMany, priority=10)
+router.set_default(reply_default)
+router.add_event(MessageEvent, handle_image_message, message_class=ImageMessage)
+router.add_event(FollowEvent, handle_follow)
+router.add_event(UnfollowEvent, handle_unfollow)
+
+
 def test_page(request):
     """
     Simple test page to verify server is running correctly.
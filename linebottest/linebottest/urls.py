@@ -15,8 +15,8 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin  # import Django admin site for administration interface
-from django.urls import path, re_path  # path for simple routes, re_path for regex-based routes
-from testapp.views import callback  # import webhook callback view to handle incoming LINE events
+from django.urls import path, re_path, include  # path for simple routes, re_path for regex-based routes
+from testapp.views import callback, drink_search  # import webhook callback and drink search views
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -26,6 +26,10 @@ urlpatterns = [
     re_path(r'^callback$', callback, name='linebot_callback'),
     # Define Django admin interface route under '/admin/' URL
     path('admin/', admin.site.urls, name='admin'),
+    # Shared operational endpoints (webhook pipeline stats, ...)
+    path('linebot/', include('linebotcore.urls')),
+    # Full-text drink search as JSON (GET /drinks/search?q=檸檬&page=1)
+    path('drinks/search', drink_search, name='drink_search'),
 ]
 
 # Serve static files during development
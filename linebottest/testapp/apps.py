@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class TestappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'testapp'
+
+    def ready(self):
+        from .catalog import drink_changed
+        from .models import Drink
+        from .search import drink_deleted, drink_saved
+
+        # Drop the in-memory drink catalog whenever a drink changes
+        post_save.connect(drink_changed, sender=Drink, dispatch_uid='testapp.catalog.save')
+        post_delete.connect(drink_changed, sender=Drink, dispatch_uid='testapp.catalog.delete')
+        # Keep the full-text search table in step with the drinks
+        post_save.connect(drink_saved, sender=Drink, dispatch_uid='testapp.search.save')
+        post_delete.connect(drink_deleted, sender=Drink, dispatch_uid='testapp.search.delete')
@@ -0,0 +1,388 @@
+"""
+In-memory catalog of the Drink table.
+
+Every drink command used to query the table on each tap (the carousel alone
+ran six queries).  The table is small and rarely changes, so it is loaded
+once into an immutable ``Catalog`` grouped by category, and the drink
+handlers read it without touching the database:
+
+* saving or deleting a Drink (``post_save`` / ``post_delete``, connected in
+  ``TestappConfig.ready``) drops the catalog once the transaction commits;
+  the next reader loads a new one with a single query;
+* other workers learn about the change through a version stamp file
+  (``STAMP_PATH``): the writer bumps the version stored in it, and readers
+  compare the file's mtime at most every ``CHECK_INTERVAL`` seconds;
+* bulk operations that bypass the signals (``QuerySet.update``,
+  ``bulk_create``) must call ``invalidate()`` themselves.
+
+Load count and version are reported under ``drink_catalog`` on
+``/linebot/stats``.
+"""
+
+import bisect
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+from types import MappingProxyType
+
+from django.conf import settings
+from django.db import transaction
+
+from linebotcore import metrics
+
+from .models import Drink
+from .nameindex import NameIndex
+
+logger = logging.getLogger(__name__)
+
+# Default catalog configuration, overridden by settings.DRINK_CATALOG
+DEFAULTS = {
+    'STAMP_PATH': None,         # Version stamp shared by the workers (None: changes are seen by this process only)
+    'CHECK_INTERVAL': 1.0,      # Seconds between checks of the stamp file
+}
+
+# One drink of the catalog; a tuple, so handlers cannot modify the shared copy
+CatalogDrink = namedtuple('CatalogDrink', ['id', 'name', 'category', 'description', 'image_url'])
+
+CATEGORIES = tuple(key for key, _ in Drink.CATEGORY_CHOICES)
+
+# Quick replies hold 13 items: a page of drinks plus the next-page button
+MENU_PAGE_SIZE = 12
+
+
+def get_config():
+    """
+    Merge the project's DRINK_CATALOG setting over the defaults.
+
+    Returns:
+        dict: Effective catalog configuration
+    """
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'DRINK_CATALOG', {}))
+    return config
+
+
+class Catalog:
+    """
+    Immutable snapshot of the Drink table, in id order and grouped by category,
+    with a bigram index of the names (see testapp.nameindex).
+    """
+
+    __slots__ = ('version', 'drinks', 'by_id', 'by_category', 'category_ids', 'by_name', 'names', 'loaded_at')
+
+    def __init__(self, version, drinks):
+        """
+        Args:
+            version (int): Catalog version the drinks were loaded at
+            drinks (iterable[CatalogDrink]): Every drink, in id order
+        """
+        self.version = version
+        self.drinks = tuple(drinks)
+        self.by_id = MappingProxyType({drink.id: drink for drink in self.drinks})
+        grouped = {category: [] for category in CATEGORIES}
+        for drink in self.drinks:
+            grouped.setdefault(drink.category, []).append(drink)
+        self.by_category = MappingProxyType({category: tuple(items) for category, items in grouped.items()})
+        # Sorted ids of each category, the keys of the menu pages
+        self.category_ids = MappingProxyType({
+            category: tuple(drink.id for drink in items) for category, items in self.by_category.items()
+        })
+        # Drink.name is unique (migration 0004), so each name maps to one drink
+        self.by_name = MappingProxyType({drink.name: drink for drink in self.drinks})
+        self.names = NameIndex(self.drinks)
+        self.loaded_at = time.time()
+
+    def category(self, category):
+        """
+        Drinks of a category.
+
+        Args:
+            category (str): Category key such as 'tea'
+
+        Returns:
+            tuple[CatalogDrink]: The category's drinks in id order, empty if none
+        """
+        return self.by_category.get(category, ())
+
+    def page(self, category, after=None, size=MENU_PAGE_SIZE):
+        """
+        One page of a category, keyed on the drink id (keyset pagination).
+
+        A page starts after the last drink of the previous one, found by
+        bisection, so its cost does not depend on how deep into the category
+        it is, and drinks added or removed meanwhile do not shift the pages.
+
+        Args:
+            category (str): Category key such as 'tea'
+            after (int): Id of the last drink of the previous page, None for the first page
+            size (int): Drinks per page
+
+        Returns:
+            tuple: (tuple[CatalogDrink] of the page, bool whether another page follows)
+        """
+        drinks = self.by_category.get(category, ())
+        start = self.position(category, after)
+        return drinks[start:start + size], start + size < len(drinks)
+
+    def position(self, category, after=None):
+        """
+        Index within its category of the first drink after a cursor.
+
+        Args:
+            category (str): Category key such as 'tea'
+            after (int): Drink id cursor, None for the start of the category
+
+        Returns:
+            int: Index of the first drink whose id is greater than ``after``
+        """
+        return 0 if after is None else bisect.bisect_right(self.category_ids.get(category, ()), after)
+
+    def get(self, name):
+        """
+        The drink with exactly this name.
+
+        Args:
+            name (str): Drink name
+
+        Returns:
+            CatalogDrink or None: The drink, None if there is none
+        """
+        return self.by_name.get(name)
+
+    def search(self, text, limit=5):
+        """
+        Drinks whose names match a query: exact, prefix, contained, then close misspellings.
+
+        Args:
+            text (str): Drink name, part of it, or a misspelling
+            limit (int): Maximum number of matches
+
+        Returns:
+            list[NameMatch]: Ranked matches, ``match.item`` being the CatalogDrink
+        """
+        return self.names.search(text, limit)
+
+    def find(self, text):
+        """
+        The drink best matching a query.
+
+        Args:
+            text (str): Drink name, part of it, or a misspelling
+
+        Returns:
+            CatalogDrink or None: The top ranked drink, None if no name is close enough
+        """
+        match = self.names.find(text)
+        return match.item if match else None
+
+
+def read_stamp(path):
+    """
+    Version stored in a stamp file.
+
+    Args:
+        path (str or Path): Stamp file
+
+    Returns:
+        int: The version, 0 if the file is missing or unreadable
+    """
+    try:
+        return int(Path(path).read_text().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def write_stamp(path, version):
+    """
+    Atomically replace the version in a stamp file.
+
+    Args:
+        path (str or Path): Stamp file
+        version (int): New version
+
+    Returns:
+        bool: True if the stamp was written
+    """
+    path = Path(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=f'.{path.name}.', dir=path.parent)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(str(version))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError as e:
+        logger.warning(f"Could not write drink catalog stamp {path}: {e}")
+        return False
+    return True
+
+
+class CatalogCache:
+    """
+    Process-wide holder of the current Catalog, reloaded after invalidation.
+    """
+
+    def __init__(self, config=None):
+        config = config or get_config()
+        self.stamp_path = config['STAMP_PATH']
+        self.check_interval = config['CHECK_INTERVAL']
+        self._catalog = None
+        self._version = 0             # Latest version known to this process
+        self._stamp_mtime = None
+        self._next_check = 0.0        # Monotonic time of the next stamp check
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.invalidations = 0
+        self.stamp_changes = 0        # Reloads caused by another process's change
+        self.load_latency = metrics.LatencyStats()
+
+    def get(self):
+        """
+        The current catalog, loaded from the database only after a change.
+
+        Returns:
+            Catalog: Immutable snapshot of the Drink table
+        """
+        catalog = self._catalog
+        if catalog is not None and self.stamp_path and time.monotonic() >= self._next_check:
+            self._check_stamp()
+            catalog = self._catalog
+        if catalog is not None:
+            self.hits += 1
+            return catalog
+
+        with self._lock:
+            catalog = self._catalog
+            if catalog is None:
+                catalog = self._catalog = self._load()
+        return catalog
+
+    def invalidate(self):
+        """Drop the catalog here and bump the shared version so other workers reload too."""
+        with self._lock:
+            self._catalog = None
+            self.invalidations += 1
+            if self.stamp_path:
+                self._version = max(self._version, read_stamp(self.stamp_path)) + 1
+                write_stamp(self.stamp_path, self._version)
+                self._remember_stamp()
+            else:
+                self._version += 1
+
+    def _check_stamp(self):
+        # Reload when another process has written the stamp since we last looked
+        self._next_check = time.monotonic() + self.check_interval
+        try:
+            mtime = os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._stamp_mtime:
+            return
+        with self._lock:
+            self._stamp_mtime = mtime
+            version = read_stamp(self.stamp_path)
+            if self._catalog is not None and version != self._catalog.version:
+                self._catalog = None
+                self.stamp_changes += 1
+
+    def _remember_stamp(self):
+        try:
+            self._stamp_mtime = os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            self._stamp_mtime = None
+
+    def _load(self):
+        # Called with the lock held; the version is read before the rows, so a
+        # change committed meanwhile bumps it again and triggers another load
+        started = time.perf_counter()
+        if self.stamp_path:
+            self._remember_stamp()
+            self._version = read_stamp(self.stamp_path)
+        self._next_check = time.monotonic() + self.check_interval
+        rows = Drink.objects.order_by('id').values_list('id', 'name', 'category', 'description', 'image_url')
+        catalog = Catalog(self._version, (CatalogDrink(*row) for row in rows))
+        self.loads += 1
+        self.load_latency.record(time.perf_counter() - started)
+        return catalog
+
+    def stats(self):
+        """
+        Catalog version, size and load counters.
+
+        Returns:
+            dict: Catalog stats
+        """
+        catalog = self._catalog
+        return {
+            'version': catalog.version if catalog else self._version,
+            'loaded': catalog is not None,
+            'drinks': len(catalog.drinks) if catalog else 0,
+            'categories': {category: len(drinks) for category, drinks in catalog.by_category.items()} if catalog else {},
+            'hits': self.hits,
+            'loads': self.loads,
+            'invalidations': self.invalidations,
+            'stamp_changes': self.stamp_changes,
+            'load': self.load_latency.summary(),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Return the process-wide catalog cache, creating it from settings on first use.
+
+    Returns:
+        CatalogCache: The shared cache
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CatalogCache()
+    return _cache
+
+
+def get_catalog():
+    """
+    The current drink catalog.
+
+    Returns:
+        Catalog: Immutable snapshot of the Drink table
+    """
+    return get_cache().get()
+
+
+def invalidate():
+    """Drop the catalog of this process and of the other workers."""
+    get_cache().invalidate()
+
+
+def drink_changed(sender, **kwargs):
+    """
+    post_save / post_delete receiver of Drink: invalidate once the change is committed.
+    """
+    transaction.on_commit(invalidate)
+
+
+def stats():
+    """
+    Stats provider registered with linebotcore.metrics.
+
+    Returns:
+        dict: Catalog stats, or an empty dict before first use
+    """
+    return _cache.stats() if _cache is not None else {}
+
+
+metrics.register('drink_catalog', stats)
@@ -0,0 +1,73 @@
+import random
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand
+
+from testapp.catalog import Catalog, CatalogDrink
+
+BASES = ['春烏龍', '輕烏龍', '焙烏龍', '奶綠', '鮮奶茶', '紅茶', '綠茶', '青茶', '冬瓜茶', '可可']
+TOPPINGS = ['', '珍珠', '黃金珍珠', '椰果', '仙草', '布丁', '茶凍', '粉條', '芋圓', '蘆薈']
+FLAVOURS = ['', '檸檬', '甘蔗', '優酪', '百香', '葡萄柚', '柳橙', '蜂蜜', '烘吉', '黑糖']
+
+
+def sample_names(count, rng):
+    # Distinct drink-like names: flavour + topping + base, numbered past the combinations
+    names = [f'{flavour}{topping}{base}' for flavour in FLAVOURS for topping in TOPPINGS for base in BASES]
+    rng.shuffle(names)
+    return [names[i % len(names)] + (f'{i // len(names)}號' if i >= len(names) else '') for i in range(count)]
+
+
+def typo(name, rng):
+    # Replace one character with another CJK character
+    position = rng.randrange(len(name))
+    return name[:position] + chr(rng.randrange(0x4E00, 0x9FA5)) + name[position + 1:]
+
+
+class Command(BaseCommand):
+    help = '比較 SQLite LIKE 部分比對與記憶體二元組 (bigram) 索引查詢飲料名稱的速度'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drinks', type=int, default=1000, help='模擬的飲料數')
+        parser.add_argument('--queries', type=int, default=2000, help='每種查詢的次數')
+        parser.add_argument('--seed', type=int, default=0, help='隨機種子')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        names = sample_names(options['drinks'], rng)
+
+        started = time.perf_counter()
+        catalog = Catalog(1, (CatalogDrink(i, name, 'tea', '', '') for i, name in enumerate(names, 1)))
+        build_ms = (time.perf_counter() - started) * 1000
+
+        # Baseline: the former exact query followed by name__contains, on an in-memory SQLite table
+        db = sqlite3.connect(':memory:')
+        db.execute('CREATE TABLE drink (id INTEGER PRIMARY KEY, name TEXT)')
+        db.executemany('INSERT INTO drink (id, name) VALUES (?, ?)', enumerate(names, 1))
+
+        def sqlite_lookup(text):
+            row = db.execute('SELECT id FROM drink WHERE name = ?', (text,)).fetchone()
+            return row or db.execute("SELECT id FROM drink WHERE name LIKE ? ESCAPE '\\' ORDER BY id LIMIT 1",
+                                     (f'%{text}%',)).fetchone()
+
+        count = options['queries']
+        queries = {
+            '完整名稱': [rng.choice(names) for _ in range(count)],
+            '部分名稱': [rng.choice(names)[1:4] for _ in range(count)],
+            '一個錯字': [typo(rng.choice(names), rng) for _ in range(count)],
+        }
+
+        self.stdout.write(f'{len(names)} 種飲料，建立索引 {build_ms:.1f} ms')
+        self.stdout.write(f'{"查詢":<8} {"SQLite (µs)":>12} {"索引 (µs)":>10} {"SQLite 找到":>12} {"索引找到":>9}')
+        for label, texts in queries.items():
+            sqlite_us, sqlite_found = self._measure(sqlite_lookup, texts)
+            index_us, index_found = self._measure(catalog.find, texts)
+            self.stdout.write(f'{label:<8} {sqlite_us:>12.1f} {index_us:>10.1f} '
+                              f'{sqlite_found:>12.1%} {index_found:>9.1%}')
+        db.close()
+
+    @staticmethod
+    def _measure(lookup, texts):
+        started = time.perf_counter()
+        found = sum(1 for text in texts if lookup(text))
+        return (time.perf_counter() - started) / len(texts) * 1e6, found / len(texts)
@@ -0,0 +1,60 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from linebotcore import metrics
+from linebotcore.payloads import VersionedPayloadCache, serialize_messages
+from testapp.catalog import CATEGORIES, Catalog, CatalogDrink
+from testapp.management.commands.bench_drink_lookup import sample_names
+from testapp.menus import carousel_message, category_page_message, help_message
+
+
+class Command(BaseCommand):
+    help = '比較每次建立並編碼飲料選單與依目錄版本快取編碼結果的延遲'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drinks', type=int, default=1000, help='模擬的飲料數')
+        parser.add_argument('--taps', type=int, default=2000, help='每種選單的點擊次數')
+        parser.add_argument('--seed', type=int, default=0, help='隨機種子')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        names = sample_names(options['drinks'], rng)
+        catalog = Catalog(1, (
+            CatalogDrink(i, name, rng.choice(CATEGORIES), f'{name}的介紹', f'https://example.com/{i}.jpg')
+            for i, name in enumerate(names, 1)
+        ))
+        # Page starts of the first few pages of every category
+        starts = [(category, start) for category in CATEGORIES for start in range(0, 60, 12)]
+        menus = {
+            '轉盤': lambda: (('carousel',), lambda: carousel_message(catalog)),
+            '類別分頁': lambda: self._page(catalog, rng.choice(starts)),
+            '說明': lambda: (('help',), lambda: help_message(catalog)),
+        }
+
+        cache = VersionedPayloadCache('bench_drink_menus')
+        try:
+            self.stdout.write(f'{len(names)} 種飲料，每種選單 {options["taps"]} 次')
+            self.stdout.write(f'{"選單":<8} {"每次建立 (µs)":>14} {"快取 (µs)":>10} {"加速":>8}')
+            for label, tap in menus.items():
+                taps = [tap() for _ in range(options['taps'])]
+                render_us = self._measure(lambda key, build: serialize_messages(build()), taps)
+                cached_us = self._measure(lambda key, build: cache.get(catalog.version, key, build), taps)
+                self.stdout.write(f'{label:<8} {render_us:>14.1f} {cached_us:>10.1f} {render_us / cached_us:>7.0f}x')
+            stats = cache.stats()
+            self.stdout.write(f'快取 {stats["entries"]} 筆 ({stats["bytes"]} bytes)，命中率 {stats["hit_ratio"]:.1%}')
+        finally:
+            metrics.unregister('payloads:bench_drink_menus')
+
+    @staticmethod
+    def _page(catalog, page):
+        category, start = page
+        return ('page', category, start), lambda: category_page_message(catalog, category, start)
+
+    @staticmethod
+    def _measure(reply, taps):
+        started = time.perf_counter()
+        for key, build in taps:
+            reply(key, build)
+        return (time.perf_counter() - started) / len(taps) * 1e6
@@ -0,0 +1,100 @@
+import random
+import sqlite3
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from testapp.search import (DESCRIPTION_WEIGHT, FTS_TABLE, NAME_WEIGHT, PAGE_SIZE, SEARCH_SQL, index_tokens,
+                            match_expression, query_tokens)
+
+BASES = ['春烏龍', '輕烏龍', '焙烏龍', '奶綠', '鮮奶茶', '紅茶', '綠茶', '青茶', '冬瓜茶', '可可']
+FLAVOURS = ['檸檬', '甘蔗', '優酪', '百香', '葡萄柚', '柳橙', '蜂蜜', '烘吉', '黑糖', '芋頭']
+PHRASES = ['口感清爽', '茶香濃郁', '微糖最對味', '不會太甜', '加入新鮮果汁', '搭配 Q 彈珍珠', '適合炎炎夏日',
+           '奶香滑順', '酸甜平衡', '尾韻回甘', '現榨果肉', '招牌人氣', '季節限定', '低咖啡因', '焙火香氣']
+QUERIES = ['檸檬', '有檸檬的', '不要太甜', '焙烏龍', '季節限定', '珍珠']
+
+
+def sample_drinks(count, rng):
+    # (id, name, description) rows with a few phrases each
+    for pk in range(1, count + 1):
+        name = f'{rng.choice(FLAVOURS)}{rng.choice(BASES)}{pk}'
+        yield pk, name, '，'.join(rng.sample(PHRASES, 3)) + '。'
+
+
+class Command(BaseCommand):
+    help = '比較 LIKE 掃描、FTS5 全文檢索 (bm25 排序全部結果) 與未排序 FTS5 (讀到一頁即停) 在不同飲料數量下的搜尋延遲'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000,50000', help='飲料數量，以逗號分隔')
+        parser.add_argument('--repeat', type=int, default=20, help='每個查詢的重複次數 (取中位數)')
+        parser.add_argument('--seed', type=int, default=0, help='隨機種子')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError as e:
+            raise CommandError('--sizes 必須是以逗號分隔的整數') from e
+
+        self.stdout.write(f'{"飲料數":>8} {"建立索引 (ms)":>13} {"LIKE (ms)":>10} {"FTS5 (ms)":>10} {"未排序 (ms)":>10}'
+                          f' {"平均符合筆數":>10}')
+        for size in sizes:
+            rng = random.Random(options['seed'])
+            drinks = list(sample_drinks(size, rng))
+            db = sqlite3.connect(':memory:')
+            db.execute('CREATE TABLE drink (id INTEGER PRIMARY KEY, name TEXT, description TEXT)')
+            db.executemany('INSERT INTO drink VALUES (?, ?, ?)', drinks)
+
+            started = time.perf_counter()
+            db.execute(f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(name, description)')
+            db.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (?, ?, ?)',
+                           ((pk, index_tokens(name), index_tokens(description)) for pk, name, description in drinks))
+            build_ms = (time.perf_counter() - started) * 1000
+
+            like_ms = self._median(options['repeat'], lambda query: self._like(db, query))
+            fts_ms = self._median(options['repeat'], lambda query: self._fts(db, query))
+            unranked_ms = self._median(options['repeat'], lambda query: self._fts_unranked(db, query))
+            matches = statistics.mean(self._matches(db, query) for query in QUERIES)
+            self.stdout.write(f'{size:>8} {build_ms:>13.1f} {like_ms:>10.3f} {fts_ms:>10.3f} {unranked_ms:>10.3f}'
+                              f' {matches:>10.0f}')
+            db.close()
+
+    @staticmethod
+    def _like(db, query):
+        # Baseline: the query in the name or description, name matches first (a full scan)
+        pattern = f'%{query}%'
+        return db.execute(
+            'SELECT id FROM drink WHERE name LIKE ? OR description LIKE ? ORDER BY name LIKE ? DESC, id LIMIT ?',
+            [pattern, pattern, pattern, PAGE_SIZE + 1],
+        ).fetchall()
+
+    @staticmethod
+    def _fts(db, query):
+        # The bot's query, with sqlite3 placeholders
+        return db.execute(SEARCH_SQL.replace('%s', '?'), [
+            NAME_WEIGHT, DESCRIPTION_WEIGHT, match_expression(query_tokens(query)), PAGE_SIZE + 1, 0,
+        ]).fetchall()
+
+    @staticmethod
+    def _fts_unranked(db, query):
+        # What bm25 ranking costs: the first page of matches in rowid order, which stops reading early
+        return db.execute(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ? LIMIT ?', [
+            match_expression(query_tokens(query)), PAGE_SIZE + 1,
+        ]).fetchall()
+
+    @staticmethod
+    def _matches(db, query):
+        # Rows the ranked query scores before cutting the page
+        return db.execute(f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?',
+                          [match_expression(query_tokens(query))]).fetchone()[0]
+
+    @staticmethod
+    def _median(repeat, run):
+        # Median over the repeats of the mean latency of the query set
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for query in QUERIES:
+                run(query)
+            samples.append((time.perf_counter() - started) / len(QUERIES) * 1000)
+        return statistics.median(samples)
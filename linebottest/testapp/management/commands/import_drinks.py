@@ -1,79 +1,267 @@
-from django.core.management.base import BaseCommand
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from testapp import catalog, search
 from testapp.models import Drink
 
+FIELDS = ('name', 'category', 'description', 'image_url')
+UPDATE_FIELDS = ['category', 'description', 'image_url']
+CATEGORIES = {key for key, _ in Drink.CATEGORY_CHOICES}
+NAME_LENGTH = Drink._meta.get_field('name').max_length
+
+# Invalid rows printed before the rest are only counted
+SHOWN_ERRORS = 10
+
+# 未指定檔案時匯入的預設飲料資料
+DRINKS = [
+    # 茶類
+    {
+        'name': '春烏龍',
+        'category': 'tea',
+        'description': '輕發酵，順口見長，茶香細膩。',
+        'image_url': 'https://cc.tvbs.com.tw/img/program/upload/2024/07/04/20240704180740-d4079f88.jpg'
+    },
+    {
+        'name': '輕烏龍',
+        'category': 'tea',
+        'description': '1 分火，口感溫潤，淡雅清香。',
+        'image_url': 'https://www.niusnews.com/upload/imgs/default/202305_JEN/dejengoolongtea/5.jpg'
+    },
+    {
+        'name': '焙烏龍',
+        'category': 'tea',
+        'description': '3分火，入口生津，醇厚甘潤。',
+        'image_url': 'https://www.niusnews.com/upload/imgs/default/202305_JEN/dejengoolongtea/1.jpg'
+    },
+
+    # 奶類
+    {
+        'name': '黃金珍珠奶綠',
+        'category': 'milk',
+        'description': '得正「黃金珍珠奶綠」以香醇的奶綠為基底，搭配 Q 彈的黃金珍珠，黃金珍珠以黑糖蜜製，呈現誘人的金黃色澤，口感軟 Q 香甜，與奶綠的濃郁茶香完美融合，身為珍奶控的你一定不能錯過這款經典不敗選擇。',
+        'image_url': 'https://blog-cdn.roo.cash/blog/wp-content/uploads/2024/06/%E9%BB%83%E9%87%91%E7%8F%8D%E7%8F%A0%E5%A5%B6%E7%B6%A0.jpg'
+    },
+    {
+        'name': '烘吉鮮奶',
+        'category': 'milk',
+        'description': '得正新推出的焙茶 HOJICHA 系列掀起一波風潮。得正「烘吉鮮奶」選用日本靜岡秋番茶以慢火焙炒，直到散發出焙茶的迷人香氣，再加入鮮奶，鮮乳香氣揉合茶香，交織出豐富、滑順的口感，非常值得一試！',
+        'image_url': 'https://cms.dejeng.com/wp-content/uploads/2024/01/231205-%E7%83%98%E5%90%89%E8%8C%B6%E6%96%B0%E5%93%81%E7%9B%B8%E9%97%9C%E8%B2%BC%E6%96%87_%E7%B6%B2%E9%A0%81-scaled.jpg'
+    },
+    {
+        'name': '焙烏龍鮮奶',
+        'category': 'milk',
+        'description': '得正的「焙烏龍鮮奶」以招牌焙烏龍茶為基底，加入濃醇鮮奶調製而成，茶香與奶香完美融合，完全不會覺得膩口，整體口感滑順，如果喜歡茶味大於奶味的朋友，網友大推搭配茶凍一起！增加口感與味道層次，多重享受！',
+        'image_url': 'https://images-tw.girlstyle.com/wp-content/uploads/2023/04/595fb951.jpeg?auto=format&w=1053'
+    },
+
+    # 其他
+    {
+        'name': '甘蔗春烏龍',
+        'category': 'other',
+        'description': '得正的「甘蔗春烏龍」以清爽的春烏龍為基底，加入新鮮甘蔗汁，甘蔗的清甜與春烏龍的淡雅茶香完美融合，口感清爽甘甜，帶有自然的甘蔗香氣，非常適合炎炎夏日來上一口，清涼又消暑！',
+        'image_url': 'https://blog-cdn.roo.cash/blog/wp-content/uploads/2024/06/%E7%94%98%E8%94%97%E6%98%A5%E7%83%8F%E9%BE%8D.jpg'
+    },
+    {
+        'name': '優酪春烏龍',
+        'category': 'other',
+        'description': '這杯是得正的人氣代表！許多人第一眼看去都會誤會成「優格」，這杯「優酪春烏龍」（55元，中杯、65元，大杯）並不是優格，而是葡萄柚、乳酸飲料加上春烏龍的組合，葡萄柚是現榨的，因此能喝到些許果肉，茶香與酸甜果香完美結合，清爽到不行，是夏天許多人的救贖手搖飲首選，建議點微糖、無糖即可。',
+        'image_url': 'https://tristaliu.com/wp-content/uploads/2022/11/oolong-tea-project-2.jpeg'
+    },
+    {
+        'name': '檸檬春烏龍',
+        'category': 'other',
+        'description': '「檸檬春烏龍」（50元，中杯、60元，大杯），也水果控很愛的夏日夯品。口感偏酸，但對於喜歡酸感的飲料人來說正好是完美酸度，檸檬加烏龍茶順口不澀，怕酸的朋友也可以選無糖、一分糖，酸度比較剛好，消暑解膩大推。',
+        'image_url': 'https://images-tw.girlstyle.com/wp-content/uploads/2023/04/e156803f.jpeg?auto=format&w=1053'
+    },
+]
+
+
+def read_csv(path):
+    # Rows of a CSV file with a header line; utf-8-sig also accepts files saved by Excel
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for line, row in enumerate(csv.DictReader(f), 2):
+            yield line, row
+
+
+def read_jsonl(path):
+    # One JSON object per line; blank lines are skipped
+    with open(path, encoding='utf-8') as f:
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+            try:
+                yield line, json.loads(text)
+            except ValueError as e:
+                yield line, f'JSON 格式錯誤: {e}'
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def clean(row):
+    """
+    Validate one input row.
+
+    Args:
+        row (dict or str): Parsed row, or a parse error message
+
+    Returns:
+        tuple: (dict of FIELDS, None) for a valid row, (None, error message) otherwise
+    """
+    if isinstance(row, str):
+        return None, row
+    if not isinstance(row, dict):
+        return None, '每一筆資料都必須是物件'
+    drink = {field: str(row.get(field) or '').strip() for field in FIELDS}
+    drink['category'] = drink['category'] or 'other'
+    if not drink['name']:
+        return None, '缺少 name 欄位'
+    if len(drink['name']) > NAME_LENGTH:
+        return None, f'name 超過 {NAME_LENGTH} 個字'
+    if drink['category'] not in CATEGORIES:
+        return None, f'category 必須是 {", ".join(sorted(CATEGORIES))} 之一: {drink["category"]}'
+    return drink, None
+
+
 class Command(BaseCommand):
-    help = '匯入飲料資料到資料庫'
+    help = '從 CSV / JSONL 檔串流匯入飲料資料 (依名稱新增或更新)，未指定檔案則匯入預設飲料'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help='CSV (需有標題列) 或 JSONL 檔，欄位：name, category, description, image_url')
+        parser.add_argument('--format', choices=sorted(READERS), default=None, help='檔案格式，預設依副檔名判斷')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批寫入的筆數')
+        parser.add_argument('--prune', action='store_true', help='刪除不在匯入資料中的飲料')
+        parser.add_argument('--dry-run', action='store_true', help='只顯示差異，不寫入資料庫')
 
     def handle(self, *args, **options):
-        # 首先清空現有的飲料資料
-        Drink.objects.all().delete()
-        self.stdout.write(self.style.SUCCESS('已清空現有的飲料資料'))
-        
-        # 定義要匯入的飲料資料
-        drinks_data = [
-            # 茶類
-            {
-                'name': '春烏龍',
-                'category': 'tea',
-                'description': '輕發酵，順口見長，茶香細膩。',
-                'image_url': 'https://cc.tvbs.com.tw/img/program/upload/2024/07/04/20240704180740-d4079f88.jpg'
-            },
-            {
-                'name': '輕烏龍',
-                'category': 'tea',
-                'description': '1 分火，口感溫潤，淡雅清香。',
-                'image_url': 'https://www.niusnews.com/upload/imgs/default/202305_JEN/dejengoolongtea/5.jpg'
-            },
-            {
-                'name': '焙烏龍',
-                'category': 'tea',
-                'description': '3分火，入口生津，醇厚甘潤。',
-                'image_url': 'https://www.niusnews.com/upload/imgs/default/202305_JEN/dejengoolongtea/1.jpg'
-            },
-            
-            # 奶類
-            {
-                'name': '黃金珍珠奶綠',
-                'category': 'milk',
-                'description': '得正「黃金珍珠奶綠」以香醇的奶綠為基底，搭配 Q 彈的黃金珍珠，黃金珍珠以黑糖蜜製，呈現誘人的金黃色澤，口感軟 Q 香甜，與奶綠的濃郁茶香完美融合，身為珍奶控的你一定不能錯過這款經典不敗選擇。',
-                'image_url': 'https://blog-cdn.roo.cash/blog/wp-content/uploads/2024/06/%E9%BB%83%E9%87%91%E7%8F%8D%E7%8F%A0%E5%A5%B6%E7%B6%A0.jpg'
-            },
-            {
-                'name': '烘吉鮮奶',
-                'category': 'milk',
-                'description': '得正新推出的焙茶 HOJICHA 系列掀起一波風潮。得正「烘吉鮮奶」選用日本靜岡秋番茶以慢火焙炒，直到散發出焙茶的迷人香氣，再加入鮮奶，鮮乳香氣揉合茶香，交織出豐富、滑順的口感，非常值得一試！',
-                'image_url': 'https://cms.dejeng.com/wp-content/uploads/2024/01/231205-%E7%83%98%E5%90%89%E8%8C%B6%E6%96%B0%E5%93%81%E7%9B%B8%E9%97%9C%E8%B2%BC%E6%96%87_%E7%B6%B2%E9%A0%81-scaled.jpg'
-            },
-            {
-                'name': '焙烏龍鮮奶',
-                'category': 'milk',
-                'description': '得正的「焙烏龍鮮奶」以招牌焙烏龍茶為基底，加入濃醇鮮奶調製而成，茶香與奶香完美融合，完全不會覺得膩口，整體口感滑順，如果喜歡茶味大於奶味的朋友，網友大推搭配茶凍一起！增加口感與味道層次，多重享受！',
-                'image_url': 'https://images-tw.girlstyle.com/wp-content/uploads/2023/04/595fb951.jpeg?auto=format&w=1053'
-            },
-            
-            # 其他
-            {
-                'name': '甘蔗春烏龍',
-                'category': 'other',
-                'description': '得正的「甘蔗春烏龍」以清爽的春烏龍為基底，加入新鮮甘蔗汁，甘蔗的清甜與春烏龍的淡雅茶香完美融合，口感清爽甘甜，帶有自然的甘蔗香氣，非常適合炎炎夏日來上一口，清涼又消暑！',
-                'image_url': 'https://blog-cdn.roo.cash/blog/wp-content/uploads/2024/06/%E7%94%98%E8%94%97%E6%98%A5%E7%83%8F%E9%BE%8D.jpg'
-            },
-            {
-                'name': '優酪春烏龍',
-                'category': 'other',
-                'description': '這杯是得正的人氣代表！許多人第一眼看去都會誤會成「優格」，這杯「優酪春烏龍」（55元，中杯、65元，大杯）並不是優格，而是葡萄柚、乳酸飲料加上春烏龍的組合，葡萄柚是現榨的，因此能喝到些許果肉，茶香與酸甜果香完美結合，清爽到不行，是夏天許多人的救贖手搖飲首選，建議點微糖、無糖即可。',
-                'image_url': 'https://tristaliu.com/wp-content/uploads/2022/11/oolong-tea-project-2.jpeg'
-            },
-            {
-                'name': '檸檬春烏龍',
-                'category': 'other',
-                'description': '「檸檬春烏龍」（50元，中杯、60元，大杯），也水果控很愛的夏日夯品。口感偏酸，但對於喜歡酸感的飲料人來說正好是完美酸度，檸檬加烏龍茶順口不澀，怕酸的朋友也可以選無糖、一分糖，酸度比較剛好，消暑解膩大推。',
-                'image_url': 'https://images-tw.girlstyle.com/wp-content/uploads/2023/04/e156803f.jpeg?auto=format&w=1053'
-            },
-        ]
-        
-        # 將飲料資料匯入資料庫
-        for drink_data in drinks_data:
-            Drink.objects.create(**drink_data)
-        
-        self.stdout.write(self.style.SUCCESS(f'成功匯入 {len(drinks_data)} 筆飲料資料')) 
\ No newline at end of file
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size 必須大於 0')
+        rows = self._rows(options)
+        self.counts = dict.fromkeys(
+            ('read', 'created', 'updated', 'unchanged', 'duplicate', 'invalid', 'deleted', 'missing'), 0)
+        self.seen = {}      # name -> id of every imported drink, for duplicates and --prune
+        self.written = False  # Whether any drink was saved or deleted, for the catalog invalidation
+
+        started = time.perf_counter()
+        # One transaction: the bot keeps serving the previous catalog until the import commits
+        with transaction.atomic():
+            while batch := list(islice(rows, options['batch_size'])):
+                self._import_batch(batch)
+            if options['prune']:
+                self._prune(options['batch_size'])
+            else:
+                self.counts['missing'] = Drink.objects.count() - len(self.seen)
+            if options['dry_run']:
+                transaction.set_rollback(True)
+            elif self.written:
+                # bulk_create and the pruning delete send no signals
+                transaction.on_commit(catalog.invalidate)
+        elapsed = time.perf_counter() - started
+
+        self._summary(options, elapsed)
+
+    def _rows(self, options):
+        # (source, line, row) of every input file, streamed
+        if not options['files']:
+            for line, row in enumerate(DRINKS, 1):
+                yield '預設資料', line, row
+            return
+        for path in options['files']:
+            kind = options['format'] or Path(path).suffix.lower().lstrip('.')
+            kind = 'jsonl' if kind == 'ndjson' else kind
+            if kind not in READERS:
+                raise CommandError(f'無法判斷檔案格式 {path}，請以 --format 指定 csv 或 jsonl')
+            try:
+                for line, row in READERS[kind](path):
+                    yield path, line, row
+            except (OSError, UnicodeDecodeError, csv.Error) as e:
+                raise CommandError(f'無法讀取檔案 {path}: {e}') from e
+
+    def _import_batch(self, batch):
+        drinks = {}
+        for source, line, row in batch:
+            self.counts['read'] += 1
+            drink, error = clean(row)
+            if error:
+                self.counts['invalid'] += 1
+                if self.counts['invalid'] <= SHOWN_ERRORS:
+                    self.stdout.write(self.style.WARNING(f'略過 {source} 第 {line} 行：{error}'))
+                continue
+            if drink['name'] in drinks or drink['name'] in self.seen:
+                # The last row of a name wins
+                self.counts['duplicate'] += 1
+            drinks[drink['name']] = drink
+        if not drinks:
+            return
+
+        existing = {
+            row[0]: row for row in
+            Drink.objects.filter(name__in=list(drinks)).values_list('name', 'id', *UPDATE_FIELDS)
+        }
+        changed = []
+        for name, drink in drinks.items():
+            current = existing.get(name)
+            if current is None:
+                outcome = 'created'
+            elif current[2:] == tuple(drink[field] for field in UPDATE_FIELDS):
+                outcome = 'unchanged'
+            else:
+                outcome = 'updated'
+            # A name imported by an earlier batch was counted there, and as a duplicate here
+            if name not in self.seen:
+                self.counts[outcome] += 1
+            if outcome == 'unchanged':
+                self.seen[name] = current[1]
+            else:
+                changed.append(Drink(**drink))
+        if not changed:
+            return
+
+        # One upsert per batch, keyed on the unique name; the ids come back on SQLite 3.35+ and PostgreSQL
+        Drink.objects.bulk_create(changed, update_conflicts=True, unique_fields=['name'], update_fields=UPDATE_FIELDS)
+        self.written = True
+        if any(drink.pk is None for drink in changed):
+            ids = dict(Drink.objects.filter(name__in=[drink.name for drink in changed]).values_list('name', 'id'))
+            for drink in changed:
+                drink.pk = ids[drink.name]
+        for drink in changed:
+            self.seen[drink.name] = drink.pk
+        search.update_index(changed)
+
+    def _prune(self, batch_size):
+        imported = set(self.seen.values())
+        stale = [pk for pk in Drink.objects.values_list('id', flat=True).iterator() if pk not in imported]
+        table = connection.ops.quote_name(Drink._meta.db_table)
+        with connection.cursor() as cursor:
+            for start in range(0, len(stale), batch_size):
+                ids = stale[start:start + batch_size]
+                # One plain DELETE per batch: no per-row post_delete receivers (nothing references Drink)
+                cursor.execute(f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(ids))})', ids)
+        if stale:
+            # The receivers did not run: rebuild the search index once (the catalog is invalidated on commit)
+            search.rebuild_index()
+        self.counts['deleted'] = len(stale)
+        self.written = self.written or bool(stale)
+
+    def _summary(self, options, elapsed):
+        counts = self.counts
+        rate = counts['read'] / elapsed if elapsed > 0 else 0
+        self.stdout.write(
+            f'讀取 {counts["read"]} 筆：新增 {counts["created"]}、更新 {counts["updated"]}、'
+            f'未變更 {counts["unchanged"]}、重複名稱 {counts["duplicate"]}、格式錯誤 {counts["invalid"]}'
+        )
+        if options['prune']:
+            self.stdout.write(f'刪除不在匯入資料中的飲料 {counts["deleted"]} 筆')
+        elif counts['missing'] > 0:
+            self.stdout.write(f'資料庫中另有 {counts["missing"]} 筆飲料不在匯入資料中 (加上 --prune 可刪除)')
+        self.stdout.write(f'耗時 {elapsed:.2f} 秒，{rate:,.0f} 筆/秒')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('--dry-run：已復原所有變更，資料庫未修改'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'匯入完成，資料庫共 {Drink.objects.count()} 筆飲料'))
@@ -0,0 +1,179 @@
+"""
+Drink menu replies, rendered once per catalog version.
+
+The ``@菜單`` carousel, the category pages and the ``@飲料選單`` help only
+change when a Drink does, yet building their SDK objects and encoding them
+to JSON took most of a menu tap.  They are rendered from the in-memory
+catalog (see testapp.catalog) on first use and cached, already serialized,
+in a ``VersionedPayloadCache`` keyed by the catalog version; any Drink write
+bumps the version and the next tap renders the new menu.  A tap is then a
+dictionary lookup plus the reply call.
+
+Category pages are keyed by their position in the category, so every
+cursor pointing into the same page shares one entry.  Hit ratio and size are
+reported under ``payloads:drink_menus`` on ``/linebot/stats``.
+"""
+
+from urllib.parse import urlencode
+
+from linebot.models import (CarouselColumn, CarouselTemplate, MessageAction, MessageTemplateAction, PostbackAction,
+                            PostbackTemplateAction, QuickReply, QuickReplyButton, TemplateSendMessage,
+                            TextSendMessage)
+
+from linebotcore.payloads import VersionedPayloadCache
+
+from .catalog import MENU_PAGE_SIZE, get_catalog
+
+# Drink menu carousel: one column per category (LINE allows 10), each showing its first drinks
+MAX_CAROUSEL_COLUMNS = 10
+CAROUSEL_DRINKS = 2
+DRINK_MENUS = {
+    'tea': {
+        'name': '茶類', 'title': '茶類飲品', 'text': '經典烏龍茶系列', 'label': '查看茶類飲品',
+        'image_url': 'https://365dailydrinks.com/wp-content/uploads/2020/10/oolong-tea-project-1.jpg',
+    },
+    'milk': {
+        'name': '奶類', 'title': '奶類飲品', 'text': '濃醇奶茶系列', 'label': '查看奶類飲品',
+        'image_url': 'https://cc.tvbs.com.tw/img/program/upload/2024/07/04/20240704180750-6327e678.jpg',
+    },
+    'other': {
+        'name': '其他', 'title': '其他飲品', 'text': '特調果茶系列', 'label': '查看其他飲品',
+        'image_url': 'https://blog-cdn.roo.cash/blog/wp-content/uploads/2024/06/%E7%94%98%E8%94%97%E6%98%A5%E7%83%8F%E9%BE%8D.jpg',
+    },
+}
+
+NO_DRINKS = '目前沒有可用的飲品選項'
+
+menu_payloads = VersionedPayloadCache('drink_menus')
+
+
+def carousel_message(catalog):
+    """
+    The @菜單 carousel: a column per category with its first drinks and a button opening its menu.
+
+    Args:
+        catalog (Catalog): Drink catalog to render
+
+    Returns:
+        SendMessage: Carousel template, or a text message if there are no drinks
+    """
+    columns = []
+    for category, menu in DRINK_MENUS.items():
+        drinks = catalog.category(category)[:CAROUSEL_DRINKS]
+        if not drinks:
+            continue
+        # A column holds at most three actions: the category menu and its first drinks
+        actions = [PostbackTemplateAction(label=menu['label'],
+                                          data=urlencode({'action': 'drink_category', 'category': category}))]
+        actions += [MessageTemplateAction(label=drink.name[:20], text=f'{drink.name}介紹') for drink in drinks]
+        columns.append(CarouselColumn(
+            thumbnail_image_url=drinks[0].image_url or menu['image_url'],
+            title=menu['title'],
+            text=menu['text'],
+            actions=actions,
+        ))
+    if not columns:
+        return TextSendMessage(text=NO_DRINKS)
+    return TemplateSendMessage(alt_text='飲料菜單', template=CarouselTemplate(columns=columns[:MAX_CAROUSEL_COLUMNS]))
+
+
+def category_page_message(catalog, category, start):
+    """
+    One page of a category menu: a quick reply per drink, plus a next-page button whose
+    postback carries the id of the page's last drink.
+
+    Args:
+        catalog (Catalog): Drink catalog to render
+        category (str): Category key, one of DRINK_MENUS
+        start (int): Index of the page's first drink in the category
+
+    Returns:
+        TextSendMessage: The page, or a notice if it has no drinks
+    """
+    menu = DRINK_MENUS[category]
+    drinks = catalog.category(category)
+    page = drinks[start:start + MENU_PAGE_SIZE]
+    if not page:
+        return TextSendMessage(text=f'{menu["name"]}沒有更多飲品了' if start else NO_DRINKS)
+
+    # Quick reply labels are limited to 20 characters
+    buttons = [QuickReplyButton(action=MessageAction(label=drink.name[:20], text=f'{drink.name}介紹')) for drink in page]
+    if start + MENU_PAGE_SIZE < len(drinks):
+        buttons.append(QuickReplyButton(action=PostbackAction(
+            label='下一頁',
+            data=urlencode({'action': 'drink_category', 'category': category, 'after': page[-1].id}),
+            display_text=f'{menu["name"]} 下一頁',
+        )))
+    return TextSendMessage(text=f'{menu["name"]} - 請選擇一項查看詳細介紹：', quick_reply=QuickReply(items=buttons))
+
+
+def help_message(catalog):
+    """
+    The @飲料選單 help: the drink commands and the first page of each category's names.
+
+    Args:
+        catalog (Catalog): Drink catalog to render
+
+    Returns:
+        TextSendMessage: Help text
+    """
+    help_text = "飲料點餐系統使用說明：\n\n"
+    help_text += "1. 輸入「@菜單」查看主要飲料分類\n"
+    help_text += "2. 選擇「茶類」、「奶類」或「其他」類別查看飲品選單\n"
+    help_text += "3. 點選您想了解的飲品，系統將自動顯示詳細介紹\n\n"
+    help_text += "可用命令：\n"
+    help_text += "- @菜單：顯示飲料分類\n"
+    help_text += "- @飲料選單：顯示此幫助信息\n"
+    help_text += "- @搜尋 檸檬：依名稱與介紹搜尋飲品"
+
+    # 只列出每類的第一頁，訊息才不會超過 LINE 的 5000 字上限
+    for category, menu in DRINK_MENUS.items():
+        drinks = catalog.category(category)
+        if drinks:
+            names = ', '.join(drink.name for drink in drinks[:MENU_PAGE_SIZE])
+            more = ' …' if len(drinks) > MENU_PAGE_SIZE else ''
+            help_text += f"\n\n{menu['title']}({len(drinks)}種)：\n{names}{more}"
+    return TextSendMessage(text=help_text)
+
+
+def reply_carousel(api, reply_token):
+    """
+    Send the @菜單 carousel.
+
+    Args:
+        api (LineBotApi): Client used for the request
+        reply_token (str): replyToken received via webhook
+    """
+    catalog = get_catalog()
+    menu_payloads.reply(api, reply_token, catalog.version, ('carousel',), lambda: carousel_message(catalog))
+
+
+def reply_category_page(api, reply_token, category, after=None):
+    """
+    Send one page of a category menu.
+
+    Args:
+        api (LineBotApi): Client used for the request
+        reply_token (str): replyToken received via webhook
+        category (str): Category key from the postback
+        after (int): Id of the last drink of the previous page, None for the first page
+    """
+    if category not in DRINK_MENUS:
+        api.reply_message(reply_token, TextSendMessage(text=NO_DRINKS))
+        return
+    catalog = get_catalog()
+    start = catalog.position(category, after)
+    menu_payloads.reply(api, reply_token, catalog.version, ('page', category, start),
+                        lambda: category_page_message(catalog, category, start))
+
+
+def reply_help(api, reply_token):
+    """
+    Send the @飲料選單 help.
+
+    Args:
+        api (LineBotApi): Client used for the request
+        reply_token (str): replyToken received via webhook
+    """
+    catalog = get_catalog()
+    menu_payloads.reply(api, reply_token, catalog.version, ('help',), lambda: help_message(catalog))
@@ -0,0 +1,46 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Frozen copies of the table and tokenizer of testapp.search, so migrating never imports app code
+FTS_TABLE = 'testapp_drink_fts'
+WORD = re.compile(r'\w+')
+
+
+def index_tokens(text):
+    # Every character and character pair of each normalized word, space separated
+    tokens = []
+    for word in WORD.findall(''.join(unicodedata.normalize('NFKC', text).lower().split())):
+        tokens.extend(word)
+        tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return ' '.join(tokens)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(name, description)')
+    Drink = apps.get_model('testapp', 'Drink')
+    drinks = Drink.objects.using(schema_editor.connection.alias).values_list('id', 'name', 'description')
+    rows = [(pk, index_tokens(name), index_tokens(description)) for pk, name, description in drinks]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)', rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("testapp", "0002_alter_drink_options_drink_category_and_more"),
+    ]
+
+    # FTS5 virtual table mirroring Drink.name / Drink.description (SQLite only), see testapp.search
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
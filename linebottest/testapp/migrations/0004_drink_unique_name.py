@@ -0,0 +1,40 @@
+from django.db import migrations, models
+
+
+# The search table of migration 0003 (SQLite only)
+FTS_TABLE = 'testapp_drink_fts'
+
+
+def drop_duplicate_names(apps, schema_editor):
+    # Keep the oldest drink of each name, the one the bot has been showing (lookups took .first())
+    Drink = apps.get_model('testapp', 'Drink')
+    drinks = Drink.objects.using(schema_editor.connection.alias)
+    kept = {}
+    duplicates = []
+    for pk, name in drinks.order_by('id').values_list('id', 'name'):
+        if name in kept:
+            duplicates.append(pk)
+        else:
+            kept[name] = pk
+    if duplicates:
+        drinks.filter(id__in=duplicates).delete()
+        if schema_editor.connection.vendor == 'sqlite':
+            with schema_editor.connection.cursor() as cursor:
+                cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in duplicates])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("testapp", "0003_drink_fts"),
+    ]
+
+    # import_drinks upserts by name
+    operations = [
+        migrations.RunPython(drop_duplicate_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="drink",
+            name="name",
+            field=models.CharField(max_length=100, unique=True, verbose_name="飲料名稱"),
+        ),
+    ]
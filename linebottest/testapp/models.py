@@ -8,7 +8,7 @@ class Drink(models.Model):
         ('other', '其他'),
     ]
     
-    name = models.CharField(max_length=100, verbose_name='飲料名稱')
+    name = models.CharField(max_length=100, unique=True, verbose_name='飲料名稱')
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, default='other', verbose_name='類別')
     description = models.TextField(verbose_name='介紹')
     image_url = models.URLField(blank=True, verbose_name='圖片網址')
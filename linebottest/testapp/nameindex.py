@@ -0,0 +1,231 @@
+"""
+Character-bigram index over drink names, for typo-tolerant lookups.
+
+Chinese names have no word boundaries, so each name is indexed by its
+overlapping character pairs ('焙烏龍鮮奶' -> 焙烏, 烏龍, 龍鮮, 鮮奶) and its
+single characters.  A query is answered from the postings of its own
+bigrams instead of a ``LIKE '%…%'`` scan, and the matches are ranked:
+
+1. ``exact``   -- the normalized name equals the query
+2. ``prefix``  -- the name starts with the query
+3. ``contains``-- the name contains the query
+4. ``fuzzy``   -- the name shares bigrams with the query and is within a
+   small edit distance of it, or shares at least half of its bigrams
+   (Dice coefficient); closer names first
+
+so '焙烏龍牛奶' finds '焙烏龍鮮奶' (one substitution).  The index is built
+with each Catalog (see testapp.catalog) and never modified afterwards.
+"""
+
+import heapq
+import math
+import unicodedata
+from collections import Counter, namedtuple
+
+EXACT = 'exact'
+PREFIX = 'prefix'
+CONTAINS = 'contains'
+FUZZY = 'fuzzy'
+
+_RANKS = {EXACT: 0, PREFIX: 1, CONTAINS: 2, FUZZY: 3}
+
+# Minimum share of bigrams (Dice coefficient) for a fuzzy match beyond the edit distance limit
+MIN_OVERLAP = 0.5
+
+# Names sharing the most bigrams with a query that are checked for a fuzzy match
+FUZZY_CANDIDATES = 20
+
+_EMPTY = frozenset()
+
+# A ranked result: kind of match, edit distance to the query, bigram overlap (0..1)
+NameMatch = namedtuple('NameMatch', ['item', 'kind', 'distance', 'overlap'])
+
+
+def normalize(text):
+    """
+    Comparable form of a name: full-width forms folded (NFKC), lower case, no spaces.
+
+    Args:
+        text (str): Drink name or query
+
+    Returns:
+        str: Normalized text
+    """
+    return ''.join(unicodedata.normalize('NFKC', text).lower().split())
+
+
+def bigrams(text):
+    """
+    Overlapping character pairs of a normalized text.
+
+    Args:
+        text (str): Normalized text
+
+    Returns:
+        list[str]: Bigrams in order, with repeats; empty for fewer than 2 characters
+    """
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance, giving up early once it exceeds ``limit``.
+
+    Args:
+        a (str): First text
+        b (str): Second text
+        limit (int): Largest distance of interest
+
+    Returns:
+        int: The distance, or ``limit + 1`` if it is larger than ``limit``
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # A common prefix and suffix cost nothing; a typo usually leaves a character or two
+    start = 0
+    shortest = min(len(a), len(b))
+    while start < shortest and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < shortest - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a = a[start:len(a) - end]
+    b = b[start:len(b) - end]
+    if not a or not b:
+        return min(len(a) + len(b), limit + 1)
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+def max_edits(query):
+    """Edit distance tolerated for a query: one typo per three characters, at least one."""
+    return max(1, len(query) // 3)
+
+
+class NameIndex:
+    """
+    Immutable bigram / unigram inverted index over a sequence of named items.
+    """
+
+    __slots__ = ('items', 'names', 'sizes', 'exact', 'grams', 'chars')
+
+    def __init__(self, items, key=lambda item: item.name):
+        """
+        Args:
+            items (sequence): Items to index, in tie-break order (e.g. by id)
+            key (callable): Name of an item
+        """
+        self.items = tuple(items)
+        self.names = tuple(normalize(key(item)) for item in self.items)
+        # Distinct bigrams of each name, for the overlap score
+        self.sizes = tuple(len(set(bigrams(name))) for name in self.names)
+        exact = {}
+        grams = {}
+        chars = {}
+        for position, name in enumerate(self.names):
+            exact.setdefault(name, position)
+            for gram in set(bigrams(name)):
+                grams.setdefault(gram, []).append(position)
+            for char in set(name):
+                chars.setdefault(char, []).append(position)
+        self.exact = exact
+        # Postings: item positions, a set per bigram (intersected) and a tuple per character (in order)
+        self.grams = {gram: frozenset(positions) for gram, positions in grams.items()}
+        self.chars = {char: tuple(positions) for char, positions in chars.items()}
+
+    def search(self, text, limit=5):
+        """
+        Items whose names match a query, best first.
+
+        Args:
+            text (str): Query, e.g. a drink name with a typo
+            limit (int): Maximum number of matches
+
+        Returns:
+            list[NameMatch]: Ranked matches, empty if nothing is close enough
+        """
+        query = normalize(text)
+        if not query:
+            return []
+        if limit == 1 and query in self.exact:
+            # The common case: a menu button sends the exact name
+            return [NameMatch(self.items[self.exact[query]], EXACT, 0, 1.0)]
+        query_grams = set(bigrams(query))
+        if not query_grams:
+            # A single character: every name containing it, those starting with it first
+            ranked = []
+            for position in self.chars.get(query, ()):
+                name = self.names[position]
+                kind = EXACT if name == query else PREFIX if name.startswith(query) else CONTAINS
+                ranked.append(((_RANKS[kind], position), NameMatch(self.items[position], kind, len(name) - 1, 0.0)))
+            return [match for _, match in heapq.nsmallest(limit, ranked, key=lambda entry: entry[0])]
+
+        unique = len(query_grams)
+        ranked = []
+        # A name containing the query has every bigram of it: intersect the postings, smallest first
+        postings = sorted((self.grams.get(gram, _EMPTY) for gram in query_grams), key=len)
+        matched = set()
+        for position in postings[0].intersection(*postings[1:]):
+            name = self.names[position]
+            if query not in name:
+                # Every bigram of the query but not the query ('茶奶茶' for '奶茶奶'): left to the fuzzy pass
+                continue
+            matched.add(position)
+            kind = EXACT if name == query else PREFIX if name.startswith(query) else CONTAINS
+            overlap = 2 * unique / (unique + self.sizes[position])
+            ranked.append(((_RANKS[kind], len(name) - len(query), -overlap, position),
+                           NameMatch(self.items[position], kind, len(name) - len(query), round(overlap, 3))))
+
+        if len(ranked) < limit:
+            ranked.extend(self._fuzzy(query, unique, postings, matched))
+        return [match for _, match in heapq.nsmallest(limit, ranked, key=lambda entry: entry[0])]
+
+    def _fuzzy(self, query, unique, postings, exclude):
+        # Names sharing the most bigrams with the query, within the edit distance or overlap limits
+        shared = Counter()
+        for positions in postings:
+            shared.update(positions)
+        edits = max_edits(query)
+        # Each edit breaks at most two bigrams of the query; an overlap of MIN_OVERLAP
+        # needs a quarter of them at least
+        least = max(1, min(unique - 2 * edits, math.ceil(MIN_OVERLAP * (unique + 1) / 2)))
+        matches = []
+        for position, common in shared.most_common(FUZZY_CANDIDATES):
+            if common < least:
+                break
+            if position in exclude:
+                continue
+            name = self.names[position]
+            overlap = 2 * common / (unique + self.sizes[position])
+            if abs(len(name) - len(query)) > edits:
+                # Too far apart in length for the edit distance; only the overlap can admit it
+                if overlap < MIN_OVERLAP:
+                    continue
+                distance = edits + 1
+            else:
+                distance = edit_distance(query, name, edits)
+                if distance > edits and overlap < MIN_OVERLAP:
+                    continue
+            matches.append(((_RANKS[FUZZY], distance, -overlap, position),
+                            NameMatch(self.items[position], FUZZY, distance, round(overlap, 3))))
+        return matches
+
+    def find(self, text):
+        """
+        The best match of a query.
+
+        Args:
+            text (str): Query
+
+        Returns:
+            NameMatch or None: The top match, None if nothing is close enough
+        """
+        matches = self.search(text, 1)
+        return matches[0] if matches else None
@@ -0,0 +1,314 @@
+"""
+Static reply messages of the testapp demo commands.
+
+The messages are declared here once, serialized to JSON when the module is
+imported (at startup, through the URLconf) and reused for every reply; the
+handlers in views.py only splice in the reply token.
+"""
+
+from linebot.models import TextSendMessage, ImageSendMessage, StickerSendMessage, LocationSendMessage, QuickReply, QuickReplyButton, MessageAction, TemplateSendMessage, ButtonsTemplate, MessageTemplateAction, URITemplateAction, PostbackTemplateAction, ConfirmTemplate, ImageCarouselTemplate, ImageCarouselColumn, ImagemapSendMessage, BaseSize, MessageImagemapAction, ImagemapArea, URIImagemapAction, DatetimePickerTemplateAction
+
+from linebotcore.payloads import PayloadCache
+
+static_replies = PayloadCache('testapp')
+
+
+def textMessage():
+    """Builds a text message in response to a LINE event."""
+    # Create a TextSendMessage object with the response text
+    message = TextSendMessage(text="我是中原 Linebot,\n您好!")
+    return message
+
+
+def imageMessage():
+    """Builds an image message in response to a LINE event."""
+    # Create an ImageSendMessage object with the image URLs
+    message = ImageSendMessage(
+        #original_content_url="https://i.imgur.com/4QfKuz1.png",
+        #preview_image_url="https://i.imgur.com/4QfKuz1.png"
+        
+        original_content_url="https://upload.wikimedia.org/wikipedia/commons/thumb/4/47/PNG_transparency_demonstration_1.png/640px-PNG_transparency_demonstration_1.png",
+        preview_image_url="https://upload.wikimedia.org/wikipedia/commons/thumb/4/47/PNG_transparency_demonstration_1.png/640px-PNG_transparency_demonstration_1.png"
+    )
+    return message
+
+
+def stickerMessage():
+    """Builds a sticker message in response to a LINE event."""
+    # Create a StickerSendMessage object with the package and sticker IDs
+    message = StickerSendMessage(
+        package_id='446',
+        sticker_id='1988'
+    )
+    return message
+
+
+def multiMessage():
+    """Builds multiple types of messages (sticker, text, and image) in response to a LINE event."""
+    # Create a list of messages to send
+    message = [
+        # Send a sticker message
+        StickerSendMessage(
+            package_id='1',
+            sticker_id='2'
+        ),
+        # Send a text message
+        TextSendMessage(
+            text="這是 Pizza 圖片!"
+        ),
+        # Send an image message
+        ImageSendMessage(
+            original_content_url="https://i.imgur.com/4QfKuz1.png",
+            preview_image_url="https://i.imgur.com/4QfKuz1.png"
+        )
+    ]
+    return message
+
+
+def positionMessage():
+    """Builds a location message in response to a LINE event."""
+    # Create a LocationSendMessage object with the title, address, latitude, and longitude
+    message = LocationSendMessage(
+        title='北京大學',
+        address='中國北京市海淀区颐和园路5号 邮政编码: 100871',
+        latitude=39.98711025939518,  # Latitude
+        longitude=116.30591681135664  # Longitude
+    )
+    return message
+
+
+def quickreplyMessage():
+    """Builds a quick reply message in response to a LINE event."""
+    # Create a TextSendMessage object with quick reply options
+    message = TextSendMessage(
+        text='請選擇最喜歡的程式語言',
+        quick_reply=QuickReply(
+            items=[
+                QuickReplyButton(
+                    action=MessageAction(label="Python", text="Python")
+                ),
+                QuickReplyButton(
+                    action=MessageAction(label="Java", text="Java")
+                ),
+                QuickReplyButton(
+                    action=MessageAction(label="C#", text="C#")
+                ),
+                QuickReplyButton(
+                    action=MessageAction(label="Basic", text="Basic")
+                )
+            ]
+        )
+    )
+    return message
+
+
+def buttonMessage():
+    """Builds a button template message in response to a LINE event."""
+    # Create a TemplateSendMessage object with a ButtonsTemplate
+    message = TemplateSendMessage(
+        alt_text='按鈕樣板',
+        template=ButtonsTemplate(
+            thumbnail_image_url='https://assets.tmecosys.com/image/upload/t_web_rdp_recipe_584x480_1_5x/img/recipe/ras/Assets/2caca97b-77f6-48e7-837d-62642c0c9861/Derivates/12591894-e010-4a02-b04e-2627d8374298.jpg',  # Display image
+            title='按鈕樣版示範',  # Main title
+            text='請選擇:',  # Display text
+            actions=[
+                MessageTemplateAction(
+                    label='文字訊息',
+                    text='@購買披薩'
+                ),
+                URITemplateAction(  # Open webpage
+                    label='連結網頁',
+                    uri='https://www.pizzahut.com.tw/'
+                ),
+                PostbackTemplateAction(  # Execute Postback function, trigger Postback event
+                    label='回傳訊息',
+                    data='action=buy'
+                )
+            ]
+        )
+    )
+    return message
+
+
+def pizzaMessage():
+    """Builds a text message confirming the purchase of a pizza in response to a LINE event."""
+    # Create a TextSendMessage object with the confirmation text
+    message = TextSendMessage(
+        text='感謝您購買披薩,我們將盡快為您製作。'
+    )
+    return message
+
+
+def buyMessage():
+    """Builds the confirmation message of the action=buy postback."""
+    # Construct the confirmation message text
+    text1 = '感謝您購買披薩,'
+    text1 += '\n我們將盡快為您製作。'
+
+    # Create a TextSendMessage object with the confirmation text
+    message = TextSendMessage(text=text1)
+    return message
+
+
+def confirmMessage():
+    """Builds a confirmation template message in response to a LINE event."""
+    # Create a TemplateSendMessage object with a ConfirmTemplate
+    message = TemplateSendMessage(
+        alt_text='Confirmation Template',
+        template=ConfirmTemplate(
+            text='你確定要購買此商品嗎?',
+            actions=[
+                MessageTemplateAction(
+                    label='Yes',
+                    text='@yes'
+                ),
+                MessageTemplateAction(
+                    label='No',
+                    text='@no'
+                )
+            ]
+        )
+    )
+    return message
+
+
+def yesMessage():
+    """Builds a confirmation message indicating a successful purchase."""
+    # Create a TextSendMessage object with the confirmation text
+    message = TextSendMessage(
+        text='感謝您的購買,\n我們將盡快寄出商品。'
+    )
+    return message
+
+
+def noMessage():
+    """Builds a message indicating the cancellation of the operation."""
+    # Create a TextSendMessage object with the cancellation text
+    message = TextSendMessage(
+        text='沒關係,\n請您重新操作。'
+    )
+    return message
+
+
+def imgCarouselMessage():
+    """Builds an image carousel message."""
+    # Create a template message with an image carousel
+    message = TemplateSendMessage(
+        alt_text='Image Carousel Template',
+        template=ImageCarouselTemplate(
+            columns=[
+                ImageCarouselColumn(
+                    image_url='https://i.imgur.com/4QfKuz1.png',
+                    action=MessageTemplateAction(
+                        label='Order Pizza',
+                        text='Order Pizza'
+                    )
+                ),
+                ImageCarouselColumn(
+                    image_url='https://i.imgur.com/qaAdBkR.png',
+                    action=MessageTemplateAction(
+                        label='Order Drinks',
+                        text='Order Drinks'
+                    )
+                )
+            ]
+        )
+    )
+    return message
+
+
+def imgmapMessage():
+    """Builds an imagemap message."""
+    # Define the image URL and dimensions
+    image_url = 'https://i.imgur.com/Yz2yzve.jpg'
+    imgwidth = 1040  # The original image width must be 1040
+    imgheight = 300
+
+    # Create an ImagemapSendMessage object with the image and actions
+    message = ImagemapSendMessage(
+        base_url=image_url,
+        alt_text="This is an imagemap",
+        base_size=BaseSize(height=imgheight, width=imgwidth),
+        actions=[
+            # Define a message action for the left quarter of the image
+            MessageImagemapAction(
+                text='You clicked the red area!',
+                area=ImagemapArea(
+                    x=0,
+                    y=0,
+                    width=imgwidth * 0.25,
+                    height=imgheight
+                )
+            ),
+            # Define a URI action for the right quarter of the image
+            URIImagemapAction(
+                link_uri='https://im.cycu.edu.tw/',
+                area=ImagemapArea(
+                    x=imgwidth * 0.75,
+                    y=0,
+                    width=imgwidth * 0.25,
+                    height=imgheight
+                )
+            )
+        ]
+    )
+    return message
+
+
+def datetimeMessage():
+    """Builds a template message with datetime picker actions in response to a LINE event."""
+    # Create a TemplateSendMessage object with datetime picker actions
+    message = TemplateSendMessage(
+        alt_text='Datetime Picker Example',
+        template=ButtonsTemplate(
+            thumbnail_image_url='https://i.imgur.com/VxVB46z.jpg',
+            title='Datetime Selection',
+            text='Please select:',
+            actions=[
+                DatetimePickerTemplateAction(
+                    label="Select Date",
+                    data="action=return&mode=date&label=Date",
+                    mode="date",
+                    initial="2021-06-01",
+                    min="2021-01-01",
+                    max="2021-12-31"
+                ),
+                DatetimePickerTemplateAction(
+                    label="Select Time",
+                    data="action=return&mode=time&label=Time",
+                    mode="time",
+                    initial="10:00",
+                    min="00:00",
+                    max="23:59"
+                ),
+                DatetimePickerTemplateAction(
+                    label="Select Datetime",
+                    data="action=return&mode=datetime&label=Datetime",
+                    mode="datetime",
+                    initial="2021-06-01T10:00",
+                    min="2021-01-01T00:00",
+                    max="2021-12-31T23:59"
+                )
+            ]
+        )
+    )
+    return message
+
+
+# Register every static reply and serialize it once
+static_replies.register('text', textMessage)
+static_replies.register('image', imageMessage)
+static_replies.register('sticker', stickerMessage)
+static_replies.register('multi', multiMessage)
+static_replies.register('position', positionMessage)
+static_replies.register('quickreply', quickreplyMessage)
+static_replies.register('button', buttonMessage)
+static_replies.register('pizza', pizzaMessage)
+static_replies.register('buy', buyMessage)
+static_replies.register('confirm', confirmMessage)
+static_replies.register('yes', yesMessage)
+static_replies.register('no', noMessage)
+static_replies.register('imgcarousel', imgCarouselMessage)
+static_replies.register('imgmap', imgmapMessage)
+static_replies.register('datetime', datetimeMessage)
+static_replies.build_all()
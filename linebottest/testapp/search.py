@@ -0,0 +1,223 @@
+"""
+Full-text search over drink names and descriptions with SQLite FTS5.
+
+``testapp_drink_fts`` (created by migration 0003, which keeps a frozen copy of
+``index_tokens``) mirrors ``Drink.name`` and
+``Drink.description``, keyed by the drink id.  FTS5's tokenizers split on
+spaces and punctuation, which leaves a run of Chinese text as one token, so
+the text is tokenized here instead: every character and every pair of
+adjacent characters becomes a space-separated token ('檸檬春' -> 檸 檬 春
+檸檬 檬春).  A query is split the same way into bigrams (single characters
+for one-character words), OR-ed together and ranked by ``bm25`` with the name
+weighted above the description, so results that share more and rarer pairs
+with the query come first.
+
+Every match is scored before the page is cut, so the best drinks come first
+however many others match.  The price is that a query costs in proportion to
+its matches rather than to the page: the matches come from an index probe,
+but each of them is read and scored.  ``manage.py bench_drink_search``
+measures it; with 50,000 generated drinks (about 9,000 matches per query) a
+ranked page takes about 12 ms, against 0.05 ms for an unranked first page
+and 17 ms for a LIKE scan, and a menu of a thousand drinks stays under
+0.3 ms.  Past that size, rank a capped candidate set instead.
+
+The table is kept in sync by the ``post_save`` / ``post_delete`` receivers
+connected in ``TestappConfig.ready``; bulk operations that bypass the
+signals must call ``update_index()`` with the rows they touched, or
+``rebuild_index()``.  On other databases, or before the migration, search
+falls back to scanning the in-memory catalog.
+"""
+
+import logging
+import re
+from collections import namedtuple
+
+from django.db import DatabaseError, connection, transaction
+
+from .catalog import get_catalog
+from .nameindex import bigrams, normalize
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'testapp_drink_fts'
+
+# Quick replies hold 13 items: a page of drinks plus the next-page button
+PAGE_SIZE = 12
+MAX_PAGE_SIZE = 50
+MAX_QUERY_LENGTH = 50       # Keeps the query within the 300-character postback data
+
+# bm25 column weights: name, description
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+WORD = re.compile(r'\w+')
+
+# Parameters: name weight, description weight, MATCH expression, limit, offset
+SEARCH_SQL = (
+    f'SELECT rowid, bm25({FTS_TABLE}, %s, %s) AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+    'ORDER BY score, rowid LIMIT %s OFFSET %s'
+)
+
+# A ranked result; lower scores are better, as with bm25()
+SearchResult = namedtuple('SearchResult', ['drink', 'score'])
+
+
+def query_tokens(text):
+    """
+    Search tokens of a query: the bigrams of each word, or the word itself if it is one character.
+
+    Args:
+        text (str): User query such as '有檸檬的'
+
+    Returns:
+        list[str]: Distinct tokens in query order
+    """
+    tokens = []
+    for word in WORD.findall(normalize(text)):
+        tokens.extend(bigrams(word) or [word])
+    return list(dict.fromkeys(tokens))
+
+
+def index_tokens(text):
+    """
+    Indexed form of a name or description: every character and character pair, space separated.
+
+    Args:
+        text (str): Drink name or description
+
+    Returns:
+        str: Token string stored in the FTS table
+    """
+    tokens = []
+    for word in WORD.findall(normalize(text)):
+        tokens.extend(word)
+        tokens.extend(bigrams(word))
+    return ' '.join(tokens)
+
+
+def available(using=None):
+    """Whether the database can hold the FTS5 table (SQLite only)."""
+    return (using or connection).vendor == 'sqlite'
+
+
+def rebuild_index(drinks=None, using=None):
+    """
+    Replace the whole FTS table with the current drinks.
+
+    Args:
+        drinks (iterable): Objects with id, name and description; every Drink by default
+        using (DatabaseWrapper): Connection, the default one by default
+
+    Returns:
+        int: Number of drinks indexed
+    """
+    using = using or connection
+    if not available(using):
+        return 0
+    if drinks is None:
+        from .models import Drink
+        drinks = Drink.objects.only('id', 'name', 'description')
+    rows = [(drink.id, index_tokens(drink.name), index_tokens(drink.description)) for drink in drinks]
+    with using.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)', rows)
+    return len(rows)
+
+
+def update_index(drinks=(), deleted=(), using=None):
+    """
+    Re-index some drinks and drop others, for bulk writes that bypass the signals.
+
+    Args:
+        drinks (iterable): Saved objects with id, name and description
+        deleted (iterable[int]): Ids of deleted drinks
+        using (DatabaseWrapper): Connection, the default one by default
+
+    Returns:
+        int: Number of drinks indexed
+    """
+    using = using or connection
+    if not available(using):
+        return 0
+    rows = [(drink.id, index_tokens(drink.name), index_tokens(drink.description)) for drink in drinks]
+    with using.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in deleted])
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)', rows)
+    return len(rows)
+
+
+def drink_saved(sender, instance, **kwargs):
+    """post_save receiver of Drink: re-index the drink."""
+    _update(instance.pk, (instance.pk, index_tokens(instance.name), index_tokens(instance.description)))
+
+
+def drink_deleted(sender, instance, **kwargs):
+    """post_delete receiver of Drink: drop the drink from the index."""
+    _update(instance.pk, None)
+
+
+def _update(pk, row):
+    if not available():
+        return
+    try:
+        # A savepoint, so a missing table (before migrate) cannot break the caller's transaction
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+            if row is not None:
+                cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)', row)
+    except DatabaseError as e:
+        logger.warning(f"Could not update drink search index for drink {pk}: {e}")
+
+
+def match_expression(tokens):
+    """FTS5 MATCH expression of query tokens: any of them, each quoted."""
+    return ' OR '.join(f'"{token}"' for token in tokens)
+
+
+def search(text, page=1, page_size=PAGE_SIZE):
+    """
+    Drinks matching a query, best first, one page at a time.
+
+    Args:
+        text (str): User query
+        page (int): 1-based page number
+        page_size (int): Results per page
+
+    Returns:
+        tuple: (list[SearchResult], bool whether there is a next page)
+    """
+    tokens = query_tokens(text[:MAX_QUERY_LENGTH])
+    if not tokens or page < 1:
+        return [], False
+    catalog = get_catalog()
+    offset = (page - 1) * page_size
+    if available():
+        try:
+            return _search_fts(catalog, tokens, offset, page_size)
+        except DatabaseError as e:
+            logger.warning(f"Drink search index unavailable, scanning the catalog: {e}")
+    return _search_catalog(catalog, tokens, offset, page_size)
+
+
+def _search_fts(catalog, tokens, offset, page_size):
+    with connection.cursor() as cursor:
+        # One row more than the page tells whether another page follows
+        cursor.execute(SEARCH_SQL, [NAME_WEIGHT, DESCRIPTION_WEIGHT, match_expression(tokens), page_size + 1, offset])
+        rows = cursor.fetchall()
+    # The drinks themselves come from the catalog; a drink added a moment ago may not be there yet.
+    # The page and the next-page flag both come from the rows the catalog has
+    results = [SearchResult(catalog.by_id[pk], score) for pk, score in rows if pk in catalog.by_id]
+    return results[:page_size], len(results) > page_size
+
+
+def _search_catalog(catalog, tokens, offset, page_size):
+    # Fallback without FTS5: weighted token counts over every drink
+    scored = []
+    for drink in catalog.drinks:
+        name, description = normalize(drink.name), normalize(drink.description)
+        score = sum(NAME_WEIGHT * (token in name) + DESCRIPTION_WEIGHT * (token in description) for token in tokens)
+        if score:
+            scored.append(SearchResult(drink, -score))
+    scored.sort(key=lambda result: (result.score, result.drink.id))
+    return scored[offset:offset + page_size], len(scored) > offset + page_size
@@ -1,3 +1,346 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from importlib import import_module
+from io import StringIO
+from urllib.parse import parse_qs
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db.models.signals import post_delete
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from linebotcore import metrics
+from linebotcore.payloads import VersionedPayloadCache
+
+from . import catalog, menus, search
+from .catalog import Catalog, CatalogCache, CatalogDrink
+from .catalog import MENU_PAGE_SIZE
+from .management.commands import import_drinks
+from .menus import category_page_message
+from .models import Drink
+from .nameindex import CONTAINS, EXACT, FUZZY, PREFIX, NameIndex, edit_distance, normalize
+
+
+def catalog_of(*drinks, version=1):
+    # drinks: (id, name, category) tuples
+    return Catalog(version, (CatalogDrink(id, name, category, f'{name}的介紹', '') for id, name, category in drinks))
+
+
+class Named:
+
+    def __init__(self, name):
+        self.name = name
+
+
+def name_index(*names):
+    return NameIndex([Named(name) for name in names])
+
+
+class EditDistanceTests(SimpleTestCase):
+
+    def test_distances(self):
+        self.assertEqual(edit_distance('焙烏龍鮮奶', '焙烏龍鮮奶', 2), 0)
+        self.assertEqual(edit_distance('焙烏龍牛奶', '焙烏龍鮮奶', 2), 1)
+        self.assertEqual(edit_distance('烏龍奶', '烏龍鮮奶', 2), 1)
+        self.assertEqual(edit_distance('kitten', 'sitting', 5), 3)
+
+    def test_gives_up_past_the_limit(self):
+        self.assertEqual(edit_distance('紅茶', '檸檬多多綠', 1), 2)
+        self.assertEqual(edit_distance('abcdef', 'uvwxyz', 2), 3)
+
+
+class NameIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = name_index('紅茶', '紅茶拿鐵', '檸檬紅茶', '焙烏龍鮮奶', '珍珠奶茶', 'Ｃｏｃｏａ')
+
+    def search(self, text, limit=5):
+        return [(match.item.name, match.kind) for match in self.index.search(text, limit)]
+
+    def test_ranked_exact_prefix_contains(self):
+        self.assertEqual(self.search('紅茶'), [('紅茶', EXACT), ('紅茶拿鐵', PREFIX), ('檸檬紅茶', CONTAINS)])
+
+    def test_typo_is_a_fuzzy_match(self):
+        self.assertEqual(self.search('焙烏龍牛奶'), [('焙烏龍鮮奶', FUZZY)])
+        self.assertEqual(self.index.find('焙烏龍牛奶').distance, 1)
+
+    def test_normalized_query(self):
+        self.assertEqual(normalize(' Ｃｏ ｃｏａ '), 'cocoa')
+        self.assertEqual(self.search('COCOA'), [('Ｃｏｃｏａ', EXACT)])
+
+    def test_single_character(self):
+        self.assertEqual(self.search('紅', 2), [('紅茶', PREFIX), ('紅茶拿鐵', PREFIX)])
+
+    def test_nothing_close(self):
+        self.assertEqual(self.search('咖啡'), [])
+        self.assertIsNone(self.index.find('咖啡'))
+
+    def test_name_with_every_bigram_can_still_match_fuzzily(self):
+        # '茶奶茶' has both bigrams of '奶茶奶' without containing it
+        index = name_index('茶奶茶')
+        self.assertEqual([(match.item.name, match.kind) for match in index.search('奶茶奶')], [('茶奶茶', FUZZY)])
+
+
+class CatalogTests(SimpleTestCase):
+
+    def setUp(self):
+        self.catalog = catalog_of((1, '紅茶', 'tea'), (2, '珍珠奶茶', 'milk'), (3, '綠茶', 'tea'), (5, '檸檬汁', 'other'))
+
+    def test_get_by_exact_name(self):
+        self.assertEqual(self.catalog.get('綠茶').id, 3)
+        self.assertIsNone(self.catalog.get('綠'))
+
+    def test_categories_in_id_order(self):
+        self.assertEqual([drink.name for drink in self.catalog.category('tea')], ['紅茶', '綠茶'])
+        self.assertEqual(self.catalog.category('coffee'), ())
+
+    def test_find(self):
+        self.assertEqual(self.catalog.find('珍奶茶').name, '珍珠奶茶')
+        self.assertIsNone(self.catalog.find('咖啡'))
+
+
+class CategoryPageTests(SimpleTestCase):
+
+    def setUp(self):
+        # 30 tea drinks with gaps in their ids, interleaved with other categories
+        drinks = []
+        for i in range(1, 61):
+            drinks.append((i * 2, f'茶{i}' if i % 2 else f'奶{i}', 'tea' if i % 2 else 'milk'))
+        self.catalog = catalog_of(*drinks)
+        self.tea_ids = [drink.id for drink in self.catalog.category('tea')]
+
+    def test_pages_follow_the_id_cursor(self):
+        ids, after, more = [], None, True
+        while more:
+            page, more = self.catalog.page('tea', after)
+            ids += [drink.id for drink in page]
+            after = page[-1].id
+        self.assertEqual(ids, self.tea_ids)
+        self.assertEqual(self.catalog.page('tea')[0], self.catalog.category('tea')[:MENU_PAGE_SIZE])
+
+    def test_position_after_a_cursor(self):
+        self.assertEqual(self.catalog.position('tea'), 0)
+        self.assertEqual(self.catalog.position('tea', self.tea_ids[11]), 12)
+        # A cursor whose drink was deleted meanwhile still points after it
+        self.assertEqual(self.catalog.position('tea', self.tea_ids[11] + 1), 12)
+        self.assertEqual(self.catalog.position('tea', 10 ** 9), len(self.tea_ids))
+        self.assertEqual(self.catalog.page('coffee'), ((), False))
+
+    def test_pages_do_not_shift_when_drinks_are_added(self):
+        page, _ = self.catalog.page('tea')
+        added = Catalog(2, (CatalogDrink(1, '新茶', 'tea', '', ''),) + self.catalog.drinks)
+        self.assertEqual(added.page('tea', page[-1].id)[0], self.catalog.page('tea', page[-1].id)[0])
+
+    def test_next_page_button_carries_the_cursor(self):
+        message = category_page_message(self.catalog, 'tea', 0)
+        buttons = message.quick_reply.items
+        self.assertEqual(len(buttons), MENU_PAGE_SIZE + 1)
+        cursor = parse_qs(buttons[-1].action.data)
+        self.assertEqual(cursor, {'action': ['drink_category'], 'category': ['tea'],
+                                  'after': [str(self.tea_ids[MENU_PAGE_SIZE - 1])]})
+        last = category_page_message(self.catalog, 'tea', self.catalog.position('tea', self.tea_ids[-7]))
+        self.assertEqual(len(last.quick_reply.items), 6)
+
+
+class ReplyApi:
+    # Records the messages of every reply_raw call
+
+    def __init__(self):
+        self.replies = []
+
+    def _post(self, path, data=None, timeout=None):
+        self.replies.append(json.loads(data)['messages'])
+
+
+class MenuReplyTests(SimpleTestCase):
+
+    def setUp(self):
+        self.api = ReplyApi()
+        self.payloads = VersionedPayloadCache('tests')
+        self.addCleanup(metrics.unregister, 'payloads:tests')
+        self.catalog = catalog_of((1, '紅茶', 'tea'), (2, '奶茶', 'milk'))
+        for patcher in (mock.patch.object(menus, 'menu_payloads', self.payloads),
+                        mock.patch.object(menus, 'get_catalog', lambda: self.catalog)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_menus_are_rendered_once_per_version(self):
+        with mock.patch.object(menus, 'carousel_message', wraps=menus.carousel_message) as render:
+            for _ in range(3):
+                menus.reply_carousel(self.api, 'reply-token')
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(self.api.replies[0], self.api.replies[2])
+        self.assertEqual((self.payloads.stats()['hits'], self.payloads.stats()['misses']), (2, 1))
+
+    def test_new_catalog_version_renders_again(self):
+        menus.reply_category_page(self.api, 'reply-token', 'tea')
+        self.catalog = catalog_of((1, '紅茶', 'tea'), (3, '綠茶', 'tea'), version=2)
+        menus.reply_category_page(self.api, 'reply-token', 'tea')
+        labels = [[item['action']['label'] for item in reply[0]['quickReply']['items']] for reply in self.api.replies]
+        self.assertEqual(labels, [['紅茶'], ['紅茶', '綠茶']])
+        self.assertEqual(self.payloads.stats()['flushes'], 1)
+
+    def test_catalog_version_going_back_is_cached(self):
+        menus.reply_help(self.api, 'reply-token')
+        # The stamp file was deleted: the reloaded catalog starts again from version 0
+        self.catalog = catalog_of((1, '紅茶', 'tea'), version=0)
+        menus.reply_help(self.api, 'reply-token')
+        menus.reply_help(self.api, 'reply-token')
+        self.assertEqual((self.payloads.stats()['hits'], self.payloads.stats()['misses']), (1, 2))
+        self.assertNotIn('奶茶', self.api.replies[2][0]['text'])
+
+
+@override_settings(DRINK_CATALOG={'STAMP_PATH': None})
+class CatalogCacheTests(TestCase):
+
+    def setUp(self):
+        catalog._cache = None
+        self.addCleanup(setattr, catalog, '_cache', None)
+        Drink.objects.create(name='紅茶', category='tea', description='紅茶的介紹')
+
+    def test_loaded_once(self):
+        cache = CatalogCache({'STAMP_PATH': None, 'CHECK_INTERVAL': 1.0})
+        with self.assertNumQueries(1):
+            first = cache.get()
+            self.assertIs(cache.get(), first)
+        self.assertEqual(first.get('紅茶').category, 'tea')
+
+    def test_saving_a_drink_reloads_the_catalog(self):
+        before = catalog.get_catalog()
+        with self.captureOnCommitCallbacks(execute=True):
+            Drink.objects.create(name='綠茶', category='tea', description='綠茶的介紹')
+        after = catalog.get_catalog()
+        self.assertGreater(after.version, before.version)
+        self.assertEqual([drink.name for drink in after.category('tea')], ['紅茶', '綠茶'])
+
+
+@override_settings(DRINK_CATALOG={'STAMP_PATH': None})
+class SearchTests(TestCase):
+
+    def setUp(self):
+        catalog._cache = None
+        self.addCleanup(setattr, catalog, '_cache', None)
+
+    def add(self, *drinks):
+        # drinks: (name, description) pairs, indexed in bulk
+        Drink.objects.bulk_create(Drink(name=name, category='other', description=description)
+                                  for name, description in drinks)
+        search.rebuild_index()
+
+    def names(self, text, **kwargs):
+        results, more = search.search(text, **kwargs)
+        return [result.drink.name for result in results], more
+
+    def test_query_tokens(self):
+        self.assertEqual(search.query_tokens('有檸檬的，茶'), ['有檸', '檸檬', '檬的', '茶'])
+        self.assertEqual(search.index_tokens('檸檬春'), '檸 檬 春 檸檬 檬春')
+
+    def test_migration_indexes_like_the_app(self):
+        # Migration 0003 keeps its own copy of the tokenizer
+        migration = import_module('testapp.migrations.0003_drink_fts')
+        for text in ('檸檬春', 'ＡＢＣ 奶茶，微糖', '', 'Q 彈珍珠!'):
+            self.assertEqual(migration.index_tokens(text), search.index_tokens(text), text)
+
+    def test_name_matches_rank_above_descriptions(self):
+        self.add(('紅茶', '加入新鮮檸檬片'), ('檸檬紅茶', '茶香濃郁'), ('奶綠', '奶香滑順'))
+        self.assertEqual(self.names('檸檬'), (['檸檬紅茶', '紅茶'], False))
+        self.assertEqual(self.names('咖啡'), ([], False))
+        self.assertEqual(self.names('  '), ([], False))
+
+    def test_best_match_among_many(self):
+        # The only name match comes after 1200 description matches in rowid order
+        self.add(*((f'飲料{i}', '微酸檸檬') for i in range(1200)), ('檸檬多多', '酸甜平衡'))
+        self.assertEqual(self.names('檸檬', page_size=1), (['檸檬多多'], True))
+
+    def test_pages(self):
+        self.add(*((f'檸檬{i}', '') for i in range(5)))
+        first, more = self.names('檸檬', page_size=3)
+        second, last = self.names('檸檬', page=2, page_size=3)
+        self.assertEqual((len(first), more, len(second), last), (3, True, 2, False))
+        self.assertEqual(sorted(first + second), sorted(f'檸檬{i}' for i in range(5)))
+
+    def test_drinks_missing_from_the_catalog_are_left_out(self):
+        self.add(*((f'檸檬{i}', '') for i in range(4)))
+        catalog.get_catalog()
+        # Indexed but not in the loaded catalog yet
+        Drink.objects.bulk_create([Drink(name='檸檬新品', category='other', description='')])
+        search.rebuild_index()
+        results, more = self.names('檸檬', page_size=4)
+        self.assertEqual((sorted(results), more), ([f'檸檬{i}' for i in range(4)], False))
+
+    def test_catalog_fallback(self):
+        self.add(('紅茶', '加入新鮮檸檬片'), ('檸檬紅茶', '茶香濃郁'))
+        with mock.patch.object(search, 'available', return_value=False):
+            self.assertEqual(self.names('檸檬'), (['檸檬紅茶', '紅茶'], False))
+
+
+@override_settings(DRINK_CATALOG={'STAMP_PATH': None})
+class ImportDrinksTests(TestCase):
+
+    def setUp(self):
+        catalog._cache = None
+        self.addCleanup(setattr, catalog, '_cache', None)
+
+    def jsonl(self, *rows):
+        f = tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False)
+        self.addCleanup(os.unlink, f.name)
+        with f:
+            for row in rows:
+                f.write((row if isinstance(row, str) else json.dumps(row, ensure_ascii=False)) + '\n')
+        return f.name
+
+    def run_import(self, *files, **options):
+        command = import_drinks.Command()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(command, *files, stdout=StringIO(), **options)
+        return {key: value for key, value in command.counts.items() if value}
+
+    def test_default_drinks(self):
+        self.assertEqual(self.run_import(), {'read': 9, 'created': 9})
+        self.assertEqual(self.run_import(), {'read': 9, 'unchanged': 9})
+
+    def test_duplicates_across_batches_are_counted_once(self):
+        path = self.jsonl(
+            {'name': '紅茶', 'category': 'tea', 'description': 'a'},
+            {'name': '綠茶', 'category': 'tea', 'description': 'b'},
+            {'name': '紅茶', 'category': 'tea', 'description': 'a'},
+            {'name': '奶茶', 'category': 'milk', 'description': 'c'},
+            {'name': '紅茶', 'category': 'tea', 'description': 'last'},
+        )
+        self.assertEqual(self.run_import(path, batch_size=2), {'read': 5, 'created': 3, 'duplicate': 2})
+        self.assertEqual(Drink.objects.get(name='紅茶').description, 'last')
+        self.assertEqual(catalog.get_catalog().get('紅茶').description, 'last')
+
+    def test_updates_and_invalid_rows(self):
+        Drink.objects.create(name='紅茶', category='tea', description='old')
+        Drink.objects.create(name='綠茶', category='tea', description='same')
+        path = self.jsonl(
+            {'name': '紅茶', 'category': 'tea', 'description': 'new'},
+            {'name': '綠茶', 'category': 'tea', 'description': 'same'},
+            {'name': '', 'category': 'tea'},
+            {'name': '咖啡', 'category': 'coffee'},
+            '{not json',
+        )
+        self.assertEqual(self.run_import(path), {'read': 5, 'updated': 1, 'unchanged': 1, 'invalid': 3})
+
+    def test_prune_deletes_in_batches_without_signals(self):
+        for name in ('紅茶', '綠茶', '奶茶', '可可'):
+            Drink.objects.create(name=name, category='other', description=f'{name}香')
+        deleted = []
+        receiver = lambda sender, instance, **kwargs: deleted.append(instance.pk)
+        post_delete.connect(receiver, sender=Drink)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Drink)
+        before = catalog.get_catalog()
+
+        path = self.jsonl({'name': '紅茶', 'description': '紅茶香'})
+        self.assertEqual(self.run_import(path, prune=True, batch_size=2),
+                         {'read': 1, 'unchanged': 1, 'deleted': 3})
+        self.assertEqual(deleted, [])
+        self.assertEqual(list(Drink.objects.values_list('name', flat=True)), ['紅茶'])
+        self.assertEqual([result.drink.name for result in search.search('茶香')[0]], ['紅茶'])
+        self.assertGreater(catalog.get_catalog().version, before.version)
+
+    def test_dry_run(self):
+        self.assertEqual(self.run_import(dry_run=True), {'read': 9, 'created': 9})
+        self.assertFalse(Drink.objects.exists())